@@ -1,9 +1,78 @@
-import tempfile
-import os
+import io
+import time
 import zipfile
 import streamlit as st
+from nanoloop_mobile_sample_tools import archive
+from nanoloop_mobile_sample_tools import cache
 from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import jobs
+from nanoloop_mobile_sample_tools import preview
+from nanoloop_mobile_sample_tools import stats
 from nanoloop_mobile_sample_tools import version
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+@st.cache_resource
+def get_result_cache() -> cache.ResultCache:
+    """Get the processed audio cache shared by every session.
+
+    :return cache.ResultCache:
+    """
+    return cache.ResultCache()
+
+
+@st.cache_resource
+def get_job_queue() -> jobs.JobQueue:
+    """Get the background job queue shared by every session.
+
+    :return jobs.JobQueue:
+    """
+    return jobs.JobQueue()
+
+
+def get_stage_cache() -> cache.StageCache:
+    """Get this session's cache of stage outputs, so changing an option only reruns the stages after it.
+
+    :return cache.StageCache:
+    """
+    if "stage_cache" not in st.session_state:
+        st.session_state["stage_cache"] = cache.StageCache()
+    return st.session_state["stage_cache"]
+
+
+@st.cache_resource
+def get_pipeline(
+        sample_rate: float,
+        speed_multiplier: float,
+        concatenate: bool,
+        mono: str,
+        compress: str,
+        normalize: bool,
+        reverse: bool,
+        resample_quality: str,
+        trim: bool,
+        target_rms_db: float) -> Pipeline:
+    """Get the pipeline for the audio options, reused across reruns and sessions.
+
+    Pipelined, so each upload is decoded, processed and saved in turn on
+    threads rather than every upload being decoded at once.
+
+    :return Pipeline:
+    """
+    return Pipeline(
+        sample_rate=sample_rate,
+        speed_multiplier=speed_multiplier,
+        concatenate=concatenate,
+        mono=mono,
+        compress=compress,
+        normalize=normalize,
+        reverse=reverse,
+        resample_quality=resample_quality,
+        trim=trim,
+        target_rms_db=target_rms_db,
+        pipelined=True
+    )
+
 
 st.title("Nanoloop Mobile Sample Tools")
 st.caption("Version {} - [Source](https://github.com/gesceap/nanoloop-mobile-sample-tools)".format(version.__version__))
@@ -12,6 +81,7 @@ st.header("Audio Options")
 
 concatenate = st.checkbox("Concatenate")
 reverse = st.checkbox("Reverse")
+trim = st.checkbox("Trim Silence")
 
 mono = st.checkbox("Mono")
 mono_channel = None
@@ -24,105 +94,179 @@ if compress:
     compress_type = st.selectbox("Compress Type", ['soft', 'hard'])
 
 normalize = st.checkbox("Normalize")
+target_rms_db = None
+if normalize and st.selectbox("Normalize To", ['peak', 'RMS']) == 'RMS':
+    target_rms_db = st.slider("Target RMS (dBFS)", -30.0, -6.0, -14.0)
 sample_rate = st.select_slider("Sample Rate", [44100.0, 22050.0, 11025.0, 8000.0])
-bit_rate = st.selectbox("Bit Rate", [16, 8])
+resample_quality = st.select_slider("Resample Quality", ['fast', 'standard', 'high'], value='standard')
+bit_rate = st.selectbox("Bit Rate", [16, 8, 24, 32])
 speed_multiplier = st.select_slider("Speed Multiplier", list(range(1, 11)))
 
+pipeline = get_pipeline(
+    sample_rate,
+    speed_multiplier,
+    concatenate,
+    mono_channel,
+    compress_type,
+    normalize,
+    reverse,
+    resample_quality,
+    trim,
+    target_rms_db
+)
+
+st.header("Preview")
+
+preview_file = st.file_uploader("File to Preview", type=['.wav'], key="preview-file")
+preview_seconds = st.slider("Preview Seconds", 1.0, 30.0, preview.DEFAULT_PREVIEW_SECONDS)
+if preview_file is not None:
+    # Rerun on every option change, the decoded upload is kept in the session's stage cache
+    preview_input = preview_file.getvalue()
+    try:
+        st.line_chart(
+            dict(zip(["min", "max"], preview.waveform(preview_input, pipeline, stage_cache=get_stage_cache())))
+        )
+        preview_array = preview.render(preview_input, pipeline, preview_seconds, get_stage_cache())
+        preview_buffer = commands.save(preview_array, sample_rate, bit_rate, io.BytesIO())
+        st.audio(preview_buffer.getvalue(), format="audio/wav")
+    except Exception as error:
+        st.error("Preview failed: {}".format(error))
+
 st.header("Process Audio Files")
 
-st.config.set_option("server.maxUploadSize", 10)
-bytes_to_download = None
+zip_file_name = "processed.zip"
+job_queue = get_job_queue()
+level_stats = st.checkbox(
+    "Level Statistics",
+    help="Show the peak, RMS, DC offset and clipped samples of each output, and add them to the archive as JSON."
+)
 with st.form("uploader-form", clear_on_submit=True):
     uploaded_files = st.file_uploader(
-        "Files to Process",
-        type=['.wav'],
+        "Files to Process, or one ZIP archive of a sample pack",
+        type=['.wav', '.zip'],
         accept_multiple_files=True
     )
 
-    # Read the binary output of the zip archive
-    # Make download button to download in memory zip archive        
     run = st.form_submit_button("Run")
-    if run and uploaded_files:
-        st.write("Processing {} uploaded files".format(len(uploaded_files)))
-        # Save all the uploaded binary data to uploaded temp dir
-        with tempfile.TemporaryDirectory() as uploaded_tempdir:
-            audio_inputs = []
-            file_names = []
-            for uploaded_file in uploaded_files:
-                file_names.append(uploaded_file.name)
-                audio_input = os.path.join(uploaded_tempdir, uploaded_file.name)
-
-                with open(audio_input, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                audio_inputs.append(audio_input)
-
-            # Process all the files with the package and kwargs
-            audio_arrays = commands.process(
-                audio_inputs,
-                sample_rate,
-                speed_multiplier,
-                concatenate,
-                mono_channel,
-                compress_type,
-                normalize,
-                reverse
+    archives = [
+        uploaded_file for uploaded_file in uploaded_files or [] if uploaded_file.name.lower().endswith(".zip")
+    ]
+    if run and archives and len(uploaded_files) > 1:
+        st.error("Upload one ZIP archive on its own, or WAV files.")
+    elif run and archives:
+        # Only the archive's directory is read here, its members are decompressed as the job decodes them
+        try:
+            file_names = archive.audio_members(archives[0])
+            if not file_names:
+                raise ValueError("No audio files in the archive.")
+            job = job_queue.submit(
+                archive.process_archive,
+                len(archive.get_archive_names(file_names, concatenate)),
+                archives[0],
+                result_cache=get_result_cache(),
+                stage_cache=get_stage_cache(),
+                pipeline=pipeline,
+                bit_rate=bit_rate,
+                sidecars=level_stats
+            )
+        except (ValueError, zipfile.BadZipFile) as error:
+            st.error("Could not read the archive: {}".format(error))
+        except jobs.JobQueueFull:
+            st.error("The server is busy, try again in a moment.")
+        else:
+            st.session_state["job_id"] = job.id
+    elif run and uploaded_files:
+        # Process the uploads in the background straight into a ZIP archive,
+        # the uploads are copied as the form clears them on submit
+        file_names = [uploaded_file.name for uploaded_file in uploaded_files]
+        try:
+            job = job_queue.submit(
+                archive.process_to_archive,
+                len(archive.get_archive_names(file_names, concatenate)),
+                [uploaded_file.getvalue() for uploaded_file in uploaded_files],
+                file_names,
+                result_cache=get_result_cache(),
+                stage_cache=get_stage_cache(),
+                pipeline=pipeline,
+                bit_rate=bit_rate,
+                sidecars=level_stats
+            )
+        except jobs.JobQueueFull:
+            st.error("The server is busy, try again in a moment.")
+        else:
+            st.session_state["job_id"] = job.id
+
+job = job_queue.get(st.session_state.get("job_id"))
+if job is not None:
+    progress = job.progress()
+    if not job.finished:
+        text = "Processed {files_done} of {files_total} files".format(**progress)
+        if progress["stage"]:
+            text += ", {}".format(progress["stage"])
+        elif progress["status"] == "queued":
+            text = "Waiting for other jobs to finish"
+        st.progress(progress["fraction"], text=text)
+        if st.button("Cancel"):
+            job.cancel()
+        # Poll the job until it finishes
+        time.sleep(0.5)
+        rerun = getattr(st, "rerun", None) or st.experimental_rerun
+        rerun()
+    elif job.status == "done":
+        st.write(
+            "Processed {} files, {} from cache, reusing {} stages from earlier runs.".format(
+                job.files_done,
+                sum(1 for record in job.profiler.records if record["stage"] == "cache"),
+                sum(1 for record in job.profiler.records if record["stage"] == "reuse")
+            )
+        )
+        st.write(
+            "Wrote {} bytes in compresed archive for download; {}".format(
+                len(job.result),
+                zip_file_name
+            )
+        )
+
+        st.subheader("Stage Timings")
+        st.table(
+            [
+                {
+                    "Stage": total["stage"],
+                    "Files": total["files"],
+                    "Wall (ms)": round(total["wall_seconds"] * 1000, 2),
+                    "CPU (ms)": round(total["cpu_seconds"] * 1000, 2),
+                    "Bytes": total["bytes"],
+                }
+                for total in job.profiler.summary()
+            ]
+        )
+
+        levels = [
+            record for record in job.profiler.records
+            if record["stage"] in jobs.FILE_STAGES and record.get("stats") is not None
+        ]
+        if levels:
+            st.subheader("Output Levels")
+            st.table(
+                [
+                    {
+                        "File": record["file"],
+                        "Peak (dBFS)": stats.to_db(record["stats"]["peak"]),
+                        "RMS (dBFS)": stats.to_db(record["stats"]["rms"]),
+                        "DC Offset": record["stats"]["dc_offset"],
+                        "Clipped": record["stats"]["clips"],
+                    }
+                    for record in levels
+                ]
             )
 
-            st.write("Processed {} audio inputs.".format(len(audio_arrays)))
-
-            # Save all the processed files to the processed temp dir
-            with tempfile.TemporaryDirectory() as processed_tempdir:
-                
-                audio_outputs = []
-                for file_name, audio_array in zip(file_names, audio_arrays):
-                    audio_output = os.path.join(
-                        processed_tempdir, "processed_{}".format(file_name)
-                    )
-
-                    if concatenate and len(audio_arrays) == 1:
-                        audio_output =  os.path.join(processed_tempdir, "processed.wav")
-
-                    audio_outputs.append(
-                        commands.save(
-                        audio_array,
-                        sample_rate,
-                        bit_rate,
-                        audio_output
-                        )
-                    )
-
-                st.write("Saved {} audio outputs.".format(len(audio_outputs)))
-            
-                # Add all processed files in the processed temp dir to a ZIP archive
-                zip_file_name = "processed.zip"
-                zip_file_path = os.path.join(processed_tempdir, zip_file_name)
-                with zipfile.ZipFile(zip_file_path, "w") as archive:
-                    for audio_output in audio_outputs:
-                        _, arcname = os.path.split(audio_output)
-                        archive.write(audio_output, arcname)
-                
-                with open(zip_file_path, 'rb') as zf:
-                    bytes_to_download = zf.read()
-
-                st.write(
-                    "Wrote {} bytes in compresed archive for download; {}".format(
-                        len(bytes_to_download),
-                        zip_file_name
-                    )
-                )
-
-# Give dialog for archive download
-download = False
-if run and bytes_to_download:
-    download = st.download_button("Download", data=bytes_to_download, file_name=zip_file_name, mime='application/zip')
-
-# Reset the variables
-if download:
-    run = False
-    bytes_to_download = None
-    download = False
-    uploaded_files = []
+        # Give dialog for archive download
+        if st.download_button("Download", data=job.result, file_name=zip_file_name, mime='application/zip'):
+            del st.session_state["job_id"]
+    elif job.status == "failed":
+        st.error("Processing failed: {}".format(job.error))
+    else:
+        st.write("Processing cancelled.")
 
 
 st.write("Consider supporting my music - https://gesceap.bandcamp.com/")
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""Per-array stages against ragged batches on a kit of one-shots.
+
+Times mono, normalize, reverse and saving to memory for many short samples,
+once as a list comprehension per stage over the arrays and once packed into
+a batch.AudioBatch.
+
+    python benchmarks/bench_batch.py --samples 500 --frames 4410
+"""
+
+import argparse
+import io
+import logging
+import numpy
+import statistics
+import time
+from nanoloop_mobile_sample_tools import batch
+from nanoloop_mobile_sample_tools import commands
+
+
+def make_kit(samples: int, frames: int) -> list:
+    """Make stereo one-shots of random lengths up to a number of frames.
+
+    :return list:
+    """
+    rng = numpy.random.default_rng(0)
+    return [
+        rng.uniform(-0.5, 0.5, (2, int(rng.integers(frames // 4, frames)))).astype(numpy.float32)
+        for _ in range(samples)
+    ]
+
+
+def per_array(audio_arrays: list, bit_rate: int):
+    """Run each stage over the list of arrays.
+
+    :param list audio_arrays:
+    :param int bit_rate:
+    """
+    audio_arrays = [commands.mono_audio(audio_array, 'left') for audio_array in audio_arrays]
+    audio_arrays = [commands.peak_normalize_audio(audio_array) for audio_array in audio_arrays]
+    audio_arrays = [commands.reverse_audio(audio_array) for audio_array in audio_arrays]
+    for audio_array in audio_arrays:
+        commands.save(audio_array, 22050.0, bit_rate, io.BytesIO())
+
+
+def batched(audio_arrays: list, bit_rate: int):
+    """Run each stage once over a batch.
+
+    :param list audio_arrays:
+    :param int bit_rate:
+    """
+    audio_batch = batch.AudioBatch.from_arrays(audio_arrays)
+    audio_batch.mono('left')
+    audio_batch.normalize()
+    audio_batch.reverse()
+    audio_batch.save([io.BytesIO() for _ in audio_arrays], 22050.0, bit_rate)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=500, help="One-shots in the kit.")
+    parser.add_argument("--frames", type=int, default=4410, help="Longest one-shot in frames.")
+    parser.add_argument("--bit-rate", type=int, default=16, help="Bit rate saved at.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs timed per path.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    audio_arrays = make_kit(args.samples, args.frames)
+    print("{} one-shots, {} frames".format(len(audio_arrays), sum(a.shape[1] for a in audio_arrays)))
+    print("{:>10} {:>12} {:>12}".format("path", "median ms", "best ms"))
+    for name, run in [("per array", per_array), ("batch", batched)]:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run(audio_arrays, args.bit_rate)
+            timings.append((time.perf_counter() - start) * 1000)
+        print("{:>10} {:>12.1f} {:>12.1f}".format(name, statistics.median(timings), min(timings)))
+
+
+if __name__ == "__main__":
+    main()
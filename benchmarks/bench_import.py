@@ -0,0 +1,82 @@
+"""Startup time of nmst, guarding against slow imports creeping back in.
+
+Times fresh interpreters importing nmst and parsing arguments, as every
+'nmst --help' or scripted call does, against a bare interpreter and
+importing the processing modules. Exits non-zero when parsing arguments
+imports numpy or pedalboard, or takes longer than --max-ms over the bare
+interpreter.
+
+    python benchmarks/bench_import.py --runs 20 --max-ms 50
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+CASES = [
+    ("python", "pass"),
+    ("nmst parse", "from nanoloop_mobile_sample_tools import nmst; nmst.get_parser().parse_args(['kick.wav'])"),
+    ("commands", "from nanoloop_mobile_sample_tools import commands"),
+]
+
+HEAVY_MODULES = ("numpy", "pedalboard", "wave")
+
+
+def time_code(code: str, runs: int) -> list:
+    """Time fresh interpreters running code.
+
+    :param str code:
+    :param int runs:
+    :return list: seconds of each run.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def heavy_imports(code: str) -> list:
+    """Get the heavy modules imported by running code.
+
+    :param str code:
+    :return list:
+    """
+    check = "{}\nimport sys\nprint(' '.join(sorted({{name.split('.')[0] for name in sys.modules}} & {})))".format(
+        code, set(HEAVY_MODULES)
+    )
+    result = subprocess.run([sys.executable, "-c", check], check=True, capture_output=True, text=True)
+    return result.stdout.split()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Interpreters started per case.")
+    parser.add_argument(
+        "--max-ms", type=float, default=None, help="Fail when parsing takes longer than this over bare python."
+    )
+    args = parser.parse_args()
+
+    medians = {}
+    print("{:>12} {:>12} {:>12}  {}".format("case", "median ms", "best ms", "heavy imports"))
+    for name, code in CASES:
+        timings = time_code(code, args.runs)
+        medians[name] = statistics.median(timings)
+        print("{:>12} {:>12.1f} {:>12.1f}  {}".format(
+            name, medians[name] * 1000, min(timings) * 1000, " ".join(heavy_imports(code)) or "-"
+        ))
+
+    overhead_ms = (medians["nmst parse"] - medians["python"]) * 1000
+    if heavy_imports(CASES[1][1]):
+        sys.exit("Parsing nmst arguments imports {}.".format(" ".join(heavy_imports(CASES[1][1]))))
+    if args.max_ms is not None and overhead_ms > args.max_ms:
+        sys.exit("Parsing nmst arguments takes {:.1f} ms over python, more than {} ms.".format(overhead_ms, args.max_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Request latency benchmark for the web app I/O path.
+
+Compares the previous app request, which wrote uploads to a temporary
+directory, saved outputs to a second one and zipped them on disk, against
+processing the uploads in memory with archive.process_to_archive.
+
+    python benchmarks/bench_memory_io.py --repeat 20 --runs 5
+"""
+
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+import zipfile
+from nanoloop_mobile_sample_tools import archive
+from nanoloop_mobile_sample_tools import commands
+
+
+AUDIO_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "audio_files")
+
+
+def get_uploads(repeat: int) -> list:
+    """Get the bundled audio files as in-memory uploads.
+
+    :param int repeat: number of times to repeat the bundled files.
+    :return list: of (file name, bytes) tuples.
+    """
+    uploads = []
+    for file_name in sorted(os.listdir(AUDIO_FILES)):
+        if file_name.endswith(".wav"):
+            with open(os.path.join(AUDIO_FILES, file_name), "rb") as f:
+                uploads.append((file_name, f.read()))
+    return [
+        ("{}_{}".format(index, file_name), audio_bytes)
+        for index in range(repeat)
+        for file_name, audio_bytes in uploads
+    ]
+
+
+def temp_file_request(uploads: list) -> bytes:
+    """Run a request through temporary files.
+
+    :param list uploads: (file name, bytes) tuples.
+    :return bytes: zip archive.
+    """
+    with tempfile.TemporaryDirectory() as uploaded_tempdir:
+        audio_inputs = []
+        for file_name, audio_bytes in uploads:
+            audio_input = os.path.join(uploaded_tempdir, file_name)
+            with open(audio_input, "wb") as f:
+                f.write(audio_bytes)
+            audio_inputs.append(audio_input)
+
+        audio_arrays = commands.process(audio_inputs, 22050.0)
+
+        with tempfile.TemporaryDirectory() as processed_tempdir:
+            audio_outputs = []
+            for (file_name, _), audio_array in zip(uploads, audio_arrays):
+                audio_output = os.path.join(processed_tempdir, "processed_{}".format(file_name))
+                audio_outputs.append(commands.save(audio_array, 22050.0, 16, audio_output))
+
+            zip_file_path = os.path.join(processed_tempdir, "processed.zip")
+            with zipfile.ZipFile(zip_file_path, "w") as zf:
+                for audio_output in audio_outputs:
+                    zf.write(audio_output, os.path.basename(audio_output))
+
+            with open(zip_file_path, "rb") as zf:
+                return zf.read()
+
+
+def in_memory_request(uploads: list) -> bytes:
+    """Run a request in memory.
+
+    :param list uploads: (file name, bytes) tuples.
+    :return bytes: zip archive.
+    """
+    return archive.process_to_archive(
+        [io.BytesIO(audio_bytes) for _, audio_bytes in uploads],
+        [file_name for file_name, _ in uploads],
+        sample_rate=22050.0
+    )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="Times to repeat the bundled files.")
+    parser.add_argument("--runs", type=int, default=5, help="Requests timed per path.")
+    args = parser.parse_args()
+
+    uploads = get_uploads(args.repeat)
+    print("{} uploads per request".format(len(uploads)))
+    print("{:>12} {:>12} {:>12}".format("path", "median ms", "best ms"))
+    for name, request in [("temp files", temp_file_request), ("in memory", in_memory_request)]:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            request(uploads)
+            timings.append((time.perf_counter() - start) * 1000)
+        print("{:>12} {:>12.1f} {:>12.1f}".format(name, statistics.median(timings), min(timings)))
+
+
+if __name__ == "__main__":
+    main()
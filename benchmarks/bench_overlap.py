@@ -0,0 +1,78 @@
+"""Benchmark of pipelined decode, processing and saving.
+
+Processes and saves a kit made by repeating the bundled test audio files,
+one stage after another for each file against decode, process and save on
+their own threads, and reports the throughput of each.
+
+    python benchmarks/bench_overlap.py --repeat 50
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from nanoloop_mobile_sample_tools import cache
+
+
+AUDIO_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "audio_files")
+
+
+def get_audio_inputs(repeat: int) -> list:
+    """Get the bundled audio files repeated to make a larger kit.
+
+    :param int repeat: number of times to repeat the bundled files.
+    :return list:
+    """
+    audio_inputs = sorted(
+        os.path.join(AUDIO_FILES, file_name)
+        for file_name in os.listdir(AUDIO_FILES)
+        if file_name.endswith(".wav")
+    )
+    return audio_inputs * repeat
+
+
+def run(audio_inputs: list, pipelined: bool) -> float:
+    """Time a single process and save, without the result cache.
+
+    :param list audio_inputs: audio files to process.
+    :param bool pipelined: overlap the stages on threads.
+    :return float: seconds taken.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        audio_outputs = [
+            os.path.join(directory, "{}.wav".format(index)) for index in range(len(audio_inputs))
+        ]
+        start = time.perf_counter()
+        cache.process_and_save(
+            audio_inputs,
+            audio_outputs,
+            sample_rate=22050.0,
+            bit_rate=16,
+            compress='soft',
+            normalize=True,
+            pipelined=pipelined
+        )
+        return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="Times to repeat the bundled files.")
+    args = parser.parse_args()
+
+    audio_inputs = get_audio_inputs(args.repeat)
+    baseline = None
+    print("{:>10} {:>10} {:>12} {:>8}".format("pipelined", "seconds", "files/sec", "speedup"))
+    for pipelined in (False, True):
+        seconds = run(audio_inputs, pipelined)
+        baseline = baseline or seconds
+        print(
+            "{:>10} {:>10.3f} {:>12.1f} {:>8.2f}".format(
+                str(pipelined), seconds, len(audio_inputs) / seconds, baseline / seconds
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Latency of the app preview and waveform on a long upload.
+
+Writes a long stereo 16 bit WAV file and times preview.render and
+preview.waveform on its bytes, as the app does on each rerun, once with a
+fresh stage cache and again with the decoded upload already cached.
+
+    python benchmarks/bench_preview.py --duration 600
+"""
+
+import argparse
+import io
+import numpy
+import statistics
+import time
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import preview
+from nanoloop_mobile_sample_tools import wavio
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+def make_upload(duration: float, sample_rate: int) -> bytes:
+    """Write a stereo 16 bit WAV file to memory.
+
+    :param float duration: length in seconds.
+    :param int sample_rate:
+    :return bytes:
+    """
+    rng = numpy.random.default_rng(0)
+    audio_array = rng.uniform(-0.5, 0.5, (2, int(duration * sample_rate))).astype(numpy.float32)
+    buffer = io.BytesIO()
+    with wavio.WavWriter(buffer, 2, sample_rate, 16) as writer:
+        writer.write(audio_array)
+    return buffer.getvalue()
+
+
+def run_preview(upload: bytes, pipeline: Pipeline, seconds: float, stage_cache: cache.StageCache):
+    """Render the preview and waveform as the app does.
+
+    :param bytes upload:
+    :param Pipeline pipeline:
+    :param float seconds:
+    :param cache.StageCache stage_cache:
+    """
+    preview.waveform(upload, pipeline, stage_cache=stage_cache)
+    preview.render(upload, pipeline, seconds, stage_cache)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=600.0, help="Seconds of audio in the upload.")
+    parser.add_argument("--seconds", type=float, default=preview.DEFAULT_PREVIEW_SECONDS, help="Seconds previewed.")
+    parser.add_argument("--runs", type=int, default=5, help="Previews timed per case.")
+    args = parser.parse_args()
+
+    upload = make_upload(args.duration, 44100)
+    print("{} byte upload, {} seconds previewed".format(len(upload), args.seconds))
+    print("{:>24} {:>8} {:>12} {:>12}".format("options", "cache", "median ms", "best ms"))
+    for options in [dict(sample_rate=22050.0), dict(sample_rate=11025.0, compress='hard', normalize=True)]:
+        pipeline = Pipeline(**options)
+        for cached in [False, True]:
+            timings = []
+            stage_cache = cache.StageCache(max_bytes=1024 * 1024 * 1024)
+            for _ in range(args.runs):
+                if not cached:
+                    stage_cache.clear()
+                start = time.perf_counter()
+                run_preview(upload, pipeline, args.seconds, stage_cache)
+                timings.append(time.perf_counter() - start)
+            print("{:>24} {:>8} {:>12.1f} {:>12.1f}".format(
+                ",".join(sorted(options)), "warm" if cached else "cold",
+                statistics.median(timings) * 1000, min(timings) * 1000
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Speed and aliasing of the resample quality tiers.
+
+For each integer downsampling factor, times pedalboard's WindowedSinc32
+resampler, which every resample used before quality tiers, against each
+tier of resample.resample_audio on stereo noise. The worst alias of a sweep
+of tones above the output Nyquist frequency is reported alongside.
+
+    python benchmarks/bench_resample.py --duration 60
+"""
+
+import argparse
+import numpy
+import pedalboard
+import time
+from nanoloop_mobile_sample_tools import resample
+
+
+SAMPLE_RATE = 44100
+FACTORS = [2, 4, 8]
+
+
+def previous_resample(audio_array: numpy.ndarray, target_sample_rate: float) -> numpy.ndarray:
+    """Resample the way process did before quality tiers.
+
+    :return numpy.ndarray:
+    """
+    stream = pedalboard.io.StreamResampler(
+        SAMPLE_RATE, target_sample_rate, audio_array.shape[0], pedalboard.Resample.Quality.WindowedSinc32
+    )
+    return numpy.concatenate([stream.process(audio_array), stream.process()], axis=1)
+
+
+def worst_alias_db(resample_function, target_sample_rate: float) -> float:
+    """Find the loudest alias of tones between 1.1 and 1.9 times the output Nyquist frequency.
+
+    :param callable resample_function: called with a mono array.
+    :param float target_sample_rate:
+    :return float: dB relative to the tone.
+    """
+    time_axis = numpy.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+    nyquist = target_sample_rate / 2
+    worst = -200.0
+    for fraction in numpy.linspace(1.1, 1.9, 9):
+        frequency = round(fraction * nyquist)
+        tone = numpy.sin(2 * numpy.pi * frequency * time_axis)[None].astype(numpy.float32)
+        # A whole second away from the edges
+        start = int(target_sample_rate) // 2
+        resampled = resample_function(tone)[0, start:start + int(target_sample_rate)].astype(numpy.float64)
+        spectrum = numpy.abs(numpy.fft.rfft(resampled)) / (resampled.shape[0] / 2)
+        frequencies = numpy.fft.rfftfreq(resampled.shape[0], 1 / target_sample_rate)
+        alias = abs(target_sample_rate - frequency)
+        level = 20 * numpy.log10(spectrum[numpy.argmin(numpy.abs(frequencies - alias))] + 1e-12)
+        worst = max(worst, level)
+    return worst
+
+
+def best_seconds(function, runs: int) -> float:
+    """Time a function, keeping the fastest run.
+
+    :return float:
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of stereo audio resampled.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per measurement, the fastest is kept.")
+    args = parser.parse_args()
+
+    audio_array = numpy.random.default_rng(0).uniform(
+        -1.0, 1.0, (2, int(args.duration * SAMPLE_RATE))
+    ).astype(numpy.float32)
+
+    print("{:>7} {:>22} {:>10} {:>10} {:>14}".format("factor", "resampler", "ms", "speedup", "worst alias dB"))
+    for factor in FACTORS:
+        target_sample_rate = SAMPLE_RATE / factor
+        baseline = best_seconds(lambda: previous_resample(audio_array, target_sample_rate), args.runs)
+        alias = worst_alias_db(lambda tone: previous_resample(tone, target_sample_rate), target_sample_rate)
+        print("{:>7} {:>22} {:>10.1f} {:>10.2f} {:>14.1f}".format(
+            factor, "previous WindowedSinc32", baseline * 1000, 1.0, alias
+        ))
+        for quality in resample.QUALITIES:
+            seconds = best_seconds(
+                lambda: resample.resample_audio(audio_array, SAMPLE_RATE, target_sample_rate, quality), args.runs
+            )
+            alias = worst_alias_db(
+                lambda tone: resample.resample_audio(tone, SAMPLE_RATE, target_sample_rate, quality),
+                target_sample_rate
+            )
+            print("{:>7} {:>22} {:>10.1f} {:>10.2f} {:>14.1f}".format(
+                factor, quality, seconds * 1000, baseline / seconds, alias
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Time and peak memory benchmark for saving long stereo audio.
+
+Compares quantizing the whole array at once, as save used to, against
+commands.save with the chunked wavio.WavWriter. Peak memory is the extra
+memory traced while saving, on top of the audio array itself.
+
+    python benchmarks/bench_save.py --minutes 10
+"""
+
+import argparse
+import io
+import numpy
+import time
+import tracemalloc
+import wave
+from nanoloop_mobile_sample_tools import commands
+
+
+def whole_array_save(audio_array: numpy.ndarray, bit_rate: int, audio_output):
+    """Save by quantizing the whole audio array at once.
+
+    :param numpy.ndarray audio_array:
+    :param int bit_rate: 8 or 16 bit.
+    :param audio_output: file-like object.
+    """
+    if bit_rate == 8:
+        sampwidth = 1
+        data = ((audio_array.T * 127) + 127).astype(numpy.uint8)
+    else:
+        sampwidth = 2
+        data = (audio_array.T * 32767).astype(numpy.int16)
+
+    with wave.open(audio_output, 'w') as f:
+        f.setnchannels(audio_array.shape[0])
+        f.setsampwidth(sampwidth)
+        f.setframerate(44100)
+        f.writeframes(numpy.ascontiguousarray(data))
+
+
+def chunked_save(audio_array: numpy.ndarray, bit_rate: int, audio_output):
+    """Save with commands.save.
+
+    :param numpy.ndarray audio_array:
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :param audio_output: file-like object.
+    """
+    commands.save(audio_array, 44100, bit_rate, audio_output)
+
+
+def measure(save, audio_array: numpy.ndarray, bit_rate: int) -> tuple:
+    """Time a save and trace its peak memory.
+
+    :return tuple: seconds and peak megabytes.
+    """
+    audio_output = io.BytesIO()
+    tracemalloc.start()
+    start = time.perf_counter()
+    save(audio_array, bit_rate, audio_output)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The output itself is the same size for both
+    return seconds, (peak - len(audio_output.getbuffer())) / 1024 / 1024
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the stereo audio.")
+    args = parser.parse_args()
+
+    frames = int(args.minutes * 60 * 44100)
+    audio_array = numpy.random.default_rng(0).uniform(-1, 1, (2, frames)).astype(numpy.float32)
+    print("{:.1f} MB of float32 stereo audio".format(audio_array.nbytes / 1024 / 1024))
+    print("{:>12} {:>8} {:>10} {:>14}".format("save", "bits", "seconds", "extra peak MB"))
+    for name, save, bit_rates in [
+            ("whole array", whole_array_save, [8, 16]),
+            ("chunked", chunked_save, [8, 16, 24, 32])]:
+        for bit_rate in bit_rates:
+            seconds, peak = measure(save, audio_array, bit_rate)
+            print("{:>12} {:>8} {:>10.3f} {:>14.1f}".format(name, bit_rate, seconds, peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Per-stage benchmark suite on synthetic audio.
+
+Generates WAV files over a grid of durations, channel counts and source
+sample rates, then times every stage in commands and the end to end nmst
+path on each. Every measurement runs in its own child process so the peak
+RSS reported belongs to that stage alone.
+
+Results are written to JSON and can be compared against a stored baseline,
+exiting non-zero when throughput drops or memory grows past the tolerance.
+
+    python benchmarks/bench_stages.py --output bench.json
+    python benchmarks/bench_stages.py --output new.json --baseline bench.json
+"""
+
+import argparse
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import numpy
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import nmst
+from nanoloop_mobile_sample_tools import version
+from nanoloop_mobile_sample_tools import wavio
+
+
+DURATIONS = [1.0, 10.0, 60.0]
+CHANNELS = [1, 2]
+SOURCE_SAMPLE_RATES = [22050, 44100, 48000]
+QUICK_DURATIONS = [1.0, 5.0]
+
+STAGES = [
+    "decode_resample",
+    "mono",
+    "concatenate",
+    "compress",
+    "normalize",
+    "reverse",
+    "save",
+    "nmst",
+]
+
+# Copies of the input joined by the concatenate stage
+CONCATENATE_COUNT = 4
+
+
+def make_corpus(directory: str, durations: list) -> list:
+    """Write synthetic WAV files for every point in the grid.
+
+    :param str directory: directory to write to.
+    :param list durations: lengths in seconds.
+    :return list: of dicts describing each file.
+    """
+    rng = numpy.random.default_rng(0)
+    corpus = []
+    for duration, channels, source_sample_rate in itertools.product(durations, CHANNELS, SOURCE_SAMPLE_RATES):
+        frames = int(duration * source_sample_rate)
+        time_axis = numpy.arange(frames) / source_sample_rate
+        tone = 0.5 * numpy.sin(2 * numpy.pi * 220.0 * time_axis)
+        audio_array = numpy.stack(
+            [tone + 0.1 * rng.standard_normal(frames) for _ in range(channels)]
+        ).astype(numpy.float32)
+
+        path = os.path.join(
+            directory, "synthetic_{}s_{}ch_{}hz.wav".format(duration, channels, source_sample_rate)
+        )
+        with wavio.WavWriter(path, channels, source_sample_rate, 16, frames) as writer:
+            writer.write(audio_array)
+
+        corpus.append(
+            dict(path=path, duration=duration, channels=channels, source_sample_rate=source_sample_rate)
+        )
+    return corpus
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident set size of this process.
+
+    :return float:
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    if sys.platform == "darwin":
+        return maxrss / 1024 / 1024
+    return maxrss / 1024
+
+
+def run_stage(stage: str, path: str, sample_rate: float, repeat: int, output_dir: str) -> dict:
+    """Time a stage on a file, run inside a child process.
+
+    :param str stage: one of STAGES.
+    :param str path: synthetic audio file.
+    :param float sample_rate: output sample rate.
+    :param int repeat: times to run, the fastest is kept.
+    :param str output_dir: directory for written files.
+    :return dict: seconds, samples processed and peak RSS.
+    """
+    audio_array = None
+    if stage not in ("decode_resample", "nmst"):
+        audio_array = commands.read_audio(path, sample_rate, 1.0, None)
+
+    audio_output = os.path.join(output_dir, "output_{}.wav".format(os.getpid()))
+    run = {
+        "decode_resample": lambda: commands.read_audio(path, sample_rate, 1.0, None),
+        "mono": lambda: commands.mono_audio(audio_array, 'left'),
+        "concatenate": lambda: commands.concatenate_audio([audio_array] * CONCATENATE_COUNT),
+        "compress": lambda: commands.compress_audio(audio_array, 'hard', sample_rate),
+        "normalize": lambda: commands.peak_normalize_audio(audio_array),
+        "reverse": lambda: commands.reverse_audio(audio_array),
+        "save": lambda: commands.save(audio_array, sample_rate, 16, io.BytesIO()),
+        "nmst": lambda: run_nmst(path, sample_rate, audio_output),
+    }[stage]
+
+    result = run()
+    samples = result.size if isinstance(result, numpy.ndarray) else audio_array_size(path, sample_rate)
+
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    if os.path.exists(audio_output):
+        os.remove(audio_output)
+
+    return dict(seconds=seconds, samples=samples, peak_rss_mb=peak_rss_mb())
+
+
+def audio_array_size(path: str, sample_rate: float) -> int:
+    """Get the number of output samples for a file at a sample rate.
+
+    :return int:
+    """
+    with commands.open_audio(path) as f:
+        return int(f.frames * sample_rate / f.samplerate) * f.num_channels
+
+
+def run_nmst(path: str, sample_rate: float, audio_output: str):
+    """Run the nmst CLI end to end on a file.
+
+    :param str path: audio file.
+    :param float sample_rate: output sample rate.
+    :param str audio_output: output file.
+    """
+    argv = sys.argv
+    sys.argv = [
+        "nmst", path, "--concatenate", "--no-cache", "--compress", "soft", "--normalize",
+        "--sample-rate", str(sample_rate), "--audio-output", audio_output
+    ]
+    try:
+        nmst.main()
+    finally:
+        sys.argv = argv
+
+
+def _child(queue, *args):
+    """Run a stage and send back its result.
+
+    :param multiprocessing.Queue queue:
+    """
+    # Keep nmst from configuring INFO logging
+    logging.basicConfig(level=logging.WARNING)
+    queue.put(run_stage(*args))
+
+
+def measure(stage: str, path: str, sample_rate: float, repeat: int, output_dir: str) -> dict:
+    """Run a stage measurement in a child process.
+
+    :return dict:
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, stage, path, sample_rate, repeat, output_dir))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Find results which regressed against a baseline report.
+
+    :param list results: current results.
+    :param dict baseline: previous report.
+    :param float tolerance: allowed fractional slowdown or memory growth.
+    :return list: of regression descriptions.
+    """
+    def case(result):
+        return (result["stage"], result["duration"], result["channels"], result["source_sample_rate"])
+
+    baseline_results = {case(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline_results.get(case(result))
+        if previous is None:
+            continue
+        if result["samples_per_sec"] < previous["samples_per_sec"] * (1 - tolerance):
+            regressions.append(
+                "{} {}: {:.0f} samples/sec, baseline {:.0f}".format(
+                    result["stage"], case(result)[1:], result["samples_per_sec"], previous["samples_per_sec"]
+                )
+            )
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                "{} {}: {:.1f} MB peak RSS, baseline {:.1f}".format(
+                    result["stage"], case(result)[1:], result["peak_rss_mb"], previous["peak_rss_mb"]
+                )
+            )
+    return regressions
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_stages.json", help="JSON report to write.")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional regression.")
+    parser.add_argument("--sample-rate", type=float, default=22050.0, help="Output sample rate.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the fastest is kept.")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Stages to time.")
+    parser.add_argument("--quick", action="store_true", help="Only short durations.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = make_corpus(directory, QUICK_DURATIONS if args.quick else DURATIONS)
+        print("{:>16} {:>8} {:>4} {:>8} {:>16} {:>12}".format(
+            "stage", "seconds", "ch", "rate", "samples/sec", "peak RSS MB"
+        ))
+        for stage, item in itertools.product(args.stages, corpus):
+            measurement = measure(stage, item["path"], args.sample_rate, args.repeat, directory)
+            result = dict(
+                stage=stage,
+                duration=item["duration"],
+                channels=item["channels"],
+                source_sample_rate=item["source_sample_rate"],
+                seconds=measurement["seconds"],
+                samples=measurement["samples"],
+                samples_per_sec=measurement["samples"] / max(measurement["seconds"], 1e-9),
+                peak_rss_mb=measurement["peak_rss_mb"],
+            )
+            results.append(result)
+            print("{:>16} {:>8} {:>4} {:>8} {:>16.0f} {:>12.1f}".format(
+                stage, item["duration"], item["channels"], item["source_sample_rate"],
+                result["samples_per_sec"], result["peak_rss_mb"]
+            ))
+
+    report = dict(
+        meta=dict(
+            version=version.__version__,
+            python=platform.python_version(),
+            machine=platform.machine(),
+            sample_rate=args.sample_rate,
+            repeat=args.repeat,
+        ),
+        results=results,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION {}".format(regression))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against {}".format(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
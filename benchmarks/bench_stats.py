@@ -0,0 +1,57 @@
+"""One metering pass against a pass per statistic over long audio.
+
+Times the peak, RMS, DC offset and clipped samples of long stereo audio,
+once as the separate numpy reductions each stage used to run and once
+with stats.measure.
+
+    python benchmarks/bench_stats.py --seconds 600
+"""
+
+import argparse
+import logging
+import numpy
+import statistics
+import time
+from nanoloop_mobile_sample_tools import stats
+
+
+def separate(audio_array: numpy.ndarray) -> dict:
+    """Measure each statistic with its own pass over the audio.
+
+    :param numpy.ndarray audio_array:
+    :return dict:
+    """
+    return dict(
+        peak=float(numpy.max(numpy.abs(audio_array))),
+        rms=float(numpy.sqrt(numpy.mean(numpy.square(audio_array, dtype=numpy.float64)))),
+        dc_offset=float(numpy.mean(audio_array, dtype=numpy.float64)),
+        clips=int(numpy.count_nonzero(numpy.abs(audio_array) > stats.CLIP_LEVEL)),
+    )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=600.0, help="Length of the audio.")
+    parser.add_argument("--sample-rate", type=float, default=44100.0, help="Sample rate of the audio.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs timed per path.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    rng = numpy.random.default_rng(0)
+    frames = int(args.seconds * args.sample_rate)
+    audio_array = rng.uniform(-0.9, 0.9, (2, frames)).astype(numpy.float32)
+    print("{} frames of stereo".format(frames))
+    print("{:>10} {:>12} {:>12}".format("path", "median ms", "best ms"))
+    for name, run in [("separate", separate), ("one pass", stats.measure)]:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run(audio_array)
+            timings.append((time.perf_counter() - start) * 1000)
+        print("{:>10} {:>12.1f} {:>12.1f}".format(name, statistics.median(timings), min(timings)))
+
+
+if __name__ == "__main__":
+    main()
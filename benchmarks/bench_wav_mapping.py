@@ -0,0 +1,92 @@
+"""Decode throughput of memory-mapped WAV files against pedalboard.
+
+Writes a library of 16 bit PCM WAV files at the target sample rate, then
+reads every file with commands.read_audio by path, which maps the samples,
+and through an open file object, which always goes through the decoder.
+
+    python benchmarks/bench_wav_mapping.py --files 200 --duration 10
+"""
+
+import argparse
+import numpy
+import os
+import statistics
+import tempfile
+import time
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import wavio
+
+
+def make_library(directory: str, files: int, duration: float, sample_rate: int) -> list:
+    """Write a library of stereo 16 bit WAV files.
+
+    :param str directory: directory to write to.
+    :param int files: number of files.
+    :param float duration: length of each file in seconds.
+    :param int sample_rate: sample rate of the files.
+    :return list: file paths.
+    """
+    rng = numpy.random.default_rng(0)
+    frames = int(duration * sample_rate)
+    audio_array = rng.uniform(-0.5, 0.5, (2, frames)).astype(numpy.float32)
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, "sample_{}.wav".format(index))
+        with wavio.WavWriter(path, 2, sample_rate, 16, frames) as writer:
+            writer.write(audio_array)
+        paths.append(path)
+    return paths
+
+
+def read_mapped(paths: list, sample_rate: float, mono: str):
+    """Read the library by path, mapping each file.
+
+    :param list paths:
+    :param float sample_rate:
+    :param str mono:
+    """
+    for path in paths:
+        commands.read_audio(path, sample_rate, mono=mono)
+
+
+def read_decoded(paths: list, sample_rate: float, mono: str):
+    """Read the library through file objects, decoding each file.
+
+    :param list paths:
+    :param float sample_rate:
+    :param str mono:
+    """
+    for path in paths:
+        with open(path, "rb") as f:
+            commands.read_audio(f, sample_rate, mono=mono)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100, help="Files in the library.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of audio per file.")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="Sample rate of the files and output.")
+    parser.add_argument("--runs", type=int, default=5, help="Reads of the library timed per path.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_library(directory, args.files, args.duration, args.sample_rate)
+        samples = args.files * int(args.duration * args.sample_rate) * 2
+        print("{} files, {} stereo samples".format(args.files, samples))
+        print("{:>8} {:>8} {:>12} {:>12} {:>16}".format("path", "mono", "median ms", "best ms", "samples/sec"))
+        for mono in [None, 'left']:
+            for name, read in [("decoded", read_decoded), ("mapped", read_mapped)]:
+                timings = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    read(paths, args.sample_rate, mono)
+                    timings.append(time.perf_counter() - start)
+                print("{:>8} {:>8} {:>12.1f} {:>12.1f} {:>16.0f}".format(
+                    name, str(mono), statistics.median(timings) * 1000, min(timings) * 1000,
+                    samples / min(timings)
+                ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Scaling benchmark for commands.process workers.
+
+Processes a kit made by repeating the bundled test audio files with an
+increasing number of workers and reports the throughput for each.
+
+    python benchmarks/bench_workers.py --repeat 50
+"""
+
+import argparse
+import os
+import time
+from nanoloop_mobile_sample_tools import commands
+
+
+AUDIO_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "audio_files")
+
+
+def get_audio_inputs(repeat: int) -> list:
+    """Get the bundled audio files repeated to make a larger kit.
+
+    :param int repeat: number of times to repeat the bundled files.
+    :return list:
+    """
+    audio_inputs = sorted(
+        os.path.join(AUDIO_FILES, file_name)
+        for file_name in os.listdir(AUDIO_FILES)
+        if file_name.endswith(".wav")
+    )
+    return audio_inputs * repeat
+
+
+def run(audio_inputs: list, workers: int) -> float:
+    """Time a single process call.
+
+    :param list audio_inputs: audio files to process.
+    :param int workers: number of worker processes.
+    :return float: seconds taken.
+    """
+    start = time.perf_counter()
+    commands.process(
+        audio_inputs,
+        sample_rate=22050.0,
+        compress='soft',
+        normalize=True,
+        workers=workers
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="Times to repeat the bundled files.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="Largest pool size.")
+    args = parser.parse_args()
+
+    audio_inputs = get_audio_inputs(args.repeat)
+    baseline = None
+    print("{:>8} {:>10} {:>12} {:>8}".format("workers", "seconds", "files/sec", "speedup"))
+    for workers in range(1, args.max_workers + 1):
+        seconds = run(audio_inputs, workers)
+        baseline = baseline or seconds
+        print(
+            "{:>8} {:>10.3f} {:>12.1f} {:>8.2f}".format(
+                workers, seconds, len(audio_inputs) / seconds, baseline / seconds
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,15 @@
-from . import commands
-from .version import __version__, __version_info__
\ No newline at end of file
+import importlib
+from .version import __version__, __version_info__
+
+
+def __getattr__(name: str):
+    """Import commands and Pipeline on first use, so the CLI starts without numpy or pedalboard.
+
+    :param str name:
+    :return: the module or class.
+    """
+    if name == "commands":
+        return importlib.import_module(".commands", __name__)
+    if name == "Pipeline":
+        return importlib.import_module(".pipeline", __name__).Pipeline
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
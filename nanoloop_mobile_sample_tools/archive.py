@@ -0,0 +1,212 @@
+"""In-memory ZIP archives of processed audio files for the web app.
+
+Uploaded ZIP archives of a sample pack are read a member at a time, each
+audio file is decompressed when it is decoded so the pack is never extracted
+to disk or held decompressed in memory.
+"""
+
+import hashlib
+import io
+import logging
+import posixpath
+import struct
+import zipfile
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import watch
+from nanoloop_mobile_sample_tools.pipeline import Pipeline
+
+
+logger = logging.getLogger(__name__)
+
+# Decompressed bytes of the audio files in an uploaded archive, guarding against ZIP bombs
+DEFAULT_MAX_ARCHIVE_BYTES = 4 * 1024 * 1024 * 1024
+
+# Local file header before each member's name, extra field then stored bytes
+LOCAL_HEADER = struct.Struct("<4s22xHH")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+class Member:
+    """An audio file in an open ZIP archive, decompressed only when it is decoded.
+
+    The decode stage loads its bytes and drops them once decoded, so only the
+    files being decoded are open and held decompressed. Cache keys use the
+    digest of its stored bytes, so hashing never decompresses it.
+
+    :param zipfile.ZipFile upload: open archive.
+    :param zipfile.ZipInfo info: the member.
+    :param bytes sha256: digest of the member's stored bytes, see stored_digest.
+    """
+
+    def __init__(self, upload: zipfile.ZipFile, info: zipfile.ZipInfo, sha256: bytes):
+        self.upload = upload
+        self.info = info
+        self.name = info.filename
+        self.sha256 = sha256
+
+    def load(self) -> bytes:
+        """Decompress the member, opening and closing it.
+
+        :return bytes:
+        """
+        return self.upload.read(self.info)
+
+
+def get_archive_names(file_names: list, concatenate: bool = False) -> list:
+    """Get the archive member names for processed audio files.
+
+    :param list file_names: names of the uploaded audio files, or archive members
+        whose processed files keep their directory.
+    :param bool concatenate: audio files are concatenated into one output.
+    :return list:
+    """
+    if concatenate:
+        return ["processed.wav"]
+    return [
+        posixpath.join(posixpath.dirname(file_name), "processed_{}".format(posixpath.basename(file_name)))
+        for file_name in file_names
+    ]
+
+
+def audio_members(archive_file, max_bytes: int = DEFAULT_MAX_ARCHIVE_BYTES) -> list:
+    """Get the names of the audio files in a ZIP archive, from its directory alone.
+
+    Directories, hidden files and macOS resource forks are skipped.
+
+    :param archive_file: ZIP archive path or file-like object e.g. an upload.
+    :param int max_bytes: most decompressed bytes of every audio file, None for no limit.
+    :return list: member names, in archive order.
+    :raises ValueError: when the audio files decompress to more than max_bytes.
+    :raises zipfile.BadZipFile: when the archive cannot be read.
+    """
+    with zipfile.ZipFile(archive_file) as upload:
+        return [info.filename for info in _audio_infos(upload, max_bytes)]
+
+
+def _audio_infos(upload: zipfile.ZipFile, max_bytes: int) -> list:
+    """Get the infos of the audio files in an open ZIP archive, see audio_members."""
+    infos = [
+        info for info in upload.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not posixpath.basename(info.filename).startswith(".")
+        and info.filename.lower().endswith(watch.AUDIO_EXTENSIONS)
+    ]
+
+    total_bytes = sum(info.file_size for info in infos)
+    if max_bytes is not None and total_bytes > max_bytes:
+        raise ValueError(
+            "Audio files in the archive decompress to {} bytes, more than the limit of {}.".format(
+                total_bytes, max_bytes
+            )
+        )
+    return infos
+
+
+def stored_digest(archive_file, info: zipfile.ZipInfo) -> bytes:
+    """Get the sha256 digest of a member's stored, i.e. compressed, bytes without decompressing them.
+
+    :param archive_file: seekable binary file-like object of the ZIP archive.
+    :param zipfile.ZipInfo info: the member.
+    :return bytes: of the compression method, then the stored bytes.
+    :raises zipfile.BadZipFile: when the member's local header or bytes cannot be read.
+    """
+    archive_file.seek(info.header_offset)
+    header = archive_file.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size or header[:4] != LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Bad local header of {}.".format(info.filename))
+    _, name_length, extra_length = LOCAL_HEADER.unpack(header)
+    archive_file.seek(name_length + extra_length, io.SEEK_CUR)
+
+    digest = hashlib.sha256(struct.pack("<H", info.compress_type))
+    remaining = info.compress_size
+    while remaining:
+        chunk = archive_file.read(min(cache.HASH_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile("Truncated {}.".format(info.filename))
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.digest()
+
+
+def process_to_archive(
+        audio_inputs: list,
+        file_names: list,
+        result_cache: cache.ResultCache = None,
+        pipeline: Pipeline = None,
+        sidecars: bool = False,
+        **kwargs) -> bytes:
+    """Process audio inputs straight into an in-memory ZIP archive.
+
+    No temporary files are written, inputs are read from memory and every
+    output is saved to a buffer then added to the archive.
+
+    :param list audio_inputs: audio files as bytes or file-like objects e.g. uploads.
+    :param list file_names: names of the audio inputs.
+    :param cache.ResultCache result_cache: cache to reuse results from.
+    :param Pipeline pipeline: configured pipeline to process with.
+    :param bool sidecars: measure each output and add its statistics to the archive as a
+        JSON sidecar, e.g. processed_kick.json, see stats.write.
+    :param kwargs: passed to cache.process_and_save.
+    :return bytes: the ZIP archive.
+    """
+    concatenate = pipeline.concatenate if pipeline is not None else kwargs.get("concatenate", False)
+    arcnames = get_archive_names(file_names, concatenate)
+    audio_outputs = []
+    for arcname in arcnames:
+        audio_output = io.BytesIO()
+        # Names the output in logs and profiler records
+        audio_output.name = arcname
+        audio_outputs.append(audio_output)
+    stats_outputs = [io.BytesIO() for _ in arcnames] if sidecars else None
+    cache.process_and_save(
+        audio_inputs, audio_outputs, cache=result_cache, pipeline=pipeline, stats_outputs=stats_outputs, **kwargs
+    )
+
+    archive_buffer = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, "w") as archive:
+        for arcname, audio_output in zip(arcnames, audio_outputs):
+            archive.writestr(arcname, audio_output.getbuffer())
+        for arcname, stats_output in zip(arcnames, stats_outputs or []):
+            archive.writestr(stats.sidecar_path(arcname), stats_output.getbuffer())
+
+    logger.debug("Archived {} audio outputs.".format(len(arcnames)))
+    return archive_buffer.getvalue()
+
+
+def process_archive(
+        archive_file,
+        result_cache: cache.ResultCache = None,
+        pipeline: Pipeline = None,
+        max_bytes: int = DEFAULT_MAX_ARCHIVE_BYTES,
+        **kwargs) -> bytes:
+    """Process the audio files of a ZIP archive into an in-memory ZIP archive.
+
+    Each member is only decompressed by the decode stage, see Member, so with
+    a pipelined pipeline only the files in flight are held in memory.
+
+    :param archive_file: ZIP archive path or file-like object e.g. an upload.
+    :param cache.ResultCache result_cache: cache to reuse results from.
+    :param Pipeline pipeline: configured pipeline to process with.
+    :param int max_bytes: most decompressed bytes of every audio file, None for no limit.
+    :param kwargs: passed to cache.process_and_save.
+    :return bytes: the ZIP archive, with each output in the directory of its input.
+    :raises ValueError: when the archive has no audio files or too many bytes of them.
+    """
+    with zipfile.ZipFile(archive_file) as upload:
+        infos = _audio_infos(upload, max_bytes)
+        if not infos:
+            raise ValueError("No audio files in the archive.")
+
+        # Read before any member is opened, the archive's own reads seek where they need
+        if isinstance(archive_file, str):
+            with open(archive_file, "rb") as f:
+                digests = [stored_digest(f, info) for info in infos]
+        else:
+            digests = [stored_digest(archive_file, info) for info in infos]
+
+        members = [Member(upload, info, sha256) for info, sha256 in zip(infos, digests)]
+        return process_to_archive(
+            members, [info.filename for info in infos], result_cache, pipeline, **kwargs
+        )
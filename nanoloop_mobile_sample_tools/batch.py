@@ -0,0 +1,291 @@
+"""Ragged batches of many short audio samples.
+
+Kits are often hundreds of one-shots, where running each stage on each
+small array is dominated by interpreter overhead. An AudioBatch packs every
+sample into one contiguous buffer with an offset table, so peaks,
+normalize, reverse and mono each run as a few NumPy operations over the
+whole batch, and saving quantizes runs of samples up to a byte budget.
+
+    audio_batch = batch.AudioBatch.from_arrays(audio_arrays)
+    audio_batch.normalize()
+    audio_batch.reverse()
+    audio_arrays = audio_batch.to_arrays()
+"""
+
+import logging
+import numpy
+import os
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import wavio
+
+
+logger = logging.getLogger(__name__)
+
+# Most bytes of float32 samples gathered or quantized at once, so saving a large
+# kit stays within a few times this on top of the processed audio
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def fits(audio_arrays: list, max_bytes: int = DEFAULT_MAX_BYTES) -> bool:
+    """Check audio arrays are small enough to pack into one batch.
+
+    :param list audio_arrays: (channels, frames) arrays.
+    :param int max_bytes: most bytes of float32 samples in the batch.
+    :return bool:
+    """
+    return sum(audio_array.size for audio_array in audio_arrays) * numpy.dtype(numpy.float32).itemsize <= max_bytes
+
+
+class AudioBatch:
+    """Audio samples packed into one buffer.
+
+    Sample i is buffer[offsets[i]:offsets[i + 1]], its channel-major
+    (channels[i], frames) array flattened.
+
+    :param numpy.ndarray buffer: 1d float32 samples.
+    :param numpy.ndarray offsets: start of each sample and the end of the last.
+    :param numpy.ndarray channels: number of channels of each sample.
+    """
+
+    def __init__(self, buffer: numpy.ndarray, offsets: numpy.ndarray, channels: numpy.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.channels = channels
+
+    @classmethod
+    def from_arrays(cls, audio_arrays: list):
+        """Pack audio arrays into one buffer, allocated once.
+
+        :param list audio_arrays: (channels, frames) arrays.
+        :return AudioBatch:
+        """
+        sizes = numpy.array([audio_array.size for audio_array in audio_arrays], dtype=numpy.int64)
+        offsets = numpy.zeros(len(audio_arrays) + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes, out=offsets[1:])
+        channels = numpy.array([audio_array.shape[0] for audio_array in audio_arrays], dtype=numpy.int64)
+
+        buffer = numpy.empty(offsets[-1], dtype=numpy.float32)
+        for audio_array, start, end in zip(audio_arrays, offsets[:-1], offsets[1:]):
+            buffer[start:end].reshape(audio_array.shape)[...] = audio_array
+        return cls(buffer, offsets, channels)
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    @property
+    def sizes(self) -> numpy.ndarray:
+        return numpy.diff(self.offsets)
+
+    @property
+    def frames(self) -> numpy.ndarray:
+        return self.sizes // self.channels
+
+    def to_arrays(self) -> list:
+        """Unpack to (channels, frames) arrays, views of the buffer.
+
+        :return list:
+        """
+        return [
+            self.buffer[start:end].reshape(channels, -1)
+            for start, end, channels in zip(self.offsets[:-1], self.offsets[1:], self.channels)
+        ]
+
+    def peaks(self) -> numpy.ndarray:
+        """Get the absolute peak of each sample.
+
+        :return numpy.ndarray: float32, NaN for empty samples.
+        """
+        peaks = numpy.full(len(self), numpy.nan, dtype=numpy.float32)
+        filled = self.sizes > 0
+        if filled.any():
+            starts = self.offsets[:-1][filled]
+            peaks[filled] = numpy.maximum(
+                -numpy.minimum.reduceat(self.buffer, starts), numpy.maximum.reduceat(self.buffer, starts)
+            )
+        return peaks
+
+    def stats(self) -> list:
+        """Measure the statistics of every sample, as stats.measure, with a few reductions for the batch.
+
+        :return list: of dicts, see stats.summarize.
+        """
+        count = len(self)
+        minimums = numpy.zeros(count)
+        maximums = numpy.zeros(count)
+        totals = numpy.zeros(count)
+        squares = numpy.zeros(count)
+        clips = numpy.zeros(count, dtype=numpy.int64)
+        filled = self.sizes > 0
+        if filled.any():
+            starts = self.offsets[:-1][filled]
+            minimums[filled] = numpy.minimum.reduceat(self.buffer, starts)
+            maximums[filled] = numpy.maximum.reduceat(self.buffer, starts)
+            totals[filled] = numpy.add.reduceat(self.buffer, starts, dtype=numpy.float64)
+            squares[filled] = numpy.add.reduceat(numpy.square(self.buffer), starts, dtype=numpy.float64)
+            if minimums.min() < -stats.CLIP_LEVEL or maximums.max() > stats.CLIP_LEVEL:
+                clipped = numpy.abs(self.buffer) > stats.CLIP_LEVEL
+                clips[filled] = numpy.add.reduceat(clipped, starts, dtype=numpy.int64)
+
+        return [
+            stats.summarize(*sample_stats)
+            for sample_stats in zip(
+                numpy.minimum(minimums, 0.0).tolist(),
+                numpy.maximum(maximums, 0.0).tolist(),
+                totals.tolist(),
+                squares.tolist(),
+                clips.tolist(),
+                self.sizes.tolist(),
+            )
+        ]
+
+    def normalize(self, target_rms_db: float = None, batch_stats: list = None):
+        """Normalize every sample in place, see stats.normalize_factor.
+
+        :param float target_rms_db: RMS level in dBFS, None to normalize the peak.
+        :param list batch_stats: statistics of each sample from stats, None to measure them.
+        """
+        if batch_stats is None:
+            batch_stats = self.stats()
+        factors = numpy.array(
+            [stats.normalize_factor(sample_stats, target_rms_db) for sample_stats in batch_stats],
+            dtype=numpy.float32
+        )
+        self.buffer *= numpy.repeat(factors, self.sizes)
+
+    def reverse(self):
+        """Reverse every sample, like reverse_audio.
+
+        Flipping both axes of a channel-major sample reverses its flattened
+        elements, so each element is gathered from the mirrored index of its segment.
+        """
+        sizes = self.sizes
+        mirrors = numpy.repeat(self.offsets[:-1] + self.offsets[1:] - 1, sizes)
+        self.buffer = self.buffer[mirrors - numpy.arange(self.buffer.size)]
+
+    def mono(self, channel_name: str):
+        """Keep one channel of each multi-channel sample, like mono_audio.
+
+        :param str channel_name: 'left' or 'right'
+        """
+        frames = self.frames
+        channel = numpy.where(self.channels > 1, commands.mono_channel(channel_name), 0)
+        starts = self.offsets[:-1] + channel * frames
+
+        offsets = numpy.zeros_like(self.offsets)
+        numpy.cumsum(frames, out=offsets[1:])
+        self.buffer = self.buffer[numpy.repeat(starts - offsets[:-1], frames) + numpy.arange(offsets[-1])]
+        self.offsets = offsets
+        self.channels = numpy.ones_like(self.channels)
+
+    def interleaved(self, first: int = 0, last: int = None) -> numpy.ndarray:
+        """Get samples with their frames interleaved, as WAV stores them.
+
+        :param int first: index of the first sample.
+        :param int last: index after the last sample, None for the end of the batch.
+        :return numpy.ndarray: samples first to last in one buffer.
+        """
+        if last is None:
+            last = len(self)
+        starts = self.offsets[first:last]
+        start, end = self.offsets[first], self.offsets[last]
+        channels = self.channels[first:last]
+        if (channels == 1).all():
+            return self.buffer[start:end]
+
+        # Element i of an interleaved sample is frame i // channels of channel i % channels
+        sizes = self.sizes[first:last]
+        local = numpy.arange(end - start) - numpy.repeat(starts - start, sizes)
+        channels = numpy.repeat(channels, sizes)
+        frames = numpy.repeat(self.frames[first:last], sizes)
+        return self.buffer[numpy.repeat(starts, sizes) + local % channels * frames + local // channels]
+
+    def chunks(self, max_bytes: int = DEFAULT_MAX_BYTES) -> list:
+        """Split the batch into runs of whole samples of at most max_bytes of float32 each.
+
+        A sample larger than max_bytes is a run of its own.
+
+        :param int max_bytes: most bytes of samples in a run.
+        :return list: (first, last) sample index pairs, last exclusive.
+        """
+        chunks = []
+        first = 0
+        chunk_bytes = 0
+        for index, sample_bytes in enumerate((self.sizes * self.buffer.itemsize).tolist()):
+            if index > first and chunk_bytes + sample_bytes > max_bytes:
+                chunks.append((first, index))
+                first = index
+                chunk_bytes = 0
+            chunk_bytes += sample_bytes
+        if first < len(self):
+            chunks.append((first, len(self)))
+        return chunks
+
+    def save(
+            self,
+            audio_outputs: list,
+            sample_rate: float = 44100.0,
+            bit_rate: int = 16,
+            profiler: profiling.Profiler = None,
+            stats_outputs: list = None,
+            max_bytes: int = DEFAULT_MAX_BYTES) -> list:
+        """Save every sample, quantizing runs of samples at once.
+
+        :param list audio_outputs: filenames or writable file-like objects, one per sample.
+        :param float sample_rate: sample rate of output files.
+        :param int bit_rate: bit rate of output files. 8, 16 or 24 bit integer or 32 bit float.
+        :param profiling.Profiler profiler: records the quantize stage and each save.
+        :param list stats_outputs: JSON sidecar paths or writable binary file-like objects, one per
+            sample or None to skip it, to write the statistics of each sample to, see commands.save.
+            None to not measure them.
+        :param int max_bytes: most bytes of float32 samples to interleave and quantize at once, see chunks.
+        :return list: audio output file paths, or the file-like objects written to.
+        """
+        batch_stats = [None] * len(self)
+        if stats_outputs is not None:
+            with profiling.stage(profiler, "stats") as record:
+                batch_stats = self.stats()
+                record["bytes"] = self.buffer.nbytes
+
+        sampwidth = wavio.FORMATS[bit_rate][1]
+        channels = self.channels.tolist()
+        frames = self.frames.tolist()
+        saved = []
+        for first, last in self.chunks(max_bytes):
+            with profiling.stage(profiler, "quantize") as record:
+                sample_bytes = wavio.quantize(self.interleaved(first, last), bit_rate)
+                record["bytes"] = sample_bytes.nbytes
+
+            byte_offsets = ((self.offsets[first:last + 1] - self.offsets[first]) * sampwidth).tolist()
+            for index in range(first, last):
+                audio_output = audio_outputs[index]
+                file_name = commands.audio_input_name(audio_output)
+                with profiling.stage(profiler, "save", file_name) as record:
+                    data = sample_bytes[byte_offsets[index - first]:byte_offsets[index - first + 1]]
+                    wav_header = wavio.header(channels[index], sample_rate, bit_rate, frames[index])
+                    if isinstance(audio_output, str):
+                        with open(audio_output, 'wb') as f:
+                            _write_wav(f, wav_header, data)
+                        saved.append(os.path.abspath(audio_output))
+                    else:
+                        _write_wav(audio_output, wav_header, data)
+                        saved.append(audio_output)
+                    record["bytes"] = data.nbytes
+                    if batch_stats[index] is not None:
+                        record["stats"] = batch_stats[index]
+
+                if stats_outputs is not None and stats_outputs[index] is not None:
+                    logger.info("Levels of {}; {}.".format(file_name, stats.describe(batch_stats[index])))
+                    stats.write(batch_stats[index], stats_outputs[index])
+
+        logger.info("Saved {} audio files.".format(len(saved)))
+        return saved
+
+
+def _write_wav(f, wav_header: bytes, data: numpy.ndarray):
+    """Write a WAV header and sample bytes, padding the data chunk to an even length."""
+    f.write(wav_header)
+    f.write(memoryview(data))
+    if data.nbytes & 1:
+        f.write(b'\0')
@@ -0,0 +1,187 @@
+"""Export audio files at the best settings which fit a byte budget.
+
+Each input is decoded once at its own sample rate, and measured for
+silence if trimming is allowed. The size of every candidate output, for
+each sample rate, bit rate and trim, is then worked out from the frame
+counts and WAV header alone. Only the best candidate which fits is
+resampled, processed and saved.
+
+    result = budget.export(audio_inputs, audio_outputs, max_bytes=4 * 1024 * 1024, normalize=True)
+"""
+
+import logging
+import numpy
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import energy
+from nanoloop_mobile_sample_tools import plan
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import resample
+from nanoloop_mobile_sample_tools import wavio
+
+
+logger = logging.getLogger(__name__)
+
+# Sample rates and bit rates tried, as offered by nmst and the app
+SAMPLE_RATES = (44100.0, 22050.0, 11025.0, 8000.0)
+BIT_RATES = (32, 24, 16, 8)
+
+
+def candidates(sample_rate: float = 44100.0, bit_rate: int = 16, trim: bool = False) -> list:
+    """Get the settings to try, no better than those asked for, best first.
+
+    Quality is ranked by bytes per second of audio i.e. sample rate times
+    bits, then by bits. Trimming only loses silence, so without trim each
+    setting is tried whole before trimmed.
+
+    :param float sample_rate: highest sample rate.
+    :param int bit_rate: highest bit rate.
+    :param bool trim: always trim.
+    :return list: of (sample_rate, bit_rate, trim) tuples.
+    """
+    sample_rates = {rate for rate in SAMPLE_RATES if rate <= sample_rate} | {sample_rate}
+    bit_rates = [rate for rate in BIT_RATES if rate <= bit_rate]
+    settings = sorted(
+        ((rate, bits) for rate in sample_rates for bits in bit_rates),
+        key=lambda setting: (setting[0] * setting[1], setting[1]),
+        reverse=True
+    )
+    trims = (True,) if trim else (False, True)
+    return [(rate, bits, trimmed) for rate, bits in settings for trimmed in trims]
+
+
+def output_sizes(
+        sources: list,
+        candidate: tuple,
+        speed_multiplier: float = 1.0,
+        resample_quality: str = resample.DEFAULT_QUALITY) -> list:
+    """Get the size of each output file for a candidate.
+
+    Never less than the size saved, see resample.resampled_frames.
+
+    :param list sources: of (audio array, source sample rate, trim bounds) tuples.
+    :param tuple candidate: (sample_rate, bit_rate, trim).
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return list: bytes of each output.
+    """
+    sample_rate, bit_rate, trim = candidate
+    sizes = []
+    for audio_array, source_sample_rate, (start, end) in sources:
+        frames = end - start if trim else audio_array.shape[1]
+        frames = resample.resampled_frames(
+            frames, source_sample_rate, sample_rate/speed_multiplier, resample_quality
+        )
+        sizes.append(wavio.file_size(audio_array.shape[0], bit_rate, frames))
+    return sizes
+
+
+def export(
+        audio_inputs: list,
+        audio_outputs: list,
+        max_bytes: int = None,
+        max_file_bytes: int = None,
+        sample_rate: float = 44100.0,
+        bit_rate: int = 16,
+        speed_multiplier: float = 1.0,
+        mono: str = 'left',
+        trim: bool = False,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        resample_quality: str = resample.DEFAULT_QUALITY,
+        profiler: profiling.Profiler = None,
+        stats_outputs: list = None,
+        **kwargs) -> dict:
+    """Process and save audio files at the best settings which fit the budget.
+
+    Every output shares one setting so the kit stays consistent.
+
+    :param list audio_inputs: audio files, as paths, bytes or file-like objects.
+    :param list audio_outputs: output files or writable file-like objects, one per input.
+    :param int max_bytes: total bytes of every output, None for no limit.
+    :param int max_file_bytes: bytes of each output, None for no limit.
+    :param float sample_rate: highest sample rate to try.
+    :param int bit_rate: highest bit rate to try.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param bool trim: always trim silence, otherwise only trim when needed to fit.
+    :param float threshold_db: RMS level below which audio is silence.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :param profiling.Profiler profiler: records each stage for each file.
+    :param list stats_outputs: JSON sidecar paths or writable binary file-like objects, one per
+        output, to write the statistics of each output to, see commands.save. None to not measure them.
+    :param kwargs: compress, normalize, reverse, compressor and target_rms_db, see plan.Plan.
+    :return dict: the chosen sample_rate, bit_rate and trim, the total bytes saved and the outputs.
+    :raises ValueError: when no settings fit.
+    """
+    sources = []
+    for audio_input in audio_inputs:
+        file_name = commands.audio_input_name(audio_input)
+        audio_array, source_sample_rate = commands.decode_audio(audio_input, mono, profiler)
+        with profiling.stage(profiler, "measure", file_name) as record:
+            bounds = energy.trim_bounds(
+                energy.frame_energy(audio_array), audio_array.shape[1], threshold_db
+            )
+            record["bytes"] = audio_array.nbytes
+        sources.append((audio_array, source_sample_rate, bounds))
+
+    smallest = None
+    for candidate in candidates(sample_rate, bit_rate, trim):
+        sizes = output_sizes(sources, candidate, speed_multiplier, resample_quality)
+        smallest = sum(sizes) if smallest is None else min(smallest, sum(sizes))
+        if max_bytes is not None and sum(sizes) > max_bytes:
+            continue
+        if max_file_bytes is not None and sizes and max(sizes) > max_file_bytes:
+            continue
+        break
+    else:
+        raise ValueError(
+            "No settings fit {} bytes in total and {} per file, the smallest is {} bytes.".format(
+                max_bytes, max_file_bytes, smallest
+            )
+        )
+
+    chosen_sample_rate, chosen_bit_rate, chosen_trim = candidate
+    logger.info(
+        "Fitting {} files in {} bytes at {} Hz, {} bit{}.".format(
+            len(sources), sum(sizes), chosen_sample_rate, chosen_bit_rate, ", trimmed" if chosen_trim else ""
+        )
+    )
+
+    # Trim is done here on the source audio, not by the plan
+    chosen_plan = plan.Plan(
+        sample_rate=chosen_sample_rate,
+        speed_multiplier=speed_multiplier,
+        mono=mono,
+        resample_quality=resample_quality,
+        **kwargs
+    )
+    target_sample_rate = chosen_sample_rate/speed_multiplier
+    saved = []
+    saved_bytes = 0
+    for audio_input, audio_output, stats_output, (audio_array, source_sample_rate, (start, end)) in zip(
+            audio_inputs, audio_outputs, stats_outputs or [None] * len(audio_outputs), sources):
+        file_name = commands.audio_input_name(audio_input)
+        if chosen_trim:
+            audio_array = audio_array[:, start:end]
+        if source_sample_rate != target_sample_rate:
+            with profiling.stage(profiler, "resample", file_name) as record:
+                audio_array = resample.resample_audio(
+                    audio_array, source_sample_rate, target_sample_rate, resample_quality
+                )
+                record["bytes"] = audio_array.nbytes
+        else:
+            # The effects work in place
+            audio_array = numpy.array(audio_array)
+
+        audio_array = chosen_plan.effect(audio_array, profiler, file_name)
+        saved_bytes += wavio.file_size(audio_array.shape[0], chosen_bit_rate, audio_array.shape[1])
+        saved.append(
+            commands.save(audio_array, chosen_sample_rate, chosen_bit_rate, audio_output, profiler, stats_output)
+        )
+
+    return dict(
+        sample_rate=chosen_sample_rate,
+        bit_rate=chosen_bit_rate,
+        trim=chosen_trim,
+        bytes=saved_bytes,
+        outputs=saved,
+    )
@@ -0,0 +1,520 @@
+"""Content-addressed caches of processed audio.
+
+Finished WAV files are stored under a key made from the hash of the input
+bytes and every process/save setting, so a hit returns the file without
+decoding anything. The cache is capped in size and evicts the least
+recently used files first.
+
+A StageCache keeps the outputs of the expensive stages in memory, keyed on
+the input hash and the options upstream of each stage, so changing one
+option only reruns the stages after it.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import numpy
+import os
+import shutil
+import tempfile
+import threading
+from nanoloop_mobile_sample_tools import batch
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import defaults
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import version
+from nanoloop_mobile_sample_tools.pipeline import Pipeline
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "NMST_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "nanoloop_mobile_sample_tools")
+)
+DEFAULT_MAX_BYTES = defaults.DEFAULT_CACHE_MAX_BYTES
+DEFAULT_STAGE_MAX_BYTES = 128 * 1024 * 1024
+
+# Bytes read at a time when hashing inputs
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """Size capped LRU cache of processed WAV files.
+
+    :param str cache_dir: directory to store cached files in.
+    :param int max_bytes: total size of cached files before evicting.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, audio_inputs: list, **settings) -> str:
+        """Get the cache key for audio inputs processed with settings.
+
+        :param list audio_inputs: audio files, in order, as paths, bytes or file-like objects.
+        :param settings: every process and save argument affecting the output.
+        :return str:
+        """
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps(
+                dict(settings, version=version.__version__), sort_keys=True, default=str
+            ).encode()
+        )
+        for audio_input in audio_inputs:
+            _update_digest(digest, audio_input)
+            # Separate inputs so [ab, c] and [a, bc] differ
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        """Get the path of a cached file.
+
+        :param str key:
+        :return str:
+        """
+        return os.path.join(self.cache_dir, "{}.wav".format(key))
+
+    def get(self, key: str) -> str:
+        """Get a cached file, marking it as recently used.
+
+        :param str key:
+        :return str: path of the cached file or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            logger.debug("Cache miss for {}.".format(key))
+            return None
+
+        self.hits += 1
+        logger.debug("Cache hit for {}.".format(key))
+        return path
+
+    def put(self, key: str, audio_output: str) -> str:
+        """Copy a finished audio file into the cache then evict to the size cap.
+
+        :param str key:
+        :param audio_output: audio file path or file-like object to cache.
+        :return str: path of the cached file.
+        """
+        path = self.path(key)
+        # Copy then rename so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(audio_output, str):
+                with open(audio_output, "rb") as source:
+                    shutil.copyfileobj(source, f)
+            else:
+                audio_output.seek(0)
+                shutil.copyfileobj(audio_output, f)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        """Remove least recently used files until the cache fits max_bytes.
+
+        :return int: number of files removed.
+        """
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".wav"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # Evicted by another process sharing the cache
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_bytes += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+        if removed:
+            logger.debug("Evicted {} files from the cache.".format(removed))
+        return removed
+
+    def clear(self):
+        """Remove every cached file."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith((".wav", ".tmp")):
+                    os.remove(entry.path)
+
+
+class StageCache:
+    """Size capped in-memory LRU cache of stage outputs, e.g. one per app session.
+
+    Keys are tuples of the stage name, the key of its input and its options,
+    see plan.Plan. Cached arrays are shared so are made read-only, stages
+    which work in place copy them first.
+
+    :param int max_bytes: total size of cached arrays before evicting, None for no cap
+        e.g. for a cache cleared as a run goes.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_STAGE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._last_digest = (None, None)
+        self._path_digests = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def digest(self, audio_input) -> str:
+        """Get the key of an audio input, the hash of its bytes.
+
+        The digest of the last bytes input is kept, so stages run one after
+        another on the same upload hash it once, and paths are only hashed
+        again when their size or mtime changes.
+
+        :param audio_input: audio file path, bytes or file-like object.
+        :return str:
+        """
+        # Memos are shared with other threads, e.g. the app's preview and its background job,
+        # but inputs are hashed outside the lock
+        with self._lock:
+            last_input, last_digest = self._last_digest
+            if audio_input is last_input:
+                return last_digest
+
+        if isinstance(audio_input, str):
+            stat = os.stat(audio_input)
+            version = (stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                path_version, digest = self._path_digests.get(audio_input, (None, None))
+            if path_version != version:
+                digest = hash_audio_input(audio_input)
+                with self._lock:
+                    self._path_digests[audio_input] = (version, digest)
+            return digest
+
+        digest = hash_audio_input(audio_input)
+        if isinstance(audio_input, bytes):
+            with self._lock:
+                self._last_digest = (audio_input, digest)
+        return digest
+
+    def get(self, key: tuple):
+        """Get a stage output, marking it as recently used.
+
+        :param tuple key:
+        :return: the cached output or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, value):
+        """Cache a stage output then evict to the size cap.
+
+        :param tuple key:
+        :param value: an audio array, or a tuple holding audio arrays.
+        :return: the value, with its arrays read-only and owning their memory.
+        """
+        if isinstance(value, tuple):
+            value = tuple(_freeze(item) for item in value)
+        else:
+            value = _freeze(value)
+        nbytes = _nbytes(value)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            logger.debug("Not caching {} bytes of {}.".format(nbytes, key[0]))
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.max_bytes is not None and self.nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_bytes
+        return value
+
+    def stage(self, key: tuple, function, profiler: profiling.Profiler = None, file_name: str = None):
+        """Get a stage output, running the stage on a miss.
+
+        :param tuple key:
+        :param callable function: runs the stage, taking no arguments.
+        :param profiling.Profiler profiler: records a reuse stage on a hit.
+        :param str file_name: name of the audio for the profiler.
+        :return: the stage output, see put.
+        """
+        value = self.get(key)
+        if value is None:
+            return self.put(key, function())
+
+        logger.debug("Reusing {} for {}.".format(key[0], file_name))
+        with profiling.stage(profiler, "reuse", file_name) as record:
+            record["bytes"] = _nbytes(value)
+        return value
+
+    def clear(self):
+        """Remove every cached output."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self._last_digest = (None, None)
+            self._path_digests.clear()
+
+
+def _nbytes(value) -> int:
+    """Get the bytes held by the arrays of a stage output.
+
+    :return int:
+    """
+    items = value if isinstance(value, tuple) else (value,)
+    return sum(item.nbytes for item in items if isinstance(item, numpy.ndarray))
+
+
+def _freeze(audio_array):
+    """Make an array safe to share, copying it if it views memory it does not own e.g. a mapped file.
+
+    :param audio_array: numpy.ndarray or anything else, left alone.
+    :return:
+    """
+    if not isinstance(audio_array, numpy.ndarray):
+        return audio_array
+    if not audio_array.flags.owndata:
+        audio_array = audio_array.copy()
+    audio_array.flags.writeable = False
+    return audio_array
+
+
+def process_and_save(
+        audio_inputs: list,
+        audio_outputs: list,
+        cache: ResultCache = None,
+        sample_rate: float = 44100.0,
+        bit_rate: int = 16,
+        pipeline: Pipeline = None,
+        profiler: profiling.Profiler = None,
+        stage_cache: StageCache = None,
+        stats_outputs: list = None,
+        **kwargs) -> list:
+    """Process and save audio files, reusing cached results.
+
+    Only inputs which miss the cache are decoded and processed. When the
+    pipeline slices, every input is processed and each output is saved as
+    numbered slices, see commands.save_slices.
+
+    :param list audio_inputs: audio files, as paths, bytes or file-like objects.
+    :param list audio_outputs: output files or writable file-like objects,
+        one per input or one when concatenating.
+    :param ResultCache cache: cache to use, None to always process.
+    :param float sample_rate: sample rate of output files.
+    :param int bit_rate: bit rate of output files.
+    :param Pipeline pipeline: configured pipeline to process with, instead of
+        building one from sample_rate and kwargs.
+    :param profiling.Profiler profiler: records each stage for each file, including cache hits.
+    :param StageCache stage_cache: reuse stage outputs of earlier runs on a miss, see Pipeline.
+    :param list stats_outputs: JSON sidecar paths or writable binary file-like objects, one per
+        audio output, to write the statistics of each output to as it is saved, see commands.save.
+        Cached outputs are measured from the cached file. None to not measure them.
+    :param kwargs: process options passed to Pipeline.
+    :return list: audio output file paths, or the file-like objects written to.
+        Every slice path when slicing.
+    """
+    if pipeline is None:
+        pipeline = Pipeline(sample_rate=sample_rate, **kwargs)
+    sample_rate = pipeline.sample_rate
+
+    if pipeline.concatenate:
+        groups = [audio_inputs]
+    else:
+        groups = [[audio_input] for audio_input in audio_inputs]
+    if stats_outputs is None:
+        measured_outputs = [None] * len(audio_outputs)
+    else:
+        measured_outputs = stats_outputs
+
+    if pipeline.slices is not None:
+        # The number of slices is only known once processed, so cannot be cached as one file
+        logger.debug("Not caching sliced outputs.")
+        processed_audio_arrays = pipeline(audio_inputs, profiler, stage_cache)
+        return [
+            slice_output
+            for audio_output, stats_output, processed_audio_array in zip(
+                audio_outputs, measured_outputs, processed_audio_arrays
+            )
+            for slice_output in commands.save_slices(
+                processed_audio_array,
+                pipeline.slices,
+                sample_rate=sample_rate,
+                bit_rate=bit_rate,
+                audio_output=audio_output,
+                threshold_db=pipeline.threshold_db,
+                profiler=profiler,
+                stats_output=stats_output
+            )
+        ]
+
+    if cache is None:
+        keys = [None] * len(groups)
+    else:
+        settings = dict(pipeline.settings(), bit_rate=bit_rate)
+        keys = [cache.key(group, **settings) for group in groups]
+
+    missed = []
+    for key, group, audio_output, stats_output in zip(keys, groups, audio_outputs, measured_outputs):
+        cached_path = cache.get(key) if cache is not None else None
+        if cached_path is None:
+            missed.append((key, group, audio_output, stats_output))
+        else:
+            file_name = commands.audio_input_name(audio_output)
+            logger.info("Using cached audio for {}.".format(file_name))
+            try:
+                with profiling.stage(profiler, "cache", file_name) as record:
+                    record["bytes"] = _copy_to_output(cached_path, audio_output)
+                    if stats_output is not None:
+                        # Empty outputs have no frames to map, so report them as the miss did
+                        measured = audio_output if isinstance(audio_output, str) else cached_path
+                        audio_stats = stats.measure_wav(measured) or stats.Meter().stats()
+                        record["stats"] = audio_stats
+            except FileNotFoundError:
+                # Evicted by another process or app session since the hit
+                logger.info("Cached audio for {} was evicted, processing it.".format(file_name))
+                cache.hits -= 1
+                cache.misses += 1
+                if not isinstance(audio_output, str):
+                    audio_output.seek(0)
+                    audio_output.truncate()
+                missed.append((key, group, audio_output, stats_output))
+                continue
+            if stats_output is not None:
+                logger.info("Levels of {}; {}.".format(file_name, stats.describe(audio_stats)))
+                stats.write(audio_stats, stats_output)
+
+    if missed:
+        missed_inputs = [audio_input for _, group, _, _ in missed for audio_input in group]
+        if pipeline.pipelined and pipeline.block_size is None and not pipeline.concatenate:
+            # Each output is saved on its own thread while the next input is processed
+            pipeline.run_overlapped(
+                missed_inputs,
+                profiler,
+                stage_cache,
+                encode=lambda index, processed_audio_array: commands.save(
+                    processed_audio_array,
+                    sample_rate=sample_rate,
+                    bit_rate=bit_rate,
+                    audio_output=missed[index][2],
+                    profiler=profiler,
+                    stats_output=missed[index][3]
+                )
+            )
+        else:
+            processed_audio_arrays = pipeline(missed_inputs, profiler, stage_cache)
+            batched = len(missed) > 1 and batch.fits(processed_audio_arrays, batch.DEFAULT_MAX_BYTES)
+            if pipeline.block_size is None and batched:
+                # Quantize a kit of short outputs as one batch
+                batch.AudioBatch.from_arrays(processed_audio_arrays).save(
+                    [audio_output for _, _, audio_output, _ in missed],
+                    sample_rate,
+                    bit_rate,
+                    profiler,
+                    stats_outputs=None if stats_outputs is None else [stats_output for _, _, _, stats_output in missed]
+                )
+            else:
+                # Larger outputs are each quantized and written in chunks
+                for (_, _, audio_output, stats_output), processed_audio_array in zip(missed, processed_audio_arrays):
+                    commands.save(
+                        processed_audio_array,
+                        sample_rate=sample_rate,
+                        bit_rate=bit_rate,
+                        audio_output=audio_output,
+                        profiler=profiler,
+                        stats_output=stats_output
+                    )
+        if cache is not None:
+            for key, _, audio_output, _ in missed:
+                cache.put(key, audio_output)
+
+    if cache is not None:
+        logger.info("Cache hits {}, misses {}.".format(cache.hits, cache.misses))
+
+    return [
+        os.path.abspath(audio_output) if isinstance(audio_output, str) else audio_output
+        for audio_output in audio_outputs
+    ]
+
+
+def hash_audio_input(audio_input) -> str:
+    """Get the sha256 hex digest of an audio input's bytes.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :return str:
+    """
+    digest = hashlib.sha256()
+    _update_digest(digest, audio_input)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, audio_input):
+    """Add the bytes of an audio input to a hash digest.
+
+    File-like objects are read from the start and rewound afterwards, and
+    inputs only read when decoded, e.g. archive.Member, add their sha256 digest.
+
+    :param digest: hashlib hash object.
+    :param audio_input: audio file path, bytes, file-like object or object with a load method.
+    """
+    if isinstance(audio_input, (bytes, bytearray, memoryview)):
+        digest.update(audio_input)
+    elif isinstance(audio_input, str):
+        with open(audio_input, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    elif callable(getattr(audio_input, "load", None)):
+        digest.update(audio_input.sha256)
+    else:
+        audio_input.seek(0)
+        for chunk in iter(lambda: audio_input.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        audio_input.seek(0)
+
+
+def _copy_to_output(cached_path: str, audio_output) -> int:
+    """Copy a cached file to an output path or file-like object.
+
+    :param str cached_path:
+    :param audio_output: audio file path or writable file-like object.
+    :return int: bytes copied.
+    :raises FileNotFoundError: when the cached file has been evicted, before the output is written.
+    """
+    with open(cached_path, "rb") as f:
+        if isinstance(audio_output, str):
+            with open(audio_output, "wb") as output_file:
+                shutil.copyfileobj(f, output_file)
+        else:
+            shutil.copyfileobj(f, audio_output)
+        return f.tell()
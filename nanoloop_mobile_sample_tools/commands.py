@@ -6,20 +6,39 @@ Should only support basic actions in fixed order:
 2. Mono (None L R)
 3. Resample (44k 22k 11k) [output sample rate]
 4. Speed up (1x 2x 4x 8x)
-5. Compress (None, Soft, Hard)
-6. Normalize (T/F)
-7. Reverse (T/F)
+5. Trim silence (T/F)
+6. Compress (None, Soft, Hard)
+7. Normalize (T/F)
+8. Reverse (T/F)
+9. Slice when saving (None, N equal slices, at onsets)
 """
 
+import io
+import itertools
 import pedalboard
 import logging
 import numpy
 import os
-import wave
+import tempfile
+from nanoloop_mobile_sample_tools import defaults
+from nanoloop_mobile_sample_tools import energy
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import resample
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import wavio
 
 
 logger = logging.getLogger(__name__)
 
+# Frames per block when streaming
+DEFAULT_BLOCK_SIZE = defaults.DEFAULT_BLOCK_SIZE
+
+# Gain and compressor settings for each compression type
+COMPRESSOR_SETTINGS = {
+    'soft': dict(gain_db=2, threshold_db=-10, ratio=10),
+    'hard': dict(gain_db=10, threshold_db=-20, ratio=20),
+}
+
 
 def process(
         audio_inputs: list,
@@ -29,17 +48,43 @@ def process(
         mono: str = 'left',
         compress: str = None,
         normalize: bool = False,
-        reverse: bool = False) -> list:
+        reverse: bool = False,
+        workers: int = 1,
+        block_size: int = None,
+        resample_quality: str = resample.DEFAULT_QUALITY,
+        trim: bool = False,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        profiler: profiling.Profiler = None,
+        presets: list = None,
+        pipelined: bool = False,
+        target_rms_db: float = None) -> list:
     """Process the audio files.
 
-    :param list audio_inputs: list of audio files.
+    :param list audio_inputs: list of audio files, as paths, bytes or file-like objects,
+        e.g. the paths matching a query of the sample index from index.select.
     :param bool concatenate: concatenate the audio files before processing. (default; False)
     :param str mono: make audio mono. 'left' or 'right' or None i.e. leave it alone (default; None)
     :param int speed_multiplier: speed up the sample by a factor. (default; 1.0)
     :param str compress: compress the audio. 'soft' or 'hard' or None i.e. leave it alone (default; None)
-    :param bool normalize: normalize the audio to 0 db. (default; False)
+    :param bool normalize: normalize the absolute peak of the audio to 0 db. (default; False)
     :param bool reverse: reverse the audio. (default; False)
-    :return list: array of processed audio files.
+    :param int workers: number of processes to spread the files over, None for all cores.
+        Concatenating always runs serially. (default; 1)
+    :param int block_size: stream the audio in blocks of this many frames, memory stays bounded
+        by the block size. Returns block iterators for save instead of arrays. (default; None)
+    :param str resample_quality: 'fast', 'standard' or 'high'. Integer downsampling ratios
+        are decimated, others use pedalboard's resampler. (default; 'standard')
+    :param bool trim: trim leading and trailing silence before the effects. (default; False)
+    :param float threshold_db: RMS level below which audio is silence. (default; -60.0)
+    :param profiling.Profiler profiler: records each stage for each file. (default; None)
+    :param list presets: process the audio files with each of these dicts of options, which
+        override the options above, sharing every stage they have in common, see fanout. Cannot be
+        used with workers or block_size. (default; None)
+    :param bool pipelined: decode the next file on its own thread while processing each one, with
+        at most a few decoded files waiting. Cannot be used with workers. (default; False)
+    :param float target_rms_db: normalize to this RMS level in dBFS rather than the peak, without
+        taking the peak past 0 db. (default; None)
+    :return list: array of processed audio files, or with presets a dict of preset name to arrays.
     """
     logger.info("Processing {} audio inputs.".format(len(audio_inputs)))
     logger.debug(
@@ -47,57 +92,459 @@ def process(
             "process called with the following args; "
             "audio_inputs={audio_inputs}, concatenate={concatenate}, mono={mono}, "
             "compress={compress}, speed_multiplier={speed_multiplier}, "
-            "normalize={normalize}, reverse={reverse}, sample_rate={sample_rate}"
+            "normalize={normalize}, reverse={reverse}, sample_rate={sample_rate}, "
+            "workers={workers}, block_size={block_size}, resample_quality={resample_quality}, "
+            "trim={trim}, threshold_db={threshold_db}, pipelined={pipelined}, target_rms_db={target_rms_db}"
         ).format(
-            audio_inputs=audio_inputs,
+            audio_inputs=[audio_input_name(audio_input) for audio_input in audio_inputs],
             sample_rate=sample_rate,
             speed_multiplier=speed_multiplier,
             concatenate=concatenate,
             mono=mono,
             compress=compress,
             normalize=normalize,
-            reverse=reverse
+            reverse=reverse,
+            workers=workers,
+            block_size=block_size,
+            resample_quality=resample_quality,
+            trim=trim,
+            threshold_db=threshold_db,
+            pipelined=pipelined,
+            target_rms_db=target_rms_db
         )
     )
-    audio_arrays = []
-    for audio_input in audio_inputs:
-        with pedalboard.io.AudioFile(audio_input, 'r').resampled_to(sample_rate/speed_multiplier) as f:
-            audio_arrays.append(f.read(f.frames))
+    if presets is not None:
+        # Imported here as fanout builds on cache, which imports this module
+        from nanoloop_mobile_sample_tools import fanout
+
+        preset_audio_arrays = fanout.render(
+            audio_inputs,
+            presets,
+            profiler=profiler,
+            sample_rate=sample_rate,
+            speed_multiplier=speed_multiplier,
+            concatenate=concatenate,
+            mono=mono,
+            compress=compress,
+            normalize=normalize,
+            reverse=reverse,
+            workers=workers,
+            block_size=block_size,
+            resample_quality=resample_quality,
+            trim=trim,
+            threshold_db=threshold_db,
+            pipelined=pipelined,
+            target_rms_db=target_rms_db
+        )
+        logger.info("Completed processing {} presets.".format(len(preset_audio_arrays)))
+        return preset_audio_arrays
+
+    # Imported here as pipeline builds on plan, which imports this module
+    from nanoloop_mobile_sample_tools import pipeline
+
+    processing_pipeline = pipeline.Pipeline(
+        sample_rate=sample_rate,
+        speed_multiplier=speed_multiplier,
+        concatenate=concatenate,
+        mono=mono,
+        compress=compress,
+        normalize=normalize,
+        reverse=reverse,
+        workers=workers,
+        block_size=block_size,
+        resample_quality=resample_quality,
+        trim=trim,
+        threshold_db=threshold_db,
+        pipelined=pipelined,
+        target_rms_db=target_rms_db
+    )
+    audio_arrays = processing_pipeline(audio_inputs, profiler)
 
-    if mono is not None:
-        audio_arrays = [mono_audio(audios_array, mono) for audios_array in audio_arrays]
+    logger.info("Completed processing, outputting {} audio arrays.".format(len(audio_arrays)))
+    return audio_arrays
 
-    if concatenate:
-        logger.debug("Concatenating {} audio arrays.".format(len(audio_arrays)))
-        audio_arrays = [concatenate_audio(audio_arrays)]
 
+def open_audio(audio_input):
+    """Open an audio file for reading.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :return pedalboard.io.ReadableAudioFile:
+    """
+    if isinstance(audio_input, (bytes, bytearray, memoryview)):
+        audio_input = io.BytesIO(audio_input)
+    return pedalboard.io.AudioFile(audio_input, 'r')
+
+
+def audio_input_name(audio_input) -> str:
+    """Get a short name for an audio input to use in logs.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :return str:
+    """
+    if isinstance(audio_input, str):
+        return audio_input
+    if isinstance(audio_input, (bytes, bytearray, memoryview)):
+        return "<{} bytes>".format(len(audio_input))
+    return getattr(audio_input, "name", None) or repr(audio_input)
+
+
+def load_audio_input(audio_input):
+    """Get the bytes of an audio input only read when it is decoded, e.g. an archive.Member.
+
+    :param audio_input: audio file path, bytes, file-like object or object with a load method.
+    :return: the loaded bytes, otherwise the audio input unchanged.
+    """
+    load = getattr(audio_input, "load", None)
+    return load() if callable(load) else audio_input
+
+
+def read_audio(
+        audio_input,
+        sample_rate: float = 44100.0,
+        speed_multiplier: float = 1.0,
+        mono: str = 'left',
+        profiler: profiling.Profiler = None,
+        resample_quality: str = resample.DEFAULT_QUALITY) -> numpy.ndarray:
+    """Decode, optionally make mono and resample a single audio file.
+
+    The mono channel is picked before resampling so the discarded channel
+    is never resampled, and files already at the target rate are not resampled.
+    PCM and float WAV files are memory-mapped rather than decoded, and only
+    the mono channel is converted to float.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param profiling.Profiler profiler: records the decode, mono and resample stages.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return numpy.ndarray:
+    """
+    audio_array, source_sample_rate = decode_audio(audio_input, mono, profiler)
+
+    target_sample_rate = sample_rate/speed_multiplier
+    if source_sample_rate != target_sample_rate:
+        with profiling.stage(profiler, "resample", audio_input_name(audio_input)) as record:
+            audio_array = resample.resample_audio(
+                audio_array, source_sample_rate, target_sample_rate, resample_quality
+            )
+            record["bytes"] = audio_array.nbytes
+
+    return audio_array
+
+
+def decode_audio(audio_input, mono: str = 'left', profiler: profiling.Profiler = None) -> tuple:
+    """Decode and optionally make mono a single audio file at its own sample rate.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param profiling.Profiler profiler: records the decode and mono stages.
+    :return tuple: the audio array and its sample rate.
+    """
+    file_name = audio_input_name(audio_input)
+    with profiling.stage(profiler, "decode", file_name) as record:
+        audio_input = load_audio_input(audio_input)
+        reader = wavio.WavReader.open(audio_input)
+        if reader is None:
+            with open_audio(audio_input) as f:
+                source_sample_rate = f.samplerate
+                audio_array = f.read(f.frames)
+        else:
+            source_sample_rate = reader.samplerate
+            audio_array = reader.samples
+            if mono is None or reader.num_channels == 1:
+                audio_array = reader.read()
+        record["bytes"] = audio_array.nbytes
+
+    if mono is not None and reader is not None and reader.num_channels > 1:
+        with profiling.stage(profiler, "mono", file_name) as record:
+            audio_array = reader.read(channel=mono_channel(mono))
+            record["bytes"] = audio_array.nbytes
+    elif mono is not None and audio_array.shape[0] > 1:
+        with profiling.stage(profiler, "mono", file_name) as record:
+            audio_array = mono_audio(audio_array, mono)
+            record["bytes"] = audio_array.nbytes
+
+    return audio_array, source_sample_rate
+
+
+def effect_audio(
+        audio_array: numpy.ndarray,
+        sample_rate: float = 44100.0,
+        compress: str = None,
+        normalize: bool = False,
+        reverse: bool = False) -> numpy.ndarray:
+    """Apply compression, normalization and reversal to an audio array, in that order.
+
+    :param numpy.ndarray audio_array:
+    :param float sample_rate: sample rate passed to the compressor.
+    :param str compress: 'soft' or 'hard' or None i.e. leave it alone
+    :param bool normalize: normalize the audio to 0 db.
+    :param bool reverse: reverse the audio.
+    :return numpy.ndarray:
+    """
     if compress is not None:
-        audio_arrays = [compress_audio(audio_array, compress, sample_rate) for audio_array in audio_arrays]
-        
+        audio_array = compress_audio(audio_array, compress, sample_rate)
+
     if normalize:
-        audio_arrays = [peak_normalize_audio(audios_array) for audios_array in audio_arrays]
+        audio_array = peak_normalize_audio(audio_array)
 
     if reverse:
-        audio_arrays = [reverse_audio(audio_array) for audio_array in audio_arrays]
+        audio_array = reverse_audio(audio_array)
 
-    logger.info("Completed processing, outputting {} audio arrays.".format(len(audio_arrays)))
-    return audio_arrays
+    return audio_array
+
+
+def read_audio_blocks(
+        audio_input: str,
+        sample_rate: float = 44100.0,
+        speed_multiplier: float = 1.0,
+        mono: str = 'left',
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        channels: int = None,
+        resample_quality: str = resample.DEFAULT_QUALITY):
+    """Decode, optionally make mono and resample a single audio file block by block.
+
+    As with read_audio the mono channel is picked before resampling, and PCM
+    and float WAV files are converted straight from the mapped file.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param int block_size: frames per block.
+    :param int channels: duplicate mono blocks up to this many channels i.e. mono -> stereo
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return generator: of numpy.ndarray blocks.
+    """
+    audio_input = load_audio_input(audio_input)
+    reader = wavio.WavReader.open(audio_input)
+    audio_file = reader if reader is not None else open_audio(audio_input)
+    try:
+        channel = None
+        if mono is not None and audio_file.num_channels > 1:
+            channel = mono_channel(mono)
+
+        resampler = None
+        target_sample_rate = sample_rate/speed_multiplier
+        if audio_file.samplerate != target_sample_rate:
+            resampler = resample.resampler(
+                audio_file.samplerate,
+                target_sample_rate,
+                audio_file.num_channels if channel is None else 1,
+                resample_quality
+            )
+
+        start = 0
+        while True:
+            if reader is not None:
+                block = reader.read(start, block_size, channel)
+            else:
+                block = audio_file.read(block_size)
+            if not block.shape[1]:
+                break
+            start += block.shape[1]
+
+            if reader is None and channel is not None:
+                block = mono_audio(block, mono)
+
+            if resampler is not None:
+                block = resampler.process(block)
+            if block.shape[1]:
+                yield _broadcast_channels(block, channels)
+
+        if resampler is not None:
+            block = resampler.process()
+            if block.shape[1]:
+                yield _broadcast_channels(block, channels)
+    finally:
+        if reader is None:
+            audio_file.close()
+
+
+def _broadcast_channels(block: numpy.ndarray, channels: int) -> numpy.ndarray:
+    """Duplicate a mono block up to a number of channels.
+
+    :param numpy.ndarray block:
+    :param int channels: None to leave the block alone.
+    :return numpy.ndarray:
+    """
+    if channels is not None and block.shape[0] < channels:
+        # A view, mono is not copied to each channel
+        block = numpy.broadcast_to(block, (channels, block.shape[1]))
+    return block
+
+
+def effect_audio_blocks(
+        audio_blocks,
+        sample_rate: float = 44100.0,
+        compress: str = None,
+        normalize: bool = False,
+        reverse: bool = False,
+        compressor: dict = None,
+        target_rms_db: float = None):
+    """Apply compression, normalization and reversal to audio blocks, in that order.
+
+    The compressor keeps its state across blocks. Normalize and reverse need the
+    whole signal, so the compressed blocks are first spooled to a temporary file
+    while measuring them, then read back forwards or backwards.
+
+    :param iterable audio_blocks: numpy.ndarray blocks.
+    :param float sample_rate: sample rate passed to the compressor.
+    :param str compress: 'soft' or 'hard' or None i.e. leave it alone
+    :param bool normalize: normalize the audio to 0 db.
+    :param bool reverse: reverse the audio.
+    :param dict compressor: settings overriding the compression type, see compressor_board.
+    :param float target_rms_db: normalize to this RMS level in dBFS rather than the peak.
+    :return generator: of numpy.ndarray blocks.
+    """
+    if compress is not None:
+        audio_blocks = compress_audio_blocks(audio_blocks, compress, sample_rate, compressor)
+
+    if not (normalize or reverse):
+        yield from audio_blocks
+        return
+
+    with tempfile.TemporaryFile() as spool:
+        channels = 1
+        frames = 0
+        meter = stats.Meter()
+        block_size = DEFAULT_BLOCK_SIZE
+        for block in audio_blocks:
+            channels, block_frames = block.shape
+            block_size = max(block_size, block_frames)
+            frames += block_frames
+            meter.add(block)
+            # Spool frames interleaved so they can be sliced in either direction
+            spool.write(numpy.ascontiguousarray(block.T, dtype=numpy.float32).tobytes())
+
+        if not frames:
+            return
+
+        spool.flush()
+        frames_array = numpy.memmap(spool, dtype=numpy.float32, mode='r', shape=(frames, channels))
+        factor = stats.normalize_factor(meter.stats(), target_rms_db) if normalize else None
+        starts = range(0, frames, block_size)
+        if reverse:
+            starts = reversed(starts)
+
+        for start in starts:
+            block = frames_array[start:start + block_size].T
+            if reverse:
+                block = reverse_audio(block)
+            if factor is None:
+                yield numpy.array(block)
+            else:
+                yield block * factor
+
+        del frames_array
+
+
+def compress_audio_blocks(
+        audio_blocks,
+        compress: str,
+        sample_rate: float,
+        compressor: dict = None,
+        max_block_size: int = DEFAULT_BLOCK_SIZE):
+    """Compress audio blocks, keeping the compressor state across them.
+
+    pedalboard resets a plugin whenever a block is longer than any before it,
+    or has a different number of channels, so the board is prepared with the
+    longest block up front and longer blocks are split.
+
+    :param iterable audio_blocks: numpy.ndarray blocks.
+    :param str compress: 'soft' or 'hard'
+    :param float sample_rate: sample rate passed to the compressor.
+    :param dict compressor: settings overriding the compression type, see compressor_board.
+    :param int max_block_size: frames passed to the compressor at a time.
+    :return generator: of numpy.ndarray blocks.
+    """
+    board = None
+    for block in audio_blocks:
+        if board is None:
+            board = compressor_board(compress, **(compressor or {}))
+            board(numpy.zeros((block.shape[0], max_block_size), dtype=numpy.float32), sample_rate)
+            board.reset()
+
+        for start in range(0, block.shape[1], max_block_size):
+            yield board(block[:, start:start + max_block_size], sample_rate, reset=False)
+
+
+def concatenate_audio_blocks(
+        audio_inputs: list,
+        sample_rate: float,
+        speed_multiplier: float,
+        mono: str,
+        block_size: int,
+        resample_quality: str = resample.DEFAULT_QUALITY):
+    """Stream the audio files one after another as a single block iterator.
+
+    For joins too large to hold in memory, pass the blocks to save to write
+    them straight into the output file. Mono blocks are broadcast to stereo
+    when any input is stereo.
+
+    :param list audio_inputs: audio file paths, bytes or file-like objects.
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param int block_size: frames per block.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return generator: of numpy.ndarray blocks.
+    """
+    channels = 1
+    if mono is None:
+        for audio_input in audio_inputs:
+            input_channels, _ = audio_info(audio_input)
+            channels = max(channels, input_channels)
+
+    for audio_input in audio_inputs:
+        yield from read_audio_blocks(
+            audio_input, sample_rate, speed_multiplier, mono, block_size, channels, resample_quality
+        )
 
 
 def save(
         processed_audio_array: numpy.ndarray,
         sample_rate: float = 44100.0,
         bit_rate: int = 16,
-        audio_output: str = "output.wav") -> str:
+        audio_output="output.wav",
+        profiler: profiling.Profiler = None,
+        stats_output=None) -> str:
     """Save the processed audio files.
 
-    :param list processed_audio: list of processed audio arrays.
+    :param numpy.ndarray processed_audio_array: processed audio array, or an iterable of
+        audio blocks from a streaming process which are written as they arrive.
     :param float sample_rate: sample rate of output files.
-    :param int bit_rate: bit rate of output files.
-    :param str audio_output: filename to output to. If multiple files present use a prefix.
-    :return str: audio output file path
+    :param int bit_rate: bit rate of output files. 8, 16 or 24 bit integer or 32 bit float.
+    :param audio_output: filename to output to, or a writable file-like object e.g. io.BytesIO.
+        If multiple files present use a prefix.
+    :param profiling.Profiler profiler: records the save stage. When streaming this
+        includes processing the blocks as they arrive.
+    :param stats_output: JSON sidecar path, or writable binary file-like object, to write the
+        statistics of the saved audio to, measured as it is written, see stats.write.
+        They are also added to the save record as 'stats'. None to not measure it.
+    :return str: audio output file path, or the file-like object written to.
     """
-    logger.info("Saving processed audio array to {}.".format(audio_output))
+    saved, audio_stats = _save(
+        processed_audio_array, sample_rate, bit_rate, audio_output, profiler, stats_output is not None
+    )
+    if stats_output is not None:
+        stats.write(audio_stats, stats_output)
+    return saved
+
+
+def _save(
+        processed_audio_array: numpy.ndarray,
+        sample_rate: float,
+        bit_rate: int,
+        audio_output,
+        profiler: profiling.Profiler,
+        measure: bool) -> tuple:
+    """Save the processed audio, measuring each block before it is converted if asked.
+
+    :return tuple: the audio output file path or file-like object, and its statistics or None.
+    """
+    logger.info("Saving processed audio array to {}.".format(audio_input_name(audio_output)))
     logger.debug(
         (
             "save the processed audio with the following args; "
@@ -106,36 +553,172 @@ def save(
         ).format(
             sample_rate=sample_rate,
             bit_rate=bit_rate,
-            audio_output=audio_output
+            audio_output=audio_input_name(audio_output)
         )
     )
-    data = None
-    sampwidth = None
-    if bit_rate == 8:
-        # 8-bit
-        sampwidth = 1
-        multiplier = 127
-        data = (
-            (processed_audio_array * multiplier) + multiplier
-        ).astype(numpy.uint8)
-    else: # bit_rate == 16:
-        # 16 bit
-        sampwidth = 2
-        multiplier = 32767
-        data = (
-            processed_audio_array * multiplier
-        ).astype(numpy.int16)
-    
-    # Let the operation fail if bit-rate is not valid, i.e. data is None
-    with wave.open(audio_output, 'w') as f:
-        f.setnchannels(processed_audio_array.shape[0])
-        f.setsampwidth(sampwidth) # 1=8-bit unsigned, 2=16-bit signed 
-        f.setframerate(sample_rate)
-        f.writeframes(data)
-
+    audio_blocks = processed_audio_array
+    nframes = 0
+    if isinstance(processed_audio_array, numpy.ndarray):
+        audio_blocks = [processed_audio_array]
+        nframes = processed_audio_array.shape[1]
+
+    meter = stats.Meter() if measure else None
+    audio_stats = None
+    with profiling.stage(profiler, "save", audio_input_name(audio_output)) as record:
+        audio_blocks = iter(audio_blocks)
+        first_block = next(audio_blocks, None)
+        nchannels = 1 if first_block is None else first_block.shape[0]
+
+        with wavio.WavWriter(audio_output, nchannels, sample_rate, bit_rate, nframes) as writer:
+            if first_block is not None:
+                for block in itertools.chain([first_block], audio_blocks):
+                    if meter is not None:
+                        meter.add(block)
+                    writer.write(block)
+        record["bytes"] = writer.nframes_written * writer.nchannels * writer.sampwidth
+        if meter is not None:
+            audio_stats = record["stats"] = meter.stats()
+
+    if audio_stats is not None:
+        logger.info("Levels of {}; {}.".format(audio_input_name(audio_output), stats.describe(audio_stats)))
     logger.info("Completed saving audio files.")
 
-    return os.path.abspath(audio_output)
+    if not isinstance(audio_output, str):
+        return audio_output, audio_stats
+    return os.path.abspath(audio_output), audio_stats
+
+
+def get_audio_outputs(audio_inputs: list, audio_output: str, concatenate: bool = False) -> list:
+    """Get the output filenames for the audio inputs.
+
+    Each output is named '{prefix}_{suffix}.wav' from the audio output and input
+    filenames, unless concatenating to a single audio output.
+
+    :param list audio_inputs: audio files to process in order.
+    :param str audio_output: audio output filename.
+    :param bool concatenate: audio inputs are concatenated into one output.
+    :return list:
+    """
+    if concatenate:
+        return [audio_output]
+
+    _, output_filename = os.path.split(audio_output)
+    prefix, _ = os.path.splitext(output_filename)
+
+    audio_outputs = []
+    for audio_input in audio_inputs:
+        _, input_filename = os.path.split(audio_input)
+        suffix, _ = os.path.splitext(input_filename)
+        audio_outputs.append("{prefix}_{suffix}.wav".format(prefix=prefix, suffix=suffix))
+    return audio_outputs
+
+
+def slice_outputs(audio_output: str, count: int) -> list:
+    """Get the output filenames for slices of an audio output.
+
+    Each slice is named '{prefix}_{suffix}.wav' from the audio output filename
+    and the slice number, padded so they sort in order.
+
+    :param str audio_output: audio output filename.
+    :param int count: number of slices.
+    :return list:
+    """
+    directory, output_filename = os.path.split(audio_output)
+    prefix, _ = os.path.splitext(output_filename)
+    width = len(str(count))
+    return [
+        os.path.join(directory, "{prefix}_{suffix}.wav".format(prefix=prefix, suffix=str(index).zfill(width)))
+        for index in range(1, count + 1)
+    ]
+
+
+def save_slices(
+        processed_audio_array: numpy.ndarray,
+        slices,
+        sample_rate: float = 44100.0,
+        bit_rate: int = 16,
+        audio_output: str = "output.wav",
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        profiler: profiling.Profiler = None,
+        stats_output=None) -> list:
+    """Split the processed audio into equal slices or at onsets and save each one.
+
+    Streamed blocks are spooled to a temporary file so the slices are found
+    and written with memory bounded by the block size.
+
+    :param numpy.ndarray processed_audio_array: processed audio array, or an iterable of
+        audio blocks from a streaming process.
+    :param slices: number of equal slices, or 'onsets' to split where sounds start.
+    :param float sample_rate: sample rate of output files.
+    :param int bit_rate: bit rate of output files. 8, 16 or 24 bit integer or 32 bit float.
+    :param str audio_output: filename slices are named after, see slice_outputs.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param profiling.Profiler profiler: records the slice stage and each save.
+    :param stats_output: JSON sidecar path, or writable binary file-like object, to write
+        the statistics of each slice to, see save. None to not measure them.
+    :return list: audio output file paths.
+    """
+    if not isinstance(audio_output, str):
+        raise ValueError("Slices are saved to files named after the audio output, got {}.".format(
+            audio_input_name(audio_output)
+        ))
+
+    if isinstance(processed_audio_array, numpy.ndarray):
+        return _save_slices(
+            processed_audio_array, slices, sample_rate, bit_rate, audio_output, threshold_db, profiler, stats_output
+        )
+
+    with tempfile.TemporaryFile() as spool:
+        channels = 1
+        frames = 0
+        for block in processed_audio_array:
+            channels = block.shape[0]
+            frames += block.shape[1]
+            spool.write(numpy.ascontiguousarray(block.T, dtype=numpy.float32).tobytes())
+        spool.flush()
+
+        frames_array = None
+        audio_array = numpy.zeros((channels, 0), dtype=numpy.float32)
+        if frames:
+            frames_array = numpy.memmap(spool, dtype=numpy.float32, mode='r', shape=(frames, channels))
+            audio_array = frames_array.T
+        saved = _save_slices(
+            audio_array, slices, sample_rate, bit_rate, audio_output, threshold_db, profiler, stats_output
+        )
+        del audio_array, frames_array
+        return saved
+
+
+def _save_slices(
+        audio_array: numpy.ndarray,
+        slices,
+        sample_rate: float,
+        bit_rate: int,
+        audio_output: str,
+        threshold_db: float,
+        profiler: profiling.Profiler,
+        stats_output=None) -> list:
+    """Split a whole or memory-mapped audio array and save the slices.
+
+    :return list: audio output file paths.
+    """
+    with profiling.stage(profiler, "slice", audio_input_name(audio_output)) as record:
+        points = slice_points(audio_array, slices, sample_rate, threshold_db)
+        record["bytes"] = audio_array.nbytes
+
+    saved = []
+    slice_stats = []
+    outputs = slice_outputs(audio_output, len(points) - 1)
+    for start, end, slice_output in zip(points[:-1], points[1:], outputs):
+        # The writer converts a chunk at a time, so mapped slices are never read whole
+        saved_slice, audio_stats = _save(
+            audio_array[:, start:end], sample_rate, bit_rate, slice_output, profiler, stats_output is not None
+        )
+        saved.append(saved_slice)
+        slice_stats.append(audio_stats)
+    if stats_output is not None:
+        stats.write(slice_stats, stats_output)
+    return saved
 
 
 def mono_audio(audio_array: numpy.ndarray, channel_name: str) -> numpy.ndarray:
@@ -143,39 +726,138 @@ def mono_audio(audio_array: numpy.ndarray, channel_name: str) -> numpy.ndarray:
 
     :return numpy.ndarray:
     """
+    return numpy.array([audio_array[mono_channel(channel_name)]])
+
+
+def mono_channel(channel_name: str) -> int:
+    """Get the index of the channel kept when making audio mono.
+
+    :param str channel_name: 'left' or 'right'
+    :return int:
+    """
     # Left is 0? shrug
-    channel = audio_array[0]
     if channel_name == 'right':
-        channel = audio_array[1]
-    return numpy.array([channel])
+        return 1
+    return 0
 
 
 def peak_normalize_audio(audio_array: numpy.ndarray) -> numpy.ndarray:
-    """Perform peak normalization on audio array.
+    """Perform peak normalization on audio array, bringing its absolute peak up to 1.0.
 
     :return numpy.ndarray:
     """
-    maximum = numpy.max(audio_array)
-    delta = 1.0 - maximum
-    factor = 1.0 + (delta/maximum)
-    return audio_array * factor
+    return audio_array * stats.normalize_factor(stats.measure(audio_array))
 
 
-def concatenate_audio(audio_arrays: numpy.ndarray) -> numpy.ndarray:
+def concatenate_audio(audio_arrays: list) -> numpy.ndarray:
     """Concatenate audio arrays.
 
+    The output is allocated once and mono arrays are broadcast into
+    stereo as they are copied in. The audio arrays are left untouched.
+
     :return numpy.ndarray:
     """
     # get max channels 1 or 2
     max_channels = max([audio_array.shape[0] for audio_array in audio_arrays])
+    frames = sum(audio_array.shape[1] for audio_array in audio_arrays)
 
-    for index in range(len(audio_arrays)):
+    concatenated_array = numpy.empty(
+        (max_channels, frames), dtype=numpy.result_type(*audio_arrays)
+    )
+    start = 0
+    for audio_array in audio_arrays:
+        end = start + audio_array.shape[1]
         # If max channels is more than this audio array
-        # duplicate its channels i.e. mono -> stereo
-        if audio_arrays[index].shape[0] < max_channels:
-            audio_arrays[index] = numpy.concatenate([audio_arrays[index], audio_arrays[index]])
-    
-    return numpy.concatenate(audio_arrays, axis = 1)
+        # its channels are duplicated i.e. mono -> stereo
+        concatenated_array[:, start:end] = audio_array
+        start = end
+
+    return concatenated_array
+
+
+def concatenate_audio_files(
+        audio_inputs: list,
+        sample_rate: float = 44100.0,
+        speed_multiplier: float = 1.0,
+        mono: str = 'left',
+        profiler: profiling.Profiler = None,
+        resample_quality: str = resample.DEFAULT_QUALITY) -> numpy.ndarray:
+    """Decode audio files straight into one concatenated array.
+
+    The output size comes from the file headers, so it is allocated once
+    and only one decoded file is held alongside it at a time.
+
+    :param list audio_inputs: audio file paths, bytes or file-like objects.
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param profiling.Profiler profiler: records each stage.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return numpy.ndarray:
+    """
+    audio_infos = [
+        audio_info(audio_input, sample_rate, speed_multiplier, resample_quality) for audio_input in audio_inputs
+    ]
+    channels = 1 if mono is not None else max(channels for channels, _ in audio_infos)
+    frames = sum(frames for _, frames in audio_infos)
+    concatenated_array = numpy.empty((channels, frames), dtype=numpy.float32)
+
+    start = 0
+    for index, (audio_input, (_, expected_frames)) in enumerate(zip(audio_inputs, audio_infos)):
+        audio_array = read_audio(audio_input, sample_rate, speed_multiplier, mono, profiler, resample_quality)
+        if audio_array.shape[1] != expected_frames:
+            # Header was off, join what is left the slow way
+            logger.debug(
+                "Expected {} frames from {} but decoded {}.".format(
+                    expected_frames, audio_input_name(audio_input), audio_array.shape[1]
+                )
+            )
+            remaining_arrays = [
+                read_audio(remaining_input, sample_rate, speed_multiplier, mono, profiler, resample_quality)
+                for remaining_input in audio_inputs[index + 1:]
+            ]
+            return concatenate_audio([concatenated_array[:, :start], audio_array] + remaining_arrays)
+
+        with profiling.stage(profiler, "concatenate", audio_input_name(audio_input)):
+            concatenated_array[:, start:start + expected_frames] = audio_array
+        start += expected_frames
+
+    return concatenated_array
+
+
+def audio_info(
+        audio_input,
+        sample_rate: float = 44100.0,
+        speed_multiplier: float = 1.0,
+        resample_quality: str = resample.DEFAULT_QUALITY) -> tuple:
+    """Read the channels and resampled length of an audio file from its header.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param str resample_quality: 'fast', 'standard' or 'high'.
+    :return tuple: number of channels and frames.
+    """
+    audio_input = load_audio_input(audio_input)
+    reader = wavio.WavReader.open(audio_input)
+    if reader is None:
+        with open_audio(audio_input) as f:
+            channels, source_sample_rate, frames = f.num_channels, f.samplerate, f.frames
+    else:
+        channels, source_sample_rate, frames = reader.num_channels, reader.samplerate, reader.frames
+
+    target_sample_rate = sample_rate/speed_multiplier
+    if source_sample_rate == target_sample_rate:
+        return channels, frames
+
+    factor = resample.decimation_factor(source_sample_rate, target_sample_rate, resample_quality)
+    if factor is not None:
+        # Decimation keeps every factor-th frame
+        return channels, -(-frames // factor)
+
+    quality, _, _, _ = resample.QUALITIES[resample_quality]
+    with open_audio(audio_input).resampled_to(target_sample_rate, quality) as f:
+        return f.num_channels, f.frames
 
 
 def compress_audio(audio_array: numpy.ndarray, compress: str, sample_rate: float) -> numpy.ndarray:
@@ -185,25 +867,125 @@ def compress_audio(audio_array: numpy.ndarray, compress: str, sample_rate: float
     :param str compress: compression type 'hard' or 'soft'
     :return numpy.ndarray:
     """
-    board = pedalboard.Pedalboard()
-    
-    gain = pedalboard.Gain(gain_db=2)
-    compressor = pedalboard.Compressor(threshold_db=-10, ratio=10)
-
-    if compress == 'hard':
-        gain = pedalboard.Gain(gain_db=10)
-        compressor = pedalboard.Compressor(threshold_db=-20, ratio=20)
-    
-    board.append(gain)
-    board.append(compressor)
-
+    board = compressor_board(compress)
     effected = board(audio_array, sample_rate)
     return effected
 
 
+def compressor_board(compress: str, **settings) -> pedalboard.Pedalboard:
+    """Build the gain and compressor pedalboard.
+
+    :param str compress: compression type 'hard' or 'soft'
+    :param settings: override the compression type settings; gain_db, threshold_db,
+        ratio, attack_ms and release_ms.
+    :return pedalboard.Pedalboard:
+    """
+    settings = dict(COMPRESSOR_SETTINGS.get(compress, COMPRESSOR_SETTINGS['soft']), **settings)
+    gain = pedalboard.Gain(gain_db=settings.pop('gain_db'))
+    compressor = pedalboard.Compressor(**settings)
+    return pedalboard.Pedalboard([gain, compressor])
+
+
 def reverse_audio(audio_array: numpy.ndarray) -> numpy.ndarray:
     """Reverse the audio array.
 
     :return numpy.ndarray:
     """
-    return numpy.flip(audio_array)
\ No newline at end of file
+    return numpy.flip(audio_array)
+
+
+def trim_audio(
+        audio_array: numpy.ndarray,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        frame_size: int = energy.DEFAULT_FRAME_SIZE) -> numpy.ndarray:
+    """Trim leading and trailing silence, to the window.
+
+    :param numpy.ndarray audio_array:
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param int frame_size: frames per window.
+    :return numpy.ndarray: a view of the audio array.
+    """
+    start, end = energy.trim_bounds(
+        energy.frame_energy(audio_array, frame_size), audio_array.shape[1], threshold_db, frame_size
+    )
+    return audio_array[:, start:end]
+
+
+def trim_audio_blocks(
+        audio_blocks,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        frame_size: int = energy.DEFAULT_FRAME_SIZE):
+    """Trim leading and trailing silence from audio blocks, as trim_audio.
+
+    Blocks are cut on window boundaries so the windows match the whole
+    array. Silent blocks are held in memory until a louder block follows
+    them, and dropped if none does.
+
+    :param iterable audio_blocks: numpy.ndarray blocks.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param int frame_size: frames per window.
+    :return generator: of numpy.ndarray blocks.
+    """
+    started = False
+    silent_blocks = []
+    for block in energy.window_blocks(audio_blocks, frame_size):
+        loud = energy.loud_windows(energy.frame_energy(block, frame_size), threshold_db)
+        if not loud.any():
+            if started:
+                silent_blocks.append(block)
+            continue
+
+        first = 0 if started else int(numpy.argmax(loud)) * frame_size
+        last = (len(loud) - int(numpy.argmax(loud[::-1]))) * frame_size
+        yield from silent_blocks
+        yield block[:, first:last]
+        silent_blocks = [block[:, last:]] if last < block.shape[1] else []
+        started = True
+
+
+def slice_points(
+        audio_array: numpy.ndarray,
+        slices,
+        sample_rate: float = 44100.0,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        frame_size: int = energy.DEFAULT_FRAME_SIZE) -> list:
+    """Get the frames audio is split at.
+
+    :param numpy.ndarray audio_array: shape (channels, frames).
+    :param slices: number of equal slices, or 'onsets' to split where sounds start.
+    :param float sample_rate: sample rate of the audio.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param int frame_size: frames per window.
+    :return list: the start of each slice then the end of the last.
+    """
+    frames = audio_array.shape[1]
+    if slices == 'onsets':
+        onsets = energy.onset_frames(
+            energy.frame_energy(audio_array, frame_size), sample_rate, threshold_db, frame_size=frame_size
+        )
+        # Anything before the first onset stays with the first slice
+        points = [0] + [onset for onset in onsets if 0 < onset < frames] + [frames]
+    elif isinstance(slices, int) and slices > 0:
+        points = sorted(set((numpy.arange(slices + 1) * frames // slices).tolist()))
+    else:
+        raise ValueError("Unsupported slices {}, expected a positive number or 'onsets'.".format(slices))
+    return points if frames else [0, 0]
+
+
+def slice_audio(
+        audio_array: numpy.ndarray,
+        slices,
+        sample_rate: float = 44100.0,
+        threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+        frame_size: int = energy.DEFAULT_FRAME_SIZE) -> list:
+    """Split audio into equal slices or at onsets.
+
+    :param numpy.ndarray audio_array:
+    :param slices: number of equal slices, or 'onsets' to split where sounds start.
+    :param float sample_rate: sample rate of the audio.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param int frame_size: frames per window.
+    :return list: views of the audio array.
+    """
+    points = slice_points(audio_array, slices, sample_rate, threshold_db, frame_size)
+    return [audio_array[:, start:end] for start, end in zip(points[:-1], points[1:])]
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""Default options shared by the CLI and the processing modules.
+
+Kept free of numpy and pedalboard, so nmst parses its arguments without
+importing them.
+"""
+
+RESAMPLE_QUALITIES = ('fast', 'standard', 'high')
+DEFAULT_RESAMPLE_QUALITY = 'standard'
+
+# RMS level in dB below which audio is silence
+DEFAULT_THRESHOLD_DB = -60.0
+
+# Frames per block when streaming
+DEFAULT_BLOCK_SIZE = 65536
+
+# Size of the processed audio cache before evicting
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
@@ -0,0 +1,139 @@
+"""Windowed energy of audio, for trimming silence and slicing at onsets.
+
+Audio is split into fixed windows of frames and the mean square of each is
+summed over strided views, so measuring is O(n) without copying the audio.
+Blocks regrouped onto window boundaries give the same windows as the
+whole array, so streamed and whole files are trimmed and sliced alike.
+"""
+
+import numpy
+from nanoloop_mobile_sample_tools import defaults
+
+
+# Frames per window
+DEFAULT_FRAME_SIZE = 512
+
+# Frames summed at a time, bounding the memory used on mapped files
+DEFAULT_CHUNK_SIZE = 65536
+
+# Windows quieter than this RMS level are silence
+DEFAULT_THRESHOLD_DB = defaults.DEFAULT_THRESHOLD_DB
+
+# Rise in level from one window to the next which starts a sound
+DEFAULT_ONSET_DB = 6.0
+
+# Shortest time between onsets
+DEFAULT_MIN_SLICE_SECONDS = 0.05
+
+
+def frame_energy(audio_array: numpy.ndarray, frame_size: int = DEFAULT_FRAME_SIZE) -> numpy.ndarray:
+    """Get the mean square of each window of frames over every channel.
+
+    Windows are strided views of the audio, summed a block at a time so no
+    copy of the audio is made, and the last window may be short. Blocks
+    split on window boundaries give the same energies as the whole array.
+
+    :param numpy.ndarray audio_array: shape (channels, frames), e.g. a memory-mapped file.
+    :param int frame_size: frames per window.
+    :return numpy.ndarray: float32 energy of each window.
+    """
+    channels, frames = audio_array.shape
+    energies = numpy.empty(-(-frames // frame_size), dtype=numpy.float32)
+    chunk_size = frame_size * max(DEFAULT_CHUNK_SIZE // frame_size, 1)
+    for start in range(0, frames, chunk_size):
+        chunk = audio_array[:, start:start + chunk_size]
+        full = chunk.shape[1] // frame_size
+        windows = chunk[:, :full * frame_size].reshape(channels, full, frame_size)
+        index = start // frame_size
+        energies[index:index + full] = numpy.einsum('cwf,cwf->w', windows, windows)
+        energies[index:index + full] /= channels * frame_size
+        if chunk.shape[1] > full * frame_size:
+            tail = chunk[:, full * frame_size:]
+            energies[index + full] = numpy.einsum('cf,cf->', tail, tail) / tail.size
+    return energies
+
+
+def loud_windows(energies: numpy.ndarray, threshold_db: float = DEFAULT_THRESHOLD_DB) -> numpy.ndarray:
+    """Get which windows are louder than a threshold.
+
+    :param numpy.ndarray energies: energy of each window, see frame_energy.
+    :param float threshold_db: RMS level in dB.
+    :return numpy.ndarray: of bool.
+    """
+    return energies > 10.0 ** (threshold_db / 10.0)
+
+
+def trim_bounds(
+        energies: numpy.ndarray,
+        frames: int,
+        threshold_db: float = DEFAULT_THRESHOLD_DB,
+        frame_size: int = DEFAULT_FRAME_SIZE) -> tuple:
+    """Get the first and last frame of the audio between leading and trailing silence.
+
+    :param numpy.ndarray energies: energy of each window, see frame_energy.
+    :param int frames: number of frames of the audio.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param int frame_size: frames per window.
+    :return tuple: start and end frame, (0, 0) when it is all silence.
+    """
+    loud = loud_windows(energies, threshold_db)
+    if not loud.any():
+        return 0, 0
+    first = int(numpy.argmax(loud))
+    last = len(loud) - int(numpy.argmax(loud[::-1]))
+    return first * frame_size, min(last * frame_size, frames)
+
+
+def window_blocks(audio_blocks, frame_size: int):
+    """Regroup audio blocks so each but the last is a whole number of windows.
+
+    Frames left over from a block are joined to the start of the next.
+
+    :param iterable audio_blocks: numpy.ndarray blocks.
+    :param int frame_size: frames per window.
+    :return generator: of numpy.ndarray blocks.
+    """
+    remainder = None
+    for block in audio_blocks:
+        if remainder is not None:
+            block = numpy.concatenate([remainder, block], axis=1)
+        end = block.shape[1] - block.shape[1] % frame_size
+        remainder = block[:, end:] if end < block.shape[1] else None
+        if end:
+            yield block[:, :end]
+    if remainder is not None:
+        yield remainder
+
+
+def onset_frames(
+        energies: numpy.ndarray,
+        sample_rate: float = 44100.0,
+        threshold_db: float = DEFAULT_THRESHOLD_DB,
+        onset_db: float = DEFAULT_ONSET_DB,
+        min_slice_seconds: float = DEFAULT_MIN_SLICE_SECONDS,
+        frame_size: int = DEFAULT_FRAME_SIZE) -> list:
+    """Find the frames where sounds start.
+
+    An onset is a window louder than the threshold whose level rose by at
+    least onset_db from the window before. Onsets closer than the shortest
+    slice to the one before are ignored.
+
+    :param numpy.ndarray energies: energy of each window, see frame_energy.
+    :param float sample_rate: sample rate of the audio.
+    :param float threshold_db: windows quieter than this RMS level are silence.
+    :param float onset_db: rise in level which starts a sound.
+    :param float min_slice_seconds: shortest time between onsets.
+    :param int frame_size: frames per window.
+    :return list: onset frames, in order.
+    """
+    levels = 10.0 * numpy.log10(numpy.maximum(energies, numpy.finfo(numpy.float32).tiny))
+    rises = numpy.diff(levels, prepend=-numpy.inf)
+    candidates = numpy.flatnonzero(loud_windows(energies, threshold_db) & (rises >= onset_db))
+
+    min_frames = min_slice_seconds * sample_rate
+    onsets = []
+    for window in candidates.tolist():
+        frame = window * frame_size
+        if not onsets or frame - onsets[-1] >= min_frames:
+            onsets.append(frame)
+    return onsets
@@ -0,0 +1,241 @@
+"""Render several presets of the same audio inputs from one shared stage tree.
+
+A preset is a set of process options and a bit rate. Each input is run
+through every preset before the next, and presets are run in the order of
+their stages, so those sharing a decode, resample or compress run one after
+another through one cache.StageCache: decode and mono run once for each
+input, and each later stage once for each distinct set of options upstream
+of it, branching only where the presets differ. The stage cache only holds
+the stages of the input being rendered, or of every input when they are
+concatenated.
+
+    presets = [
+        dict(name="hifi", sample_rate=44100.0, bit_rate=16),
+        dict(name="lofi", sample_rate=11025.0, bit_rate=8, compress='hard'),
+    ]
+    saved = fanout.export(audio_inputs, audio_outputs, presets, output_dir="kits")
+"""
+
+import json
+import logging
+import os
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools.pipeline import Pipeline
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIT_RATE = 16
+
+# Plan stages which presets can share, see branches
+SHARED_STAGES = ("decode", "mono", "resample", "concatenate", "compress")
+
+
+def preset_name(preset: dict) -> str:
+    """Get the name of a preset, also its output directory.
+
+    :param dict preset: options, with an optional name.
+    :return str: the name, or one made from the sample rate, bit rate and compression.
+    """
+    if preset.get("name"):
+        return str(preset["name"])
+    name = "{}Hz_{}bit".format(int(preset.get("sample_rate", 44100.0)), preset.get("bit_rate", DEFAULT_BIT_RATE))
+    if preset.get("compress"):
+        name += "_{}".format(preset["compress"])
+    return name
+
+
+def pipelines(presets: list, **defaults) -> list:
+    """Build a pipeline for each preset, in the order of the shared stage tree.
+
+    :param list presets: dicts of Pipeline options, bit_rate and an optional name.
+    :param defaults: options for every preset, which presets override.
+    :return list: of (name, pipeline, bit_rate) tuples.
+    :raises ValueError: for unknown options, presets setting concatenate, streaming
+        blocks or using workers, which do not share stages, or presets with the same name.
+    """
+    built = []
+    for preset in presets:
+        if "concatenate" in preset:
+            raise ValueError("Concatenate changes the outputs, set it for every preset rather than in {}.".format(
+                preset
+            ))
+        options = dict(defaults, **preset)
+        name = preset_name(options)
+        options.pop("name", None)
+        bit_rate = options.pop("bit_rate", DEFAULT_BIT_RATE)
+        try:
+            pipeline = Pipeline(**options)
+        except TypeError as error:
+            raise ValueError("Unsupported option in preset {}: {}".format(name, error))
+        if pipeline.block_size is not None or pipeline.workers != 1:
+            raise ValueError("Presets share stages in memory, so cannot set block_size or workers in {}.".format(
+                name
+            ))
+        built.append((name, pipeline, bit_rate))
+
+    names = [name for name, _, _ in built]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Presets share the names {}, give each a name.".format(duplicates))
+
+    # Sorting is stable, presets sharing a stage are made adjacent and keep their order
+    return sorted(built, key=lambda item: branches(item[1]))
+
+
+def branches(pipeline: Pipeline) -> tuple:
+    """Get the stages of a pipeline which presets can share, from the root of the tree.
+
+    :param Pipeline pipeline:
+    :return tuple: a description of each stage.
+    """
+    stages = [
+        "decode, mono {}".format(pipeline.mono),
+        "resample to {} Hz at {} quality".format(
+            pipeline.sample_rate/pipeline.speed_multiplier, pipeline.resample_quality
+        ),
+    ]
+    if pipeline.concatenate:
+        stages.append("concatenate")
+    if pipeline.compress is not None:
+        stages.append(
+            "{}compress '{}' at {} Hz{}".format(
+                "trim below {} dB, ".format(pipeline.threshold_db) if pipeline.trim else "",
+                pipeline.compress,
+                pipeline.sample_rate,
+                " with {}".format(json.dumps(pipeline.compressor, sort_keys=True)) if pipeline.compressor else ""
+            )
+        )
+    return tuple(stages)
+
+
+def explain(presets: list, **defaults) -> str:
+    """Describe the shared stage tree of presets, each stage once with the presets under it.
+
+    :param list presets: see pipelines.
+    :param defaults: options for every preset.
+    :return str:
+    """
+    lines = ["Stage tree of {} presets:".format(len(presets))]
+    previous = ()
+    for name, pipeline, bit_rate in pipelines(presets, **defaults):
+        stages = branches(pipeline)
+        shared = 0
+        while shared < min(len(stages), len(previous)) and stages[shared] == previous[shared]:
+            shared += 1
+        for depth, stage in enumerate(stages[shared:], start=shared):
+            lines.append("{}{}".format("  " * depth, stage))
+        # Trim is shared along with compress, everything else runs for each preset
+        rest = [
+            stage for stage, _ in pipeline.stages
+            if stage not in SHARED_STAGES and not (stage == "trim" and pipeline.compress is not None)
+        ]
+        lines.append("{}{}: {}{} bit".format(
+            "  " * len(stages), name, "".join("{}, ".format(stage) for stage in rest), bit_rate
+        ))
+        previous = stages
+    return "\n".join(lines)
+
+
+def render(
+        audio_inputs: list,
+        presets: list,
+        stage_cache: cache.StageCache = None,
+        profiler: profiling.Profiler = None,
+        **defaults) -> dict:
+    """Process audio inputs with each preset.
+
+    :param list audio_inputs: audio files, as paths, bytes or file-like objects.
+    :param list presets: see pipelines, bit rates are ignored.
+    :param cache.StageCache stage_cache: shares stages between presets, None for a new
+        cache holding the stages of one input at a time.
+    :param profiling.Profiler profiler: records each stage, and each reuse of one.
+    :param defaults: options for every preset.
+    :return dict: preset name to processed audio arrays, read-only where shared between presets.
+    """
+    built = pipelines(presets, **defaults)
+    logger.debug(explain(presets, **defaults))
+    owned = stage_cache is None
+    if owned:
+        stage_cache = cache.StageCache(max_bytes=None)
+
+    rendered = {name: [] for name, _, _ in built}
+    for group, _ in _groups(built, audio_inputs):
+        for name, pipeline, _ in built:
+            rendered[name].extend(pipeline(group, profiler, stage_cache))
+        if owned:
+            stage_cache.clear()
+    return rendered
+
+
+def export(
+        audio_inputs: list,
+        audio_outputs: list,
+        presets: list,
+        output_dir: str = ".",
+        result_cache: cache.ResultCache = None,
+        stage_cache: cache.StageCache = None,
+        profiler: profiling.Profiler = None,
+        sidecars: bool = False,
+        **defaults) -> dict:
+    """Process and save audio inputs with each preset, into a directory per preset.
+
+    :param list audio_inputs: audio files, as paths, bytes or file-like objects.
+    :param list audio_outputs: output filenames, one per input or one when concatenating,
+        saved as '{output_dir}/{preset name}/{filename}'.
+    :param list presets: see pipelines.
+    :param str output_dir: directory of the preset directories.
+    :param cache.ResultCache result_cache: cache of finished files, None to always process.
+    :param cache.StageCache stage_cache: shares stages between presets, None for a new
+        cache holding the stages of one input at a time.
+    :param profiling.Profiler profiler: records each stage, and each reuse of one.
+    :param bool sidecars: write the statistics of each output to a JSON sidecar next to it,
+        see stats.sidecar_path.
+    :param defaults: options for every preset.
+    :return dict: preset name to the saved file paths.
+    """
+    built = pipelines(presets, **defaults)
+    logger.info(explain(presets, **defaults))
+    owned = stage_cache is None
+    if owned:
+        stage_cache = cache.StageCache(max_bytes=None)
+
+    saved = {name: [] for name, _, _ in built}
+    for name, _, _ in built:
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+    for group, group_outputs in _groups(built, audio_inputs, audio_outputs):
+        for name, pipeline, bit_rate in built:
+            preset_outputs = [
+                os.path.join(output_dir, name, os.path.basename(audio_output)) for audio_output in group_outputs
+            ]
+            saved[name].extend(cache.process_and_save(
+                group,
+                preset_outputs,
+                cache=result_cache,
+                bit_rate=bit_rate,
+                pipeline=pipeline,
+                profiler=profiler,
+                stage_cache=stage_cache,
+                stats_outputs=[stats.sidecar_path(output) for output in preset_outputs] if sidecars else None,
+            ))
+        if owned:
+            stage_cache.clear()
+
+    for name, _, _ in built:
+        logger.info("Saved preset {} to {}.".format(name, os.path.join(output_dir, name)))
+    return saved
+
+
+def _groups(built: list, audio_inputs: list, audio_outputs: list = None) -> list:
+    """Split audio inputs, and their outputs, into the groups run through every preset in turn.
+
+    :param list built: see pipelines.
+    :return list: of (inputs, outputs) tuples, each input alone unless concatenating.
+    """
+    if built and built[0][1].concatenate:
+        return [(audio_inputs, audio_outputs)]
+    if audio_outputs is None:
+        audio_outputs = [None] * len(audio_inputs)
+    return [([audio_input], [audio_output]) for audio_input, audio_output in zip(audio_inputs, audio_outputs)]
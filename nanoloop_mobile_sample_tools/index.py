@@ -0,0 +1,297 @@
+"""SQLite catalog of sample libraries, read from file headers.
+
+nmst index walks a directory tree with a pool of threads, reading only the
+header of each audio file, and stores its path, size, mtime, duration,
+channels, sample rate and bit rate. Files whose size and mtime have not
+changed are skipped on the next run, and files which have gone are dropped.
+Peak and RMS levels need the samples so are only measured on request, and
+kept until the file changes.
+
+Queries filter the catalog into an input list for nmst or process.
+
+    with index.Index() as catalog:
+        catalog.update("~/samples")
+    audio_arrays = commands.process(index.select("channels=1", "duration<0.5", "path~*kick*"))
+"""
+
+import concurrent.futures
+import logging
+import os
+import re
+import sqlite3
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import watch
+from nanoloop_mobile_sample_tools import wavio
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "NMST_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nanoloop_mobile_sample_tools", "index.sqlite")
+)
+
+COLUMNS = (
+    "path", "size", "mtime", "duration", "frames", "channels", "sample_rate", "bit_rate", "peak", "rms"
+)
+
+# Query operators and their SQL, ~ matches a glob pattern
+OPERATORS = {"<=": "<=", ">=": ">=", "!=": "!=", "=": "=", "<": "<", ">": ">", "~": "GLOB"}
+
+FILTER_PATTERN = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>|~)\s*(.*?)\s*$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    duration REAL,
+    frames INTEGER,
+    channels INTEGER,
+    sample_rate REAL,
+    bit_rate INTEGER,
+    peak REAL,
+    rms REAL
+)
+"""
+
+
+class Index:
+    """Catalog of audio files in a SQLite database.
+
+    :param str path: database file, created if missing.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or DEFAULT_INDEX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def update(self, directory: str, workers: int = None, levels: bool = False) -> dict:
+        """Add new and changed audio files under a directory, and drop those which have gone.
+
+        :param str directory: root of the tree to walk.
+        :param int workers: number of threads walking and reading headers, None for a default.
+        :param bool levels: also measure the peak and RMS level of files without them.
+        :return dict: counts of files added, updated, removed and unchanged.
+        """
+        root = os.path.abspath(os.path.expanduser(directory))
+        known = {
+            path: (size, mtime, peak)
+            for path, size, mtime, peak in self.connection.execute(
+                "SELECT path, size, mtime, peak FROM samples WHERE substr(path, 1, ?) = ?",
+                (len(root) + 1, root + os.sep)
+            )
+        }
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            found = walk(root, executor)
+            changed = [
+                (path, size, mtime) for path, (size, mtime) in found.items()
+                if path not in known or known[path][:2] != (size, mtime) or (levels and known[path][2] is None)
+            ]
+            rows = [
+                row for row in executor.map(lambda entry: _read_row(*entry, levels=levels), changed)
+                if row is not None
+            ]
+
+        # Gone, or changed and no longer readable
+        unreadable = {path for path, _, _ in changed} - {row[0] for row in rows}
+        removed = [(path,) for path in known if path not in found or path in unreadable]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO samples ({}) VALUES ({})".format(
+                    ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))
+                ),
+                rows
+            )
+            self.connection.executemany("DELETE FROM samples WHERE path = ?", removed)
+
+        added = sum(1 for row in rows if row[0] not in known)
+        counts = dict(
+            added=added,
+            updated=len(rows) - added,
+            removed=len(removed),
+            unchanged=len(found) - len(changed),
+        )
+        logger.info(
+            "Indexed {}; {added} added, {updated} updated, {removed} removed, {unchanged} unchanged.".format(
+                root, **counts
+            )
+        )
+        return counts
+
+    def query(self, *filters, order_by: str = "path", limit: int = None) -> list:
+        """Get the paths of audio files matching every filter.
+
+        :param filters: strings of a column, an operator and a value e.g. 'channels=1',
+            'duration<0.5' or 'path~*/kicks/*'. Operators; =, !=, <, <=, >, >= and ~ for a glob.
+        :param str order_by: column to sort by.
+        :param int limit: most paths to return, None for every match.
+        :return list: audio file paths.
+        """
+        if order_by not in COLUMNS:
+            raise ValueError("Unsupported column {}, expected one of {}.".format(order_by, COLUMNS))
+
+        clauses = []
+        values = []
+        for query_filter in filters:
+            column, operator, value = parse_filter(query_filter)
+            clauses.append("{} {} ?".format(column, OPERATORS[operator]))
+            values.append(value)
+
+        sql = "SELECT path FROM samples"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY {}".format(order_by)
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(limit)
+        return [path for path, in self.connection.execute(sql, values)]
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+
+def select(*filters, index_path: str = None, **kwargs) -> list:
+    """Get the paths of indexed audio files matching every filter, see Index.query.
+
+    :param filters: e.g. 'channels=1'.
+    :param str index_path: database file, default DEFAULT_INDEX_PATH.
+    :param kwargs: order_by and limit.
+    :return list: audio file paths, an input list for nmst or process.
+    """
+    with Index(index_path) as catalog:
+        return catalog.query(*filters, **kwargs)
+
+
+def parse_filter(query_filter: str) -> tuple:
+    """Split a query filter into its column, operator and value.
+
+    :param str query_filter: e.g. 'sample_rate>=22050'.
+    :return tuple: column, operator and the value as a number if it is one.
+    """
+    match = FILTER_PATTERN.match(query_filter)
+    if match is None or match.group(1) not in COLUMNS:
+        raise ValueError(
+            "Unsupported filter {}, expected a column of {} then an operator of {} then a value.".format(
+                query_filter, COLUMNS, tuple(OPERATORS)
+            )
+        )
+
+    column, operator, value = match.groups()
+    if operator != "~":
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    return column, operator, value
+
+
+def walk(root: str, executor: concurrent.futures.Executor) -> dict:
+    """Find audio files under a directory, listing each level of directories in parallel.
+
+    Hidden files and directories are skipped and symbolic links to directories are not followed.
+
+    :param str root:
+    :param concurrent.futures.Executor executor:
+    :return dict: path to (size, mtime) of each audio file.
+    """
+    found = {}
+    directories = [root]
+    while directories:
+        listings = executor.map(_scan_directory, directories)
+        directories = []
+        for files, subdirectories in listings:
+            found.update(files)
+            directories.extend(subdirectories)
+    return found
+
+
+def _scan_directory(directory: str) -> tuple:
+    """List the audio files and subdirectories of a directory.
+
+    :return tuple: dict of path to (size, mtime), and list of subdirectories.
+    """
+    files = {}
+    subdirectories = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(watch.AUDIO_EXTENSIONS):
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_size, stat.st_mtime)
+    except OSError:
+        logger.warning("Could not list {}.".format(directory))
+    return files, subdirectories
+
+
+def _read_row(path: str, size: int, mtime: float, levels: bool = False) -> tuple:
+    """Read the header, and optionally the levels, of an audio file as a catalog row.
+
+    WAV files are read without a decoder, anything else from pedalboard's header.
+
+    :return tuple: values of COLUMNS, or None if the file cannot be read.
+    """
+    try:
+        info = wavio.read_info(path)
+        if info is None:
+            with commands.open_audio(path) as f:
+                info = (f.num_channels, float(f.samplerate), None, f.frames)
+        channels, sample_rate, bit_rate, frames = info
+        duration = frames / sample_rate
+
+        peak = rms = None
+        if levels:
+            peak, rms = measure_levels(path)
+    except Exception:
+        logger.warning("Could not read {}.".format(path))
+        return None
+
+    return (path, size, mtime, duration, frames, channels, sample_rate, bit_rate, peak, rms)
+
+
+def measure_levels(audio_input, block_size: int = commands.DEFAULT_BLOCK_SIZE) -> tuple:
+    """Measure the peak and RMS level of an audio file a block at a time.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param int block_size: frames read at a time.
+    :return tuple: linear peak and RMS over every channel.
+    """
+    reader = wavio.WavReader.open(audio_input)
+    audio_file = reader if reader is not None else commands.open_audio(audio_input)
+    try:
+        meter = stats.Meter()
+        start = 0
+        while True:
+            if reader is not None:
+                block = reader.read(start, block_size)
+            else:
+                block = audio_file.read(block_size)
+            if not block.shape[1]:
+                break
+            start += block.shape[1]
+            meter.add(block)
+    finally:
+        if reader is None:
+            audio_file.close()
+    audio_stats = meter.stats()
+    return audio_stats["peak"], audio_stats["rms"]
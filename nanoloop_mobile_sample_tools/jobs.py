@@ -0,0 +1,181 @@
+"""Background jobs with progress and cancellation for the web app.
+
+A JobQueue is shared by every session. It runs a capped number of jobs at
+once on background threads, the pedalboard stages release the GIL, and
+each job reports the files done and the current stage through a profiler
+so the UI can poll it without blocking.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+import uuid
+from nanoloop_mobile_sample_tools import profiling
+
+
+logger = logging.getLogger(__name__)
+
+# Stages which finish a file
+FILE_STAGES = ("save", "cache")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are waiting to run."""
+
+
+class Job:
+    """A background job and its progress.
+
+    :param int files_total: number of files the job will output.
+    """
+
+    def __init__(self, files_total: int):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.files_total = files_total
+        self.files_done = 0
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.profiler = profiling.Profiler(
+            callback=self._stage_finished, trace_memory=False, start_callback=self._stage_started
+        )
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    def _stage_started(self, stage: str, file_name: str):
+        """Track the current stage, stopping the job here if cancelled."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+        self.stage = stage if file_name is None else "{} {}".format(stage, file_name)
+
+    def _stage_finished(self, record: dict):
+        """Count finished files."""
+        if record["stage"] in FILE_STAGES:
+            self.files_done += 1
+
+    def cancel(self):
+        """Cancel the job, it stops before its next stage."""
+        self._cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish("cancelled")
+
+    def progress(self) -> dict:
+        """Get the progress of the job.
+
+        :return dict: status, files_done, files_total, fraction and stage.
+        """
+        fraction = self.files_done / self.files_total if self.files_total else 0.0
+        if self.status == "done":
+            fraction = 1.0
+        return dict(
+            status=self.status,
+            files_done=self.files_done,
+            files_total=self.files_total,
+            fraction=min(fraction, 1.0),
+            stage=self.stage,
+        )
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def _finish(self, status: str):
+        self.status = status
+        self.stage = None
+        self.finished_at = time.monotonic()
+
+    def _run(self, target, args: tuple, kwargs: dict):
+        """Run the target on a worker thread.
+
+        :param callable target: called with the job's profiler as a keyword argument.
+        """
+        if self._cancel_event.is_set():
+            self._finish("cancelled")
+            return
+
+        self.status = "running"
+        try:
+            self.result = target(*args, profiler=self.profiler, **kwargs)
+        except JobCancelled:
+            logger.info("Job {} cancelled.".format(self.id))
+            self._finish("cancelled")
+        except Exception as e:
+            logger.exception("Job {} failed.".format(self.id))
+            self.error = e
+            self._finish("failed")
+        else:
+            self._finish("done")
+
+
+class JobQueue:
+    """Run jobs in the background with a cap on how many run at once.
+
+    :param int max_jobs: jobs run at the same time.
+    :param int max_queued: jobs waiting to run before new ones are refused.
+    :param float ttl: seconds finished jobs, and their results, are kept.
+    """
+
+    def __init__(self, max_jobs: int = 2, max_queued: int = 16, ttl: float = 900.0):
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="nmst-job"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, target, files_total: int, *args, **kwargs) -> Job:
+        """Queue a job.
+
+        :param callable target: called with args, kwargs and the job's profiler
+            as the 'profiler' keyword argument.
+        :param int files_total: number of files the job will output.
+        :return Job:
+        :raises JobQueueFull: when max_queued jobs are already waiting.
+        """
+        with self._lock:
+            self._prune()
+            queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+            if queued >= self.max_queued:
+                raise JobQueueFull("{} jobs are already waiting.".format(queued))
+
+            job = Job(files_total)
+            self._jobs[job.id] = job
+            job._future = self._executor.submit(job._run, target, args, kwargs)
+
+        logger.debug("Queued job {}.".format(job.id))
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Get a job by id.
+
+        :param str job_id:
+        :return Job: or None if it is unknown or expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        """Forget finished jobs older than the ttl."""
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancel every job and stop the worker threads."""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self._executor.shutdown(wait=True)
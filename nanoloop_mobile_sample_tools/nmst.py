@@ -1,18 +1,18 @@
 import argparse
+import contextlib
+import json
 import logging
 import os
-from nanoloop_mobile_sample_tools import commands
+import sys
+from nanoloop_mobile_sample_tools import defaults
+from nanoloop_mobile_sample_tools import profiling
 
 
-def get_parser() -> argparse.Namespace:
-    """Get the CLI parser.
+def add_audio_arguments(parser: argparse.ArgumentParser):
+    """Add the audio processing options shared by every command.
 
-    :return argparse.Namespace:
+    :param argparse.ArgumentParser parser:
     """
-    parser = argparse.ArgumentParser(
-        description="Nanoloop Mobile Sample Tools CLI"
-    )
-
     parser.add_argument(
         "--debug",
         dest="debug",
@@ -21,18 +21,6 @@ def get_parser() -> argparse.Namespace:
         default=logging.INFO,
         help="Set logging level to DEBUG, default INFO.",
     )
-
-    parser.add_argument(
-        "audio_inputs",
-        nargs='+',
-        help="Audio files to process in order.",
-    )
-    parser.add_argument(
-        "--concatenate",
-        dest="concatenate",
-        action="store_true",
-        help="Concatenate the audio inputs to the output. Deafult 'False'.",
-    )
     parser.add_argument(
         "--mono",
         dest="mono",
@@ -59,8 +47,16 @@ def get_parser() -> argparse.Namespace:
         const=16,
         type=int,
         default=16,
-        choices=[8, 16],
-        help="Bit rate for audio. Default '16'. Options; '8' or '16' bit.",
+        choices=[8, 16, 24, 32],
+        help="Bit rate for audio. Default '16'. Options; '8', '16' or '24' bit or '32' bit float.",
+    )
+    parser.add_argument(
+        "--resample-quality",
+        dest="resample_quality",
+        type=str,
+        default=defaults.DEFAULT_RESAMPLE_QUALITY,
+        choices=sorted(defaults.RESAMPLE_QUALITIES),
+        help="Resampling quality. Default 'standard'. Options; 'fast', 'standard' and 'high'",
     )
     parser.add_argument(
         "--speed-multiplier",
@@ -79,12 +75,35 @@ def get_parser() -> argparse.Namespace:
         choices=['soft', 'hard'],
         help="Compress the audio signal. Default 'None'. Options; 'soft' and 'hard'",
     )
+    parser.add_argument(
+        "--trim",
+        dest="trim",
+        action="store_true",
+        help="Trim leading and trailing silence. Default 'False'.",
+    )
+    parser.add_argument(
+        "--threshold-db",
+        dest="threshold_db",
+        type=float,
+        default=defaults.DEFAULT_THRESHOLD_DB,
+        help="RMS level in dB below which audio is silence, for trimming and onsets. Default '-60.0'.",
+    )
     parser.add_argument(
         "--normalize",
         dest="normalize",
         action="store_true",
         help="Normalize the audio output. Deafult 'False'.",
     )
+    parser.add_argument(
+        "--target-rms-db",
+        dest="target_rms_db",
+        type=float,
+        default=None,
+        help=(
+            "With --normalize, normalize to this RMS level in dBFS rather than the peak, "
+            "never taking the peak past 0 dBFS. Default 'None'."
+        ),
+    )
     parser.add_argument(
         "--reverse",
         dest="reverse",
@@ -100,43 +119,632 @@ def get_parser() -> argparse.Namespace:
         default="output.wav",
         help="Audio output filename. Default 'output.wav'. Audio filenames appended.",
     )
+    parser.add_argument(
+        "--workers",
+        "-j",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Number of processes to spread the audio inputs over. Default '1'.",
+    )
+
+
+def slices_argument(value: str):
+    """Parse the slices option.
+
+    :param str value: a positive number or 'onsets'.
+    :return: int or 'onsets'.
+    """
+    if value == 'onsets':
+        return value
+    try:
+        slices = int(value)
+    except ValueError:
+        slices = 0
+    if slices < 1:
+        raise argparse.ArgumentTypeError("expected a positive number or 'onsets', got {}".format(value))
+    return slices
+
+
+def boolean_argument(value: str) -> bool:
+    """Parse a true or false option.
+
+    :param str value: 'true', 'false', '1' or '0'.
+    :return bool:
+    """
+    values = {"true": True, "false": False, "1": True, "0": False}
+    if value.lower() not in values:
+        raise ValueError("expected true or false, got {}".format(value))
+    return values[value.lower()]
+
+
+# Options a preset can set, and how each is parsed
+PRESET_OPTIONS = dict(
+    name=str,
+    sample_rate=float,
+    bit_rate=int,
+    speed_multiplier=float,
+    mono=str,
+    compress=str,
+    normalize=boolean_argument,
+    reverse=boolean_argument,
+    resample_quality=str,
+    trim=boolean_argument,
+    threshold_db=float,
+    slices=slices_argument,
+    target_rms_db=float,
+)
+PRESET_CHOICES = dict(
+    bit_rate=(8, 16, 24, 32),
+    mono=('left', 'right'),
+    compress=('soft', 'hard'),
+    resample_quality=defaults.RESAMPLE_QUALITIES,
+)
+
+
+def preset_argument(value: str) -> dict:
+    """Parse a preset of comma separated options.
+
+    :param str value: e.g. 'name=lofi,sample_rate=11025,bit_rate=8,compress=hard'.
+    :return dict: the options given.
+    """
+    preset = {}
+    for item in value.split(","):
+        key, separator, option = (part.strip() for part in item.partition("="))
+        if not separator or key not in PRESET_OPTIONS:
+            raise argparse.ArgumentTypeError(
+                "expected comma separated options of {} e.g. sample_rate=11025, got {}".format(
+                    ", ".join(PRESET_OPTIONS), item
+                )
+            )
+        try:
+            preset[key] = PRESET_OPTIONS[key](option)
+        except (ValueError, argparse.ArgumentTypeError) as error:
+            raise argparse.ArgumentTypeError("{} {}".format(key, error))
+        if key in PRESET_CHOICES and preset[key] not in PRESET_CHOICES[key]:
+            raise argparse.ArgumentTypeError(
+                "expected {} of {}, got {}".format(key, ", ".join(map(str, PRESET_CHOICES[key])), option)
+            )
+    return preset
+
+
+def bytes_argument(value: str) -> int:
+    """Parse a size in bytes, with an optional K, M or G suffix.
+
+    :param str value: e.g. '65536', '512K' or '4M'.
+    :return int:
+    """
+    multipliers = dict(K=1024, M=1024 ** 2, G=1024 ** 3)
+    multiplier = multipliers.get(value[-1:].upper(), 1)
+    try:
+        size = int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise argparse.ArgumentTypeError("expected a size in bytes e.g. 65536, 512K or 4M, got {}".format(value))
+    return size
+
+
+def get_parser() -> argparse.Namespace:
+    """Get the CLI parser.
+
+    :return argparse.Namespace:
+    """
+    parser = argparse.ArgumentParser(
+        description="Nanoloop Mobile Sample Tools CLI",
+        epilog=(
+            "Other commands; 'nmst watch <directory>', 'nmst index <directory>' "
+            "and 'nmst batch <manifest.json>'."
+        )
+    )
+
+    parser.add_argument(
+        "audio_inputs",
+        nargs='*',
+        help="Audio files to process in order.",
+    )
+    parser.add_argument(
+        "--query",
+        dest="query",
+        action="append",
+        default=None,
+        help=(
+            "Process the indexed files matching a filter e.g. 'channels=1', 'duration<0.5' or "
+            "'path~*kick*', after any audio inputs. Repeat to match every filter, see 'nmst index'."
+        ),
+    )
+    parser.add_argument(
+        "--index",
+        dest="index",
+        type=str,
+        default=None,
+        help="Index database to query. Default '$NMST_INDEX_PATH' or '~/.cache/nanoloop_mobile_sample_tools/index.sqlite'.",
+    )
+    parser.add_argument(
+        "--concatenate",
+        dest="concatenate",
+        action="store_true",
+        help="Concatenate the audio inputs to the output. Deafult 'False'.",
+    )
+    add_audio_arguments(parser)
+    parser.add_argument(
+        "--slices",
+        dest="slices",
+        type=slices_argument,
+        default=None,
+        help=(
+            "Split each output into this many equal slices, or 'onsets' to split where sounds start, "
+            "saved as '{prefix}_{number}.wav'. Default 'None'."
+        ),
+    )
+    parser.add_argument(
+        "--preset",
+        dest="presets",
+        type=preset_argument,
+        action="append",
+        default=None,
+        help=(
+            "Render with these options over the others instead, comma separated e.g. "
+            "'name=lofi,sample_rate=11025,bit_rate=8,compress=hard', into a directory of the preset's "
+            "name next to the audio output. Repeat for more presets, which share every stage they have "
+            "in common so each input is decoded once."
+        ),
+    )
+    parser.add_argument(
+        "--max-bytes",
+        dest="max_bytes",
+        type=bytes_argument,
+        default=None,
+        help=(
+            "Fit every output into this many bytes in total e.g. '4M', choosing the best sample rate, "
+            "bit rate and trim up to those given. Default 'None'."
+        ),
+    )
+    parser.add_argument(
+        "--max-file-bytes",
+        dest="max_file_bytes",
+        type=bytes_argument,
+        default=None,
+        help="Fit each output into this many bytes, as --max-bytes. Default 'None'.",
+    )
+    parser.add_argument(
+        "--block-size",
+        dest="block_size",
+        type=int,
+        default=None,
+        help="Stream audio in blocks of this many frames to bound memory. Default 'None' i.e. whole files.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        dest="pipelined",
+        action="store_true",
+        help=(
+            "Decode, process and save on separate threads, so reading and writing files overlaps "
+            "processing. Default 'False'."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="Always process the audio inputs, ignoring cached results. Default 'False'.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        type=str,
+        default=None,
+        help="Directory of cached results. Default '$NMST_CACHE_DIR' or '~/.cache/nanoloop_mobile_sample_tools'.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=int,
+        default=defaults.DEFAULT_CACHE_MAX_BYTES,
+        help="Maximum bytes of cached results before evicting the least recently used.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        type=str,
+        default=None,
+        help="Write per stage, per file timings and memory to this JSON file. Default 'None'.",
+    )
+    parser.add_argument(
+        "--stats",
+        dest="stats",
+        action="store_true",
+        help=(
+            "Log the peak, RMS, DC offset and clipped samples of each output, and write them to a JSON "
+            "sidecar next to it e.g. kick.json. Default 'False'."
+        ),
+    )
     return parser
 
 
-def main():
-    """Run the main CLI."""
-    parser = get_parser()
-    args = parser.parse_args()
-    
+def get_watch_parser() -> argparse.ArgumentParser:
+    """Get the CLI parser for watching a directory.
+
+    :return argparse.ArgumentParser:
+    """
+    parser = argparse.ArgumentParser(
+        prog="nmst watch",
+        description="Process new and changed audio files in a directory as they land."
+    )
+    parser.add_argument(
+        "directory",
+        help="Directory to watch.",
+    )
+    add_audio_arguments(parser)
+    parser.add_argument(
+        "--output-dir",
+        dest="output_dir",
+        type=str,
+        default=None,
+        help="Directory to write audio outputs to. Default the watched directory.",
+    )
+    parser.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checking the directory. Default '1.0'.",
+    )
+    parser.add_argument(
+        "--once",
+        dest="once",
+        action="store_true",
+        help="Process new and changed files then exit. Default 'False'.",
+    )
+    return parser
+
+
+def get_index_parser() -> argparse.ArgumentParser:
+    """Get the CLI parser for indexing a directory.
+
+    :return argparse.ArgumentParser:
+    """
+    parser = argparse.ArgumentParser(
+        prog="nmst index",
+        description="Catalog the audio files under a directory from their headers, for 'nmst --query'."
+    )
+    parser.add_argument(
+        "directory",
+        help="Directory to index, including subdirectories.",
+    )
+    parser.add_argument(
+        "--index",
+        dest="index",
+        type=str,
+        default=None,
+        help="Index database. Default '$NMST_INDEX_PATH' or '~/.cache/nanoloop_mobile_sample_tools/index.sqlite'.",
+    )
+    parser.add_argument(
+        "--workers",
+        "-j",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Number of threads walking directories and reading headers. Default 'None' i.e. Python's default.",
+    )
+    parser.add_argument(
+        "--levels",
+        dest="levels",
+        action="store_true",
+        help="Also measure the peak and RMS level of each file, which reads the samples. Default 'False'.",
+    )
+    parser.add_argument(
+        "--debug",
+        dest="debug",
+        nargs='?',
+        const=logging.DEBUG,
+        default=logging.INFO,
+        help="Set logging level to DEBUG, default INFO.",
+    )
+    return parser
+
+
+def get_batch_parser() -> argparse.ArgumentParser:
+    """Get the CLI parser for running a manifest of jobs.
+
+    :return argparse.ArgumentParser:
+    """
+    parser = argparse.ArgumentParser(
+        prog="nmst batch",
+        description="Run many jobs, each with its own audio inputs and options, in one process."
+    )
+    parser.add_argument(
+        "manifest",
+        help=(
+            "JSON file of a list of jobs, or an object of 'jobs' and 'defaults' for every job. "
+            "Each job is an object of 'nmst' options named like 'sample_rate' with 'audio_inputs' "
+            "a list of files, e.g. {\"audio_inputs\": [\"kick.wav\"], \"normalize\": true}."
+        ),
+    )
+    parser.add_argument(
+        "--debug",
+        dest="debug",
+        nargs='?',
+        const=logging.DEBUG,
+        default=logging.INFO,
+        help="Set logging level to DEBUG, default INFO.",
+    )
+    return parser
+
+
+def job_arguments(job: dict) -> list:
+    """Get the main CLI arguments for a batch job.
+
+    Keys are option names with underscores, true is a flag, false and null
+    leave the option out and lists repeat it e.g. 'query'.
+
+    :param dict job: options and 'audio_inputs'.
+    :return list:
+    """
+    arguments = []
+    for key, value in job.items():
+        if key == "audio_inputs" or value is False or value is None:
+            continue
+        option = "--{}".format(key.replace("_", "-"))
+        if value is True:
+            arguments.append(option)
+        elif isinstance(value, list):
+            for item in value:
+                arguments.extend([option, str(item)])
+        else:
+            arguments.extend([option, str(value)])
+
+    audio_inputs = job.get("audio_inputs") or []
+    if isinstance(audio_inputs, str):
+        audio_inputs = [audio_inputs]
+    # Inputs after '--' are never taken for options
+    return arguments + ["--"] + [str(audio_input) for audio_input in audio_inputs]
+
+
+def watch_main(argv: list = None):
+    """Run the watch CLI.
+
+    :param list argv: arguments after 'watch'.
+    """
+    args = get_watch_parser().parse_args(argv)
+
     logging.basicConfig(level=args.debug)
 
-    processed_audio_arrays = commands.process(
-        args.audio_inputs,
+    from nanoloop_mobile_sample_tools import watch
+
+    watcher = watch.Watcher(
+        args.directory,
+        output_dir=args.output_dir,
+        audio_output=args.audio_output,
+        bit_rate=args.bit_rate,
+        workers=args.workers,
+        interval=args.interval,
         sample_rate=args.sample_rate,
         speed_multiplier=args.speed_multiplier,
-        concatenate=args.concatenate,
         mono=args.mono,
         compress=args.compress,
         normalize=args.normalize,
         reverse=args.reverse,
+        resample_quality=args.resample_quality,
+        trim=args.trim,
+        threshold_db=args.threshold_db,
+        target_rms_db=args.target_rms_db,
     )
+    if args.once:
+        watcher.run_once()
+        return
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logging.info("Stopped watching {}.".format(args.directory))
+
+
+def index_main(argv: list = None):
+    """Run the index CLI.
+
+    :param list argv: arguments after 'index'.
+    """
+    args = get_index_parser().parse_args(argv)
+
+    logging.basicConfig(level=args.debug)
+
+    from nanoloop_mobile_sample_tools import index
+
+    with index.Index(args.index) as catalog:
+        catalog.update(args.directory, workers=args.workers, levels=args.levels)
+        logging.info("{} files in {}.".format(len(catalog), catalog.path))
+
+
+def batch_main(argv: list = None):
+    """Run the batch CLI.
+
+    Every job is parsed before any runs, so a mistake in the manifest stops
+    the batch before anything is written. Jobs share a stage cache, so jobs
+    on the same audio inputs decode them once.
+
+    :param list argv: arguments after 'batch'.
+    """
+    parser = get_batch_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.debug)
+
+    try:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as error:
+        parser.error("cannot read manifest {}: {}".format(args.manifest, error))
+    if isinstance(manifest, list):
+        manifest = dict(jobs=manifest)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        parser.error("expected a list of jobs or an object of 'jobs' and 'defaults' in {}".format(args.manifest))
+
+    jobs = []
+    for number, job in enumerate(manifest["jobs"], start=1):
+        job_parser = get_parser()
+        job_parser.prog = "nmst batch job {}".format(number)
+        if not isinstance(job, dict):
+            job_parser.error("expected an object of options, got {!r}".format(job))
+        job_args = job_parser.parse_args(job_arguments(dict(manifest.get("defaults") or {}, **job)))
+        jobs.append((job_parser, job_args))
+
+    from nanoloop_mobile_sample_tools import cache
+
+    stage_cache = cache.StageCache()
+    for number, (job_parser, job_args) in enumerate(jobs, start=1):
+        logging.info("Running job {} of {}.".format(number, len(jobs)))
+        run(job_args, job_parser, stage_cache)
+
+
+def main():
+    """Run the main CLI."""
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        return watch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        return index_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        return batch_main(sys.argv[2:])
+
+    parser = get_parser()
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=args.debug)
+
+    run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser, stage_cache=None):
+    """Process and save the audio inputs of parsed main CLI arguments.
+
+    :param argparse.Namespace args:
+    :param argparse.ArgumentParser parser: reports mistakes in the arguments.
+    :param cache.StageCache stage_cache: reuse stage outputs of earlier runs in this process.
+    """
+    # Imported here, so parsing arguments and --help never load numpy or pedalboard
+    from nanoloop_mobile_sample_tools import budget
+    from nanoloop_mobile_sample_tools import cache
+    from nanoloop_mobile_sample_tools import commands
+    from nanoloop_mobile_sample_tools import fanout
+    from nanoloop_mobile_sample_tools import index
+    from nanoloop_mobile_sample_tools import stats
+
+    if args.query:
+        try:
+            matched = index.select(*args.query, index_path=args.index)
+        except ValueError as error:
+            parser.error(str(error))
+        logging.info("Query matched {} indexed files.".format(len(matched)))
+        args.audio_inputs += matched
+    if not args.audio_inputs:
+        parser.error("no audio inputs given or matched by --query")
+
+    budgeted = args.max_bytes is not None or args.max_file_bytes is not None
+    if budgeted and (args.concatenate or args.slices is not None or args.block_size is not None):
+        parser.error("--max-bytes and --max-file-bytes cannot be used with --concatenate, --slices or --block-size")
+    if budgeted and args.presets:
+        parser.error("--max-bytes and --max-file-bytes cannot be used with --preset")
+    if args.pipelined and args.workers != 1:
+        parser.error("--pipelined cannot be used with --workers")
+    if args.presets and (args.block_size is not None or args.workers != 1):
+        parser.error("--preset cannot be used with --block-size or --workers")
 
-    for processed_audio_array, audio_input in zip(processed_audio_arrays, args.audio_inputs):
+    result_cache = None
+    if not (args.no_cache or budgeted):
+        result_cache = cache.ResultCache(args.cache_dir, args.cache_size)
 
-        _, output_filename = os.path.split(args.audio_output)
-        prefix, _ = os.path.splitext(output_filename)
+    profiler = None
+    if args.profile:
+        profiler = profiling.Profiler()
 
-        _, input_filename = os.path.split(audio_input)
-        suffix, _ = os.path.splitext(input_filename)
+    audio_outputs = commands.get_audio_outputs(args.audio_inputs, args.audio_output, args.concatenate)
+    stats_outputs = None
+    if args.stats:
+        stats_outputs = [stats.sidecar_path(audio_output) for audio_output in audio_outputs]
 
-        audio_output = "{prefix}_{suffix}.wav".format(prefix=prefix, suffix=suffix)
-        
-        if len(processed_audio_arrays) == 1 and args.concatenate:
-            audio_output = args.audio_output
+    with profiler or contextlib.nullcontext():
+        if budgeted:
+            try:
+                result = budget.export(
+                    args.audio_inputs,
+                    audio_outputs,
+                    max_bytes=args.max_bytes,
+                    max_file_bytes=args.max_file_bytes,
+                    sample_rate=args.sample_rate,
+                    bit_rate=args.bit_rate,
+                    speed_multiplier=args.speed_multiplier,
+                    mono=args.mono,
+                    trim=args.trim,
+                    threshold_db=args.threshold_db,
+                    resample_quality=args.resample_quality,
+                    profiler=profiler,
+                    compress=args.compress,
+                    normalize=args.normalize,
+                    reverse=args.reverse,
+                    target_rms_db=args.target_rms_db,
+                    stats_outputs=stats_outputs,
+                )
+            except ValueError as error:
+                parser.exit(1, "{}\n".format(error))
+            logging.info(
+                "Saved {} bytes at {sample_rate} Hz, {bit_rate} bit, trim {trim}.".format(result["bytes"], **result)
+            )
+        elif args.presets:
+            fanout.export(
+                args.audio_inputs,
+                audio_outputs,
+                args.presets,
+                output_dir=os.path.dirname(args.audio_output) or ".",
+                result_cache=result_cache,
+                stage_cache=stage_cache,
+                profiler=profiler,
+                sidecars=args.stats,
+                sample_rate=args.sample_rate,
+                bit_rate=args.bit_rate,
+                speed_multiplier=args.speed_multiplier,
+                concatenate=args.concatenate,
+                mono=args.mono,
+                compress=args.compress,
+                normalize=args.normalize,
+                reverse=args.reverse,
+                workers=args.workers,
+                block_size=args.block_size,
+                resample_quality=args.resample_quality,
+                trim=args.trim,
+                slices=args.slices,
+                threshold_db=args.threshold_db,
+                target_rms_db=args.target_rms_db,
+                pipelined=args.pipelined,
+            )
+        else:
+            cache.process_and_save(
+                args.audio_inputs,
+                audio_outputs,
+                cache=result_cache,
+                sample_rate=args.sample_rate,
+                bit_rate=args.bit_rate,
+                speed_multiplier=args.speed_multiplier,
+                concatenate=args.concatenate,
+                mono=args.mono,
+                compress=args.compress,
+                normalize=args.normalize,
+                reverse=args.reverse,
+                workers=args.workers,
+                block_size=args.block_size,
+                resample_quality=args.resample_quality,
+                trim=args.trim,
+                slices=args.slices,
+                threshold_db=args.threshold_db,
+                target_rms_db=args.target_rms_db,
+                pipelined=args.pipelined,
+                profiler=profiler,
+                stage_cache=stage_cache,
+                stats_outputs=stats_outputs,
+            )
 
-        commands.save(
-            processed_audio_array,
-            sample_rate=args.sample_rate,
-            bit_rate=args.bit_rate,
-            audio_output=audio_output
-        )
\ No newline at end of file
+    if profiler is not None:
+        profiler.dump(args.profile)
+        for total in profiler.summary():
+            logging.info(
+                "Stage {stage}: {files} files, {wall_seconds:.3f}s wall, {cpu_seconds:.3f}s CPU.".format(**total)
+            )
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Overlapped stages on threads joined by bounded queues.
+
+Decoding reads the disk, pedalboard's resampler and compressor release
+the GIL and saving writes the disk, so running each stage on its own
+thread lets file N+1 decode and file N-1 save while file N is processed.
+Each queue holds at most queue_size items, so a slow stage holds back the
+stages before it rather than letting decoded audio pile up in memory.
+
+    audio_arrays = overlap.run(audio_inputs, [decode, effect])
+"""
+
+import logging
+import queue
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Items waiting between two stages, as well as the one each stage is working on
+DEFAULT_QUEUE_SIZE = 2
+
+# Seconds a blocked stage waits before checking whether another stage failed
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+def run(items, stages: list, queue_size: int = DEFAULT_QUEUE_SIZE) -> list:
+    """Pass every item through each stage in turn, each stage on its own thread.
+
+    The first failure stops every stage and is raised once they have stopped.
+
+    :param items: iterable of inputs to the first stage, read by its thread.
+    :param list stages: functions taking the output of the stage before.
+    :param int queue_size: most items waiting between two stages.
+    :return list: outputs of the last stage, in the order of the items.
+    """
+    if queue_size < 1:
+        raise ValueError("Unsupported queue size {}, expected a positive number.".format(queue_size))
+
+    stopped = threading.Event()
+    errors = []
+    outputs = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+    inboxes = [iter(items)] + [_receive(stage_queue, stopped) for stage_queue in queues]
+    outboxes = queues + [None]
+
+    threads = [
+        threading.Thread(
+            target=_run_stage,
+            args=(function, inbox, outbox, outputs, stopped, errors),
+            name="overlap-{}".format(getattr(function, "__name__", index)),
+            daemon=True,
+        )
+        for index, (function, inbox, outbox) in enumerate(zip(stages, inboxes, outboxes))
+    ]
+    logger.debug("Running {} stages with queues of {}.".format(len(threads), queue_size))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return outputs
+
+
+def _run_stage(function, inbox, outbox: queue.Queue, outputs: list, stopped: threading.Event, errors: list):
+    """Run a stage on each item of its inbox, sending the results on, until done or stopped."""
+    try:
+        for item in inbox:
+            if stopped.is_set():
+                return
+            result = function(item)
+            if outbox is None:
+                outputs.append(result)
+            else:
+                _send(outbox, result, stopped)
+    except BaseException as error:
+        errors.append(error)
+        stopped.set()
+    finally:
+        if outbox is not None:
+            _send(outbox, _DONE, stopped)
+
+
+def _send(stage_queue: queue.Queue, item, stopped: threading.Event):
+    """Put an item on a queue, waiting for room unless the stages have stopped."""
+    while not stopped.is_set():
+        try:
+            stage_queue.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            pass
+
+
+def _receive(stage_queue: queue.Queue, stopped: threading.Event):
+    """Yield items from a queue until the stage before is done or the stages have stopped."""
+    while not stopped.is_set():
+        try:
+            item = stage_queue.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
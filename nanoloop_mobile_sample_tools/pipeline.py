@@ -0,0 +1,146 @@
+"""Reusable audio processing pipelines.
+
+A pipeline is configured once with the process options and keeps its
+compressor pedalboard between calls, so batches and interactive reruns do
+not pay plugin setup for every file.
+"""
+
+import logging
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import energy
+from nanoloop_mobile_sample_tools import plan
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import resample
+
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline(plan.Plan):
+    """Configured audio processing pipeline, call it with audio inputs.
+
+        pipeline = Pipeline(sample_rate=22050.0, compress='hard', compressor=dict(ratio=4))
+        audio_arrays = pipeline(audio_inputs)
+
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param bool concatenate: concatenate the audio files before the effects.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param str compress: 'soft' or 'hard' or None i.e. leave it alone
+    :param bool normalize: normalize the audio to 0 db.
+    :param bool reverse: reverse the audio.
+    :param dict compressor: settings overriding the compression type; gain_db,
+        threshold_db, ratio, attack_ms and release_ms.
+    :param int workers: number of processes to spread the files over, None for all cores.
+    :param int block_size: stream the audio in blocks of this many frames.
+    :param str resample_quality: 'fast', 'standard' or 'high', see resample.QUALITIES.
+    :param bool trim: trim leading and trailing silence.
+    :param slices: split outputs into this many equal slices, or 'onsets', when saved
+        by cache.process_and_save or commands.save_slices.
+    :param float threshold_db: RMS level below which audio is silence, for trim and onsets.
+    :param float target_rms_db: normalize to this RMS level in dBFS rather than the peak.
+    :param bool pipelined: decode, process and save on their own threads so each file
+        overlaps the next and the last, see plan.Plan.run_overlapped. Not when concatenating.
+    """
+
+    def __init__(
+            self,
+            sample_rate: float = 44100.0,
+            speed_multiplier: float = 1.0,
+            concatenate: bool = False,
+            mono: str = 'left',
+            compress: str = None,
+            normalize: bool = False,
+            reverse: bool = False,
+            compressor: dict = None,
+            workers: int = 1,
+            block_size: int = None,
+            resample_quality: str = resample.DEFAULT_QUALITY,
+            trim: bool = False,
+            slices=None,
+            threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+            target_rms_db: float = None,
+            pipelined: bool = False):
+        if pipelined and workers != 1:
+            raise ValueError("Pipelined runs threads in one process, so cannot be used with workers.")
+        super().__init__(
+            sample_rate=sample_rate,
+            speed_multiplier=speed_multiplier,
+            concatenate=concatenate,
+            mono=mono,
+            compress=compress,
+            normalize=normalize,
+            reverse=reverse,
+            compressor=compressor,
+            resample_quality=resample_quality,
+            trim=trim,
+            slices=slices,
+            threshold_db=threshold_db,
+            target_rms_db=target_rms_db
+        )
+        self.workers = workers
+        self.block_size = block_size
+        self.pipelined = pipelined
+
+    def __call__(self, audio_inputs: list, profiler: profiling.Profiler = None, stage_cache=None) -> list:
+        """Process audio inputs.
+
+        :param list audio_inputs: audio file paths, bytes or file-like objects.
+        :param profiling.Profiler profiler: records each stage for each file. Streamed
+            blocks are processed as save consumes them, so are recorded by save.
+        :param cache.StageCache stage_cache: reuse stage outputs from earlier calls, e.g. with
+            other options, None to run every stage. Not used when streaming.
+        :return list: processed audio arrays, or block iterators when streaming.
+        """
+        if self.block_size is None:
+            logger.debug(self.explain())
+            if self.pipelined and not self.concatenate:
+                return self.run_overlapped(audio_inputs, profiler, stage_cache)
+            return self.run(audio_inputs, self.workers, profiler, stage_cache)
+
+        # Nothing is decoded until the iterators are consumed e.g. by save
+        if self.concatenate:
+            audio_blocks = [
+                commands.concatenate_audio_blocks(
+                    audio_inputs, self.sample_rate, self.speed_multiplier, self.mono, self.block_size,
+                    self.resample_quality
+                )
+            ]
+        else:
+            audio_blocks = [
+                commands.read_audio_blocks(
+                    audio_input, self.sample_rate, self.speed_multiplier, self.mono, self.block_size,
+                    resample_quality=self.resample_quality
+                )
+                for audio_input in audio_inputs
+            ]
+        if self.trim:
+            audio_blocks = [commands.trim_audio_blocks(blocks, self.threshold_db) for blocks in audio_blocks]
+        return [
+            commands.effect_audio_blocks(
+                blocks, self.sample_rate, self.compress, self.normalize, self.reverse, self.compressor,
+                self.target_rms_db
+            )
+            for blocks in audio_blocks
+        ]
+
+    def settings(self) -> dict:
+        """Get the options which change the processed audio e.g. for cache keys.
+
+        :return dict:
+        """
+        return dict(
+            sample_rate=self.sample_rate,
+            speed_multiplier=self.speed_multiplier,
+            concatenate=self.concatenate,
+            mono=self.mono,
+            compress=self.compress,
+            normalize=self.normalize,
+            reverse=self.reverse,
+            compressor=self.compressor,
+            resample_quality=self.resample_quality,
+            trim=self.trim,
+            slices=self.slices,
+            threshold_db=self.threshold_db,
+            target_rms_db=self.target_rms_db
+        )
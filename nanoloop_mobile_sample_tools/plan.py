@@ -0,0 +1,543 @@
+"""Compiled processing plans for commands.process.
+
+A plan is built once from the process arguments. Stages which would do
+nothing are dropped, the mono channel is picked before resampling and
+normalize and reverse are fused into in-place operations on the buffer
+each file is already held in.
+
+Given a cache.StageCache, the decoded, resampled, concatenated and
+compressed audio are kept between runs, keyed on the input bytes and the
+options upstream of each stage, so only the stages after a changed option
+run again.
+"""
+
+import concurrent.futures
+import itertools
+import json
+import logging
+import numpy
+import os
+import threading
+from nanoloop_mobile_sample_tools import batch
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import energy
+from nanoloop_mobile_sample_tools import overlap
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import resample
+from nanoloop_mobile_sample_tools import stats
+
+
+logger = logging.getLogger(__name__)
+
+
+class Plan:
+    """Execution plan for processing audio files.
+
+    :param float sample_rate: output sample rate.
+    :param float speed_multiplier: speed up the sample by a factor.
+    :param bool concatenate: concatenate the audio files before the effects.
+    :param str mono: 'left' or 'right' or None i.e. leave it alone
+    :param str compress: 'soft' or 'hard' or None i.e. leave it alone
+    :param bool normalize: normalize the audio to 0 db.
+    :param bool reverse: reverse the audio.
+    :param dict compressor: settings overriding the compression type, see commands.compressor_board.
+    :param str resample_quality: 'fast', 'standard' or 'high', see resample.QUALITIES.
+    :param bool trim: trim leading and trailing silence.
+    :param slices: split outputs into this many equal slices, or 'onsets' to split
+        where sounds start, when saving. None to leave them whole.
+    :param float threshold_db: RMS level below which audio is silence, for trim and onsets.
+    :param float target_rms_db: normalize to this RMS level in dBFS rather than the peak,
+        never taking the peak past full scale.
+    """
+
+    def __init__(
+            self,
+            sample_rate: float = 44100.0,
+            speed_multiplier: float = 1.0,
+            concatenate: bool = False,
+            mono: str = 'left',
+            compress: str = None,
+            normalize: bool = False,
+            reverse: bool = False,
+            compressor: dict = None,
+            resample_quality: str = resample.DEFAULT_QUALITY,
+            trim: bool = False,
+            slices=None,
+            threshold_db: float = energy.DEFAULT_THRESHOLD_DB,
+            target_rms_db: float = None):
+        if resample_quality not in resample.QUALITIES:
+            raise ValueError(
+                "Unsupported resample quality {}, expected one of {}.".format(
+                    resample_quality, sorted(resample.QUALITIES)
+                )
+            )
+        if slices not in (None, 'onsets') and not (isinstance(slices, int) and slices > 0):
+            raise ValueError("Unsupported slices {}, expected a positive number or 'onsets'.".format(slices))
+        self.sample_rate = sample_rate
+        self.speed_multiplier = speed_multiplier
+        self.concatenate = concatenate
+        self.mono = mono
+        self.compress = compress
+        self.normalize = normalize
+        self.reverse = reverse
+        self.compressor = compressor
+        self.resample_quality = resample_quality
+        self.trim = trim
+        self.slices = slices
+        self.threshold_db = threshold_db
+        self.target_rms_db = target_rms_db
+        self.stages = self._compile()
+        self._board = None
+        self._board_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        """Drop the pedalboard and lock, which cannot be pickled for worker processes.
+
+        :return dict:
+        """
+        state = self.__dict__.copy()
+        state['_board'] = None
+        state['_board_lock'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._board_lock = threading.Lock()
+
+    @property
+    def board(self):
+        """The compressor pedalboard, built once and reused for every file.
+
+        :return pedalboard.Pedalboard:
+        """
+        if self._board is None and self.compress is not None:
+            self._board = commands.compressor_board(self.compress, **(self.compressor or {}))
+        return self._board
+
+    def _compile(self) -> list:
+        """Get the stages which will run, as (name, description) tuples.
+
+        :return list:
+        """
+        target_sample_rate = self.sample_rate/self.speed_multiplier
+        stages = [("decode", "read each audio input at its own sample rate")]
+
+        if self.mono is not None:
+            stages.append(
+                ("mono", "keep the {} channel of multi-channel inputs, before resampling".format(self.mono))
+            )
+
+        stages.append(
+            (
+                "resample",
+                "resample to {} Hz at {} quality, decimating integer ratios and "
+                "skipped for inputs already at that rate".format(target_sample_rate, self.resample_quality)
+            )
+        )
+
+        if self.concatenate:
+            stages.append(
+                ("concatenate", "decode each input into one array allocated from the headers")
+            )
+
+        if self.trim:
+            stages.append(
+                (
+                    "trim",
+                    "drop leading and trailing windows of {} frames below {} dB, as a view".format(
+                        energy.DEFAULT_FRAME_SIZE, self.threshold_db
+                    )
+                )
+            )
+
+        if self.compress is not None:
+            stages.append(
+                (
+                    "compress",
+                    "'{}' gain and compressor at {} Hz, reusing one pedalboard{}".format(
+                        self.compress,
+                        self.sample_rate,
+                        " with {}".format(self.compressor) if self.compressor else ""
+                    )
+                )
+            )
+
+        fused = []
+        if self.normalize:
+            stages.append(("stats", "absolute peak, RMS, DC offset and clipped samples in one pass"))
+            if self.target_rms_db is None:
+                fused.append(("normalize", "peak gain from the stats in place"))
+            else:
+                fused.append((
+                    "normalize",
+                    "gain to {} dBFS RMS from the stats, capped at the peak, in place".format(self.target_rms_db)
+                ))
+        if self.reverse:
+            fused.append(("reverse", "reversed view"))
+        if fused:
+            stages.append(
+                (
+                    "+".join(name for name, _ in fused),
+                    "{} on one buffer".format(", ".join(description for _, description in fused))
+                )
+            )
+
+        if self.slices == 'onsets':
+            stages.append(("slice", "split at onsets {} dB above the window before, when saving".format(
+                energy.DEFAULT_ONSET_DB
+            )))
+        elif self.slices is not None:
+            stages.append(("slice", "split into {} equal slices, when saving".format(self.slices)))
+
+        return stages
+
+    def explain(self) -> str:
+        """Describe the stages of the plan, in order.
+
+        :return str:
+        """
+        lines = ["Plan with {} stages:".format(len(self.stages))]
+        for index, (name, description) in enumerate(self.stages, start=1):
+            lines.append("{}. {}: {}".format(index, name, description))
+        return "\n".join(lines)
+
+    def decode(self, audio_input, profiler: profiling.Profiler = None) -> numpy.ndarray:
+        """Run the decode, mono and resample stages on an audio input.
+
+        :param audio_input: audio file path, bytes or file-like object.
+        :param profiling.Profiler profiler: records each stage.
+        :return numpy.ndarray:
+        """
+        return commands.read_audio(
+            audio_input, self.sample_rate, self.speed_multiplier, self.mono, profiler, self.resample_quality
+        )
+
+    def decode_source(self, audio_input, stage_cache, profiler: profiling.Profiler = None) -> tuple:
+        """Run the decode and mono stages, reusing their output from a stage cache.
+
+        The decoded audio is keyed on the input bytes and mono alone, so a new
+        sample rate or resample quality resamples it without decoding again.
+
+        :param audio_input: audio file path, bytes or file-like object.
+        :param cache.StageCache stage_cache:
+        :param profiling.Profiler profiler: records each stage, or its reuse.
+        :return tuple: the read-only audio array at its own sample rate, the sample rate
+            and its stage cache key.
+        """
+        key = ("decode", stage_cache.digest(audio_input), self.mono)
+        audio_array, source_sample_rate = stage_cache.stage(
+            key,
+            lambda: commands.decode_audio(audio_input, self.mono, profiler),
+            profiler,
+            commands.audio_input_name(audio_input)
+        )
+        return audio_array, source_sample_rate, key
+
+    def decode_cached(self, audio_input, stage_cache, profiler: profiling.Profiler = None) -> tuple:
+        """Run the decode, mono and resample stages, reusing their outputs from a stage cache.
+
+        :param audio_input: audio file path, bytes or file-like object.
+        :param cache.StageCache stage_cache:
+        :param profiling.Profiler profiler: records each stage, or its reuse.
+        :return tuple: the read-only audio array and its stage cache key.
+        """
+        file_name = commands.audio_input_name(audio_input)
+        audio_array, source_sample_rate, key = self.decode_source(audio_input, stage_cache, profiler)
+
+        target_sample_rate = self.sample_rate/self.speed_multiplier
+        if source_sample_rate == target_sample_rate:
+            return audio_array, key
+
+        def resample_stage():
+            with profiling.stage(profiler, "resample", file_name) as record:
+                resampled_array = resample.resample_audio(
+                    audio_array, source_sample_rate, target_sample_rate, self.resample_quality
+                )
+                record["bytes"] = resampled_array.nbytes
+            return resampled_array
+
+        key = ("resample", key, target_sample_rate, self.resample_quality)
+        return stage_cache.stage(key, resample_stage, profiler, file_name), key
+
+    def concatenate_cached(self, audio_inputs: list, stage_cache, profiler: profiling.Profiler = None) -> tuple:
+        """Run the decode, mono, resample and concatenate stages, reusing their outputs from a stage cache.
+
+        :param list audio_inputs: audio file paths, bytes or file-like objects.
+        :param cache.StageCache stage_cache:
+        :param profiling.Profiler profiler: records each stage, or its reuse.
+        :return tuple: the read-only audio array and its stage cache key.
+        """
+        decoded = [self.decode_cached(audio_input, stage_cache, profiler) for audio_input in audio_inputs]
+
+        def concatenate_stage():
+            with profiling.stage(profiler, "concatenate") as record:
+                audio_array = commands.concatenate_audio([audio_array for audio_array, _ in decoded])
+                record["bytes"] = audio_array.nbytes
+            return audio_array
+
+        key = ("concatenate",) + tuple(key for _, key in decoded)
+        return stage_cache.stage(key, concatenate_stage, profiler), key
+
+    def trim_audio(
+            self,
+            audio_array: numpy.ndarray,
+            profiler: profiling.Profiler = None,
+            file_name: str = None) -> numpy.ndarray:
+        """Run the trim stage.
+
+        :param numpy.ndarray audio_array:
+        :param profiling.Profiler profiler: records the stage.
+        :param str file_name: name of the audio for the profiler.
+        :return numpy.ndarray: a view of the audio array.
+        """
+        with profiling.stage(profiler, "trim", file_name) as record:
+            audio_array = commands.trim_audio(audio_array, self.threshold_db)
+            record["bytes"] = audio_array.nbytes
+        return audio_array
+
+    def compress_audio(
+            self,
+            audio_array: numpy.ndarray,
+            profiler: profiling.Profiler = None,
+            file_name: str = None) -> numpy.ndarray:
+        """Run the compress stage with the shared board.
+
+        :param numpy.ndarray audio_array:
+        :param profiling.Profiler profiler: records the stage.
+        :param str file_name: name of the audio for the profiler.
+        :return numpy.ndarray:
+        """
+        with profiling.stage(profiler, "compress", file_name) as record:
+            # Shared boards are stateful, the call resets them before each file
+            with self._board_lock:
+                audio_array = self.board(audio_array, self.sample_rate)
+            record["bytes"] = audio_array.nbytes
+        return audio_array
+
+    def trim_compress(
+            self,
+            audio_array: numpy.ndarray,
+            profiler: profiling.Profiler = None,
+            file_name: str = None,
+            stage_cache=None,
+            key: tuple = None) -> numpy.ndarray:
+        """Run the trim and compress stages.
+
+        :param numpy.ndarray audio_array:
+        :param profiling.Profiler profiler: records each stage, or its reuse.
+        :param str file_name: name of the audio for the profiler.
+        :param cache.StageCache stage_cache: reuse the compressed audio, None to always compress.
+        :param tuple key: stage cache key of the audio array.
+        :return numpy.ndarray: read-only when from the stage cache.
+        """
+        def trim_compress_stage(audio_array):
+            if self.trim:
+                audio_array = self.trim_audio(audio_array, profiler, file_name)
+            if self.compress is not None:
+                audio_array = self.compress_audio(audio_array, profiler, file_name)
+            return audio_array
+
+        if stage_cache is None or key is None or self.compress is None:
+            return trim_compress_stage(audio_array)
+
+        # Trim is a view, so is only cached along with the compressed audio
+        key = (
+            "compress", key, self.trim, self.threshold_db, self.compress,
+            json.dumps(self.compressor, sort_keys=True), self.sample_rate
+        )
+        return stage_cache.stage(key, lambda: trim_compress_stage(audio_array), profiler, file_name)
+
+    def effect(
+            self,
+            audio_array: numpy.ndarray,
+            profiler: profiling.Profiler = None,
+            file_name: str = None,
+            stage_cache=None,
+            key: tuple = None) -> numpy.ndarray:
+        """Run the trim, compress, normalize and reverse stages.
+
+        The audio array is modified in place so must be owned by the plan
+        i.e. fresh from decode or concatenate. Read-only arrays, e.g. from a
+        stage cache, are copied before normalizing.
+
+        :param numpy.ndarray audio_array:
+        :param profiling.Profiler profiler: records each stage.
+        :param str file_name: name of the audio for the profiler.
+        :param cache.StageCache stage_cache: reuse the compressed audio, None to always compress.
+        :param tuple key: stage cache key of the audio array.
+        :return numpy.ndarray:
+        """
+        audio_array = self.trim_compress(audio_array, profiler, file_name, stage_cache, key)
+
+        # Trimming can leave nothing to normalize
+        if self.normalize and audio_array.size:
+            with profiling.stage(profiler, "stats", file_name) as record:
+                audio_stats = record["stats"] = stats.measure(audio_array)
+                record["bytes"] = audio_array.nbytes
+            if not audio_array.flags.writeable:
+                audio_array = audio_array.copy()
+            with profiling.stage(profiler, "normalize", file_name) as record:
+                audio_array *= stats.normalize_factor(audio_stats, self.target_rms_db)
+                record["bytes"] = audio_array.nbytes
+
+        if self.reverse:
+            with profiling.stage(profiler, "reverse", file_name) as record:
+                # A view, no copy is made
+                audio_array = numpy.flip(audio_array)
+                record["bytes"] = audio_array.nbytes
+
+        return audio_array
+
+    def process_file(self, audio_input, profiler: profiling.Profiler = None, stage_cache=None) -> numpy.ndarray:
+        """Run every stage on a single audio input.
+
+        :param audio_input: audio file path, bytes or file-like object.
+        :param profiling.Profiler profiler: records each stage.
+        :param cache.StageCache stage_cache: reuse stage outputs from earlier runs, None to run every stage.
+        :return numpy.ndarray:
+        """
+        file_name = commands.audio_input_name(audio_input)
+        if stage_cache is None:
+            return self.effect(self.decode(audio_input, profiler), profiler, file_name)
+
+        audio_array, key = self.decode_cached(audio_input, stage_cache, profiler)
+        return self.effect(audio_array, profiler, file_name, stage_cache, key)
+
+    def _process_file_records(self, audio_input, profiler: profiling.Profiler) -> tuple:
+        """Run every stage on a single audio input in a worker process.
+
+        :return tuple: the processed audio array and the profiler records.
+        """
+        audio_array = self.process_file(audio_input, profiler)
+        return audio_array, profiler.records
+
+    def run(
+            self,
+            audio_inputs: list,
+            workers: int = 1,
+            profiler: profiling.Profiler = None,
+            stage_cache=None) -> list:
+        """Run the plan on audio inputs.
+
+        :param list audio_inputs: audio file paths, bytes or file-like objects.
+        :param int workers: number of processes to spread the files over, None for all cores.
+            Concatenating always runs serially.
+        :param profiling.Profiler profiler: records each stage for each file.
+        :param cache.StageCache stage_cache: reuse stage outputs from earlier runs, None to run
+            every stage. Not used by worker processes.
+        :return list: processed audio arrays.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if self.concatenate and stage_cache is not None:
+            audio_array, key = self.concatenate_cached(audio_inputs, stage_cache, profiler)
+            return [self.effect(audio_array, profiler, stage_cache=stage_cache, key=key)]
+
+        if self.concatenate:
+            logger.debug("Concatenating {} audio inputs.".format(len(audio_inputs)))
+            audio_array = commands.concatenate_audio_files(
+                audio_inputs, self.sample_rate, self.speed_multiplier, self.mono, profiler,
+                self.resample_quality
+            )
+            return [self.effect(audio_array, profiler)]
+
+        if workers > 1 and len(audio_inputs) > 1:
+            logger.debug("Processing audio inputs with {} workers.".format(workers))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                # map keeps the order of the inputs
+                if profiler is None:
+                    return list(executor.map(self.process_file, audio_inputs))
+
+                # Worker records are sent back and added here
+                audio_arrays = []
+                results = executor.map(
+                    self._process_file_records, audio_inputs, itertools.repeat(profiler)
+                )
+                for audio_array, records in results:
+                    audio_arrays.append(audio_array)
+                    for record in records:
+                        profiler.add(record)
+                return audio_arrays
+
+        if len(audio_inputs) > 1 and (self.normalize or self.reverse):
+            return self.process_batch(audio_inputs, profiler, stage_cache)
+
+        return [self.process_file(audio_input, profiler, stage_cache) for audio_input in audio_inputs]
+
+    def run_overlapped(
+            self,
+            audio_inputs: list,
+            profiler: profiling.Profiler = None,
+            stage_cache=None,
+            encode=None,
+            queue_size: int = overlap.DEFAULT_QUEUE_SIZE) -> list:
+        """Run the plan on audio inputs with decoding, the effects and encoding on their own threads.
+
+        The next input is decoded and the last one encoded while the effects run,
+        see overlap.run. Profiler records of overlapped stages include time spent
+        waiting on the GIL, and allocations of the other stages.
+
+        :param list audio_inputs: audio file paths, bytes or file-like objects.
+        :param profiling.Profiler profiler: records each stage for each file.
+        :param cache.StageCache stage_cache: reuse stage outputs from earlier runs, None to run every stage.
+        :param callable encode: called with the index of each input and its processed audio
+            array e.g. to save it, None to only decode and process.
+        :param int queue_size: most audio arrays waiting between two stages.
+        :return list: processed audio arrays, or what encode returned for each.
+        """
+        def decode(item):
+            index, audio_input = item
+            if stage_cache is None:
+                return index, audio_input, self.decode(audio_input, profiler), None
+            return (index, audio_input) + self.decode_cached(audio_input, stage_cache, profiler)
+
+        def effect(item):
+            index, audio_input, audio_array, key = item
+            file_name = commands.audio_input_name(audio_input)
+            return index, self.effect(audio_array, profiler, file_name, stage_cache, key)
+
+        stages = [decode, effect]
+        if encode is not None:
+            stages.append(lambda item: encode(*item))
+        outputs = overlap.run(enumerate(audio_inputs), stages, queue_size)
+        return outputs if encode is not None else [audio_array for _, audio_array in outputs]
+
+    def process_batch(self, audio_inputs: list, profiler: profiling.Profiler = None, stage_cache=None) -> list:
+        """Run every stage on many audio inputs, normalizing and reversing them as one batch.
+
+        Decode, trim and compress still run per input, then the arrays are packed into
+        one buffer so normalize and reverse are a few operations for the batch.
+
+        :param list audio_inputs: audio file paths, bytes or file-like objects.
+        :param profiling.Profiler profiler: records each stage.
+        :param cache.StageCache stage_cache: reuse stage outputs from earlier runs, None to run every stage.
+        :return list: processed audio arrays, views of the batch buffer.
+        """
+        audio_arrays = []
+        for audio_input in audio_inputs:
+            file_name = commands.audio_input_name(audio_input)
+            if stage_cache is None:
+                audio_array, key = self.decode(audio_input, profiler), None
+            else:
+                audio_array, key = self.decode_cached(audio_input, stage_cache, profiler)
+            audio_arrays.append(self.trim_compress(audio_array, profiler, file_name, stage_cache, key))
+
+        with profiling.stage(profiler, "pack") as record:
+            audio_batch = batch.AudioBatch.from_arrays(audio_arrays)
+            record["bytes"] = audio_batch.buffer.nbytes
+
+        if self.normalize:
+            with profiling.stage(profiler, "stats") as record:
+                batch_stats = audio_batch.stats()
+                record["bytes"] = audio_batch.buffer.nbytes
+            with profiling.stage(profiler, "normalize") as record:
+                audio_batch.normalize(self.target_rms_db, batch_stats)
+                record["bytes"] = audio_batch.buffer.nbytes
+
+        if self.reverse:
+            with profiling.stage(profiler, "reverse") as record:
+                audio_batch.reverse()
+                record["bytes"] = audio_batch.buffer.nbytes
+
+        return audio_batch.to_arrays()
@@ -0,0 +1,114 @@
+"""Quick previews of processed audio for the web app.
+
+A preview renders only the first seconds of an audio input through the
+same stages as a pipeline, and a waveform is the min/max envelope of the
+whole decoded input. Both decode through a cache.StageCache, so the
+preview, the waveform and a later full run share one decode.
+
+    stage_cache = cache.StageCache()
+    audio_array = preview.render(upload, pipeline, seconds=5.0, stage_cache=stage_cache)
+    waveform = preview.waveform(upload, pipeline, stage_cache=stage_cache)
+"""
+
+import logging
+import numpy
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import plan
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import resample
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREVIEW_SECONDS = 5.0
+DEFAULT_ENVELOPE_POINTS = 1000
+
+
+def render(
+        audio_input,
+        processing_plan: plan.Plan,
+        seconds: float = DEFAULT_PREVIEW_SECONDS,
+        stage_cache: cache.StageCache = None,
+        profiler: profiling.Profiler = None) -> numpy.ndarray:
+    """Render the first seconds of an audio input through the stages of a plan.
+
+    Only those seconds are resampled and run through the effects, so the
+    compressor matches the full render while trim and normalize see the
+    preview alone. Each input is previewed on its own, even when the plan
+    concatenates.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param plan.Plan processing_plan: e.g. a Pipeline.
+    :param float seconds: length of the input to preview.
+    :param cache.StageCache stage_cache: holds the decoded input, None for a new cache.
+    :param profiling.Profiler profiler: records each stage.
+    :return numpy.ndarray: the preview at the plan's sample rate.
+    """
+    if stage_cache is None:
+        stage_cache = cache.StageCache()
+    file_name = commands.audio_input_name(audio_input)
+    audio_array, source_sample_rate, _ = processing_plan.decode_source(audio_input, stage_cache, profiler)
+    audio_array = audio_array[:, :int(seconds * source_sample_rate)]
+
+    target_sample_rate = processing_plan.sample_rate/processing_plan.speed_multiplier
+    if source_sample_rate != target_sample_rate:
+        with profiling.stage(profiler, "resample", file_name) as record:
+            audio_array = resample.resample_audio(
+                audio_array, source_sample_rate, target_sample_rate, processing_plan.resample_quality
+            )
+            record["bytes"] = audio_array.nbytes
+
+    return processing_plan.effect(audio_array, profiler, file_name)
+
+
+def waveform(
+        audio_input,
+        processing_plan: plan.Plan,
+        points: int = DEFAULT_ENVELOPE_POINTS,
+        stage_cache: cache.StageCache = None,
+        profiler: profiling.Profiler = None) -> numpy.ndarray:
+    """Get the min/max envelope of a whole decoded audio input, after mono.
+
+    :param audio_input: audio file path, bytes or file-like object.
+    :param plan.Plan processing_plan: picks the mono channel.
+    :param int points: number of points in the envelope.
+    :param cache.StageCache stage_cache: holds the decoded input, None for a new cache.
+    :param profiling.Profiler profiler: records each stage.
+    :return numpy.ndarray: see envelope, read-only as it is kept in the stage cache.
+    """
+    if stage_cache is None:
+        stage_cache = cache.StageCache()
+    file_name = commands.audio_input_name(audio_input)
+    audio_array, _, key = processing_plan.decode_source(audio_input, stage_cache, profiler)
+
+    def envelope_stage():
+        with profiling.stage(profiler, "envelope", file_name) as record:
+            audio_envelope = envelope(audio_array, points)
+            record["bytes"] = audio_envelope.nbytes
+        return audio_envelope
+
+    return stage_cache.stage(("envelope", key, points), envelope_stage, profiler, file_name)
+
+
+def envelope(audio_array: numpy.ndarray, points: int = DEFAULT_ENVELOPE_POINTS) -> numpy.ndarray:
+    """Get the min/max envelope of audio, for drawing its waveform.
+
+    The frames are split into blocks, as even as they divide, and each block
+    reduced to its minimum and maximum over every channel with one reduceat
+    pass each, so long audio is never copied.
+
+    :param numpy.ndarray audio_array: shape (channels, frames).
+    :param int points: number of blocks, fewer when there are fewer frames.
+    :return numpy.ndarray: shape (2, points) of the minimum then maximum of each block.
+    """
+    frames = audio_array.shape[1]
+    points = min(points, frames)
+    if not points:
+        return numpy.zeros((2, 0), dtype=numpy.float32)
+
+    starts = numpy.arange(points) * frames // points
+    return numpy.stack([
+        numpy.minimum.reduceat(audio_array, starts, axis=1).min(axis=0),
+        numpy.maximum.reduceat(audio_array, starts, axis=1).max(axis=0),
+    ])
@@ -0,0 +1,157 @@
+"""Stage level profiling of processing and saving.
+
+A Profiler is passed to commands.process and commands.save, or anything
+built on them, and records the wall time, CPU time, output bytes and
+memory allocated by each stage for each file.
+
+    with profiling.Profiler() as profiler:
+        audio_arrays = commands.process(audio_inputs, profiler=profiler)
+    print(profiler.summary())
+"""
+
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Collects per stage, per file measurements.
+
+    Used as a context manager it traces memory allocations for its duration,
+    otherwise allocated bytes are only recorded if tracemalloc is already running.
+
+    :param callable callback: called with each record as it is made.
+    :param bool trace_memory: trace allocations when used as a context manager.
+    :param callable start_callback: called with the stage and file name as each stage starts.
+    """
+
+    def __init__(self, callback=None, trace_memory: bool = True, start_callback=None):
+        self.callback = callback
+        self.start_callback = start_callback
+        self.trace_memory = trace_memory
+        self.records = []
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *args):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __getstate__(self) -> dict:
+        """Drop the callback so the profiler can be sent to worker processes.
+
+        :return dict:
+        """
+        state = self.__dict__.copy()
+        state['callback'] = None
+        state['start_callback'] = None
+        state['records'] = []
+        state['_started_tracing'] = False
+        return state
+
+    @contextlib.contextmanager
+    def stage(self, name: str, file_name: str = None):
+        """Measure a stage, the record is yielded so bytes can be set on it.
+
+            with profiler.stage("decode", "kick.wav") as record:
+                audio_array = decode()
+                record["bytes"] = audio_array.nbytes
+
+        :param str name: stage name.
+        :param str file_name: file the stage ran on.
+        :return generator:
+        """
+        if self.start_callback is not None:
+            self.start_callback(name, file_name)
+
+        record = dict(stage=name, file=file_name, bytes=None, allocated_bytes=None)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            start_memory, _ = tracemalloc.get_traced_memory()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        yield record
+
+        record["wall_seconds"] = time.perf_counter() - start_wall
+        record["cpu_seconds"] = time.process_time() - start_cpu
+        if tracing:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if not hasattr(tracemalloc, "reset_peak"):
+                peak_memory = current_memory
+            record["allocated_bytes"] = max(peak_memory - start_memory, 0)
+        self.add(record)
+
+    def add(self, record: dict):
+        """Add a finished record.
+
+        :param dict record:
+        """
+        self.records.append(record)
+        logger.debug(
+            "Stage {stage} on {file} took {wall_seconds:.6f}s wall, {cpu_seconds:.6f}s CPU.".format(**record)
+        )
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self) -> list:
+        """Total the records for each stage, in the order stages first ran.
+
+        :return list: of dicts with stage, files, wall_seconds, cpu_seconds,
+            bytes and the largest allocated_bytes.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(
+                record["stage"],
+                dict(
+                    stage=record["stage"], files=0, wall_seconds=0.0, cpu_seconds=0.0,
+                    bytes=0, allocated_bytes=None
+                )
+            )
+            total["files"] += 1
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["bytes"] += record["bytes"] or 0
+            if record["allocated_bytes"] is not None:
+                total["allocated_bytes"] = max(total["allocated_bytes"] or 0, record["allocated_bytes"])
+        return list(totals.values())
+
+    def dump(self, path: str):
+        """Write the records and summary to a JSON file.
+
+        :param str path:
+        """
+        with open(path, "w") as f:
+            json.dump(dict(summary=self.summary(), records=self.records), f, indent=2)
+
+
+@contextlib.contextmanager
+def _null_stage():
+    yield {}
+
+
+def stage(profiler: Profiler, name: str, file_name: str = None):
+    """Measure a stage with a profiler, doing nothing when the profiler is None.
+
+    :param Profiler profiler:
+    :param str name: stage name.
+    :param str file_name: file the stage ran on.
+    :return contextmanager: yielding the record.
+    """
+    if profiler is None:
+        return _null_stage()
+    return profiler.stage(name, file_name)
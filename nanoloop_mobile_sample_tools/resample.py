@@ -0,0 +1,203 @@
+"""Sample rate conversion in quality tiers.
+
+Exact integer downsampling ratios, e.g. 44100 Hz to 22050 or 11025 Hz or
+a speed multiplier of 2 or 4, are decimated with a polyphase FIR filter, up
+to the largest factor where that beats pedalboard's resampler of the tier.
+Only every Nth output of a Kaiser windowed sinc lowpass is computed, as the
+sum of N short correlations of each phase of the input with the matching
+phase of the filter. Other ratios, and the fast tier, use pedalboard's
+resampler. Both have the StreamResampler interface so whole
+files and streamed blocks give the same audio.
+"""
+
+import logging
+import math
+import numpy
+import pedalboard
+from nanoloop_mobile_sample_tools import defaults
+
+
+logger = logging.getLogger(__name__)
+
+# quality: (pedalboard quality, decimation taps per phase, decimation Kaiser beta, largest decimation factor)
+# Fast interpolates without an anti-aliasing filter, so never decimates. Decimating costs
+# the same at any factor while pedalboard gets cheaper as the output shrinks, so
+# WindowedSinc32 is as fast by a factor of 8, see benchmarks/bench_resample.py
+QUALITIES = {
+    'fast': (pedalboard.Resample.Quality.CatmullRom, None, None, None),
+    'standard': (pedalboard.Resample.Quality.WindowedSinc32, 64, 10.0, 4),
+    'high': (pedalboard.Resample.Quality.WindowedSinc256, 128, 12.0, None),
+}
+DEFAULT_QUALITY = defaults.DEFAULT_RESAMPLE_QUALITY
+
+
+def decimation_factor(
+        source_sample_rate: float,
+        target_sample_rate: float,
+        quality: str = DEFAULT_QUALITY) -> int:
+    """Get the factor audio is decimated by between two sample rates.
+
+    :param float source_sample_rate:
+    :param float target_sample_rate:
+    :param str quality: 'fast', 'standard' or 'high'.
+    :return int: or None if the ratio is not an integer greater than one, or
+        the quality does not decimate by it.
+    """
+    _, taps_per_phase, _, max_factor = QUALITIES[quality]
+    if taps_per_phase is None:
+        return None
+    ratio = source_sample_rate / target_sample_rate
+    if ratio > 1 and float(ratio).is_integer() and (max_factor is None or ratio <= max_factor):
+        return int(ratio)
+    return None
+
+
+def resampled_frames(
+        frames: int,
+        source_sample_rate: float,
+        target_sample_rate: float,
+        quality: str = DEFAULT_QUALITY) -> int:
+    """Get the length of audio after resampling, without resampling it.
+
+    :param int frames: frames at the source sample rate.
+    :param float source_sample_rate:
+    :param float target_sample_rate:
+    :param str quality: 'fast', 'standard' or 'high'.
+    :return int: exact when decimating or not resampling, otherwise pedalboard's
+        resampler gives at most this many frames, and at most two fewer.
+    """
+    if source_sample_rate == target_sample_rate:
+        return frames
+    factor = decimation_factor(source_sample_rate, target_sample_rate, quality)
+    if factor is not None:
+        return -(-frames // factor)
+    return math.ceil(frames * target_sample_rate / source_sample_rate)
+
+
+def design_filter(factor: int, taps_per_phase: int, beta: float) -> numpy.ndarray:
+    """Design the lowpass filter for decimating by a factor.
+
+    The cutoff is the output Nyquist frequency, the Kaiser beta trades the
+    stopband attenuation against the width of the transition band.
+
+    :param int factor: decimation factor.
+    :param int taps_per_phase: filter length over the factor, even.
+    :param float beta: Kaiser window shape.
+    :return numpy.ndarray: symmetric float32 taps with unity gain.
+    """
+    taps = factor * taps_per_phase + 1
+    n = numpy.arange(taps) - (taps - 1) / 2
+    lowpass = numpy.sinc(n / factor) * numpy.kaiser(taps, beta)
+    return (lowpass / lowpass.sum()).astype(numpy.float32)
+
+
+class Decimator:
+    """Stream audio through a polyphase decimation filter.
+
+    Used like pedalboard.io.StreamResampler, process returns the output for
+    each block and process with no block flushes the rest. Outputs are aligned
+    to every factor-th input frame, ceil(frames / factor) in total.
+
+    :param int factor: decimation factor.
+    :param int num_channels: number of channels.
+    :param int taps_per_phase: filter length over the factor.
+    :param float beta: Kaiser window shape.
+    """
+
+    def __init__(
+            self,
+            factor: int,
+            num_channels: int,
+            taps_per_phase: int = 64,
+            beta: float = 10.0):
+        self.factor = factor
+        self.num_channels = num_channels
+        self.filter = design_filter(factor, taps_per_phase, beta)
+        self._phases = [self.filter[phase::factor] for phase in range(factor)]
+        # Frames of zeros before the first input centre the filter on it
+        self._buffer = numpy.zeros((num_channels, (len(self.filter) - 1) // 2), dtype=numpy.float32)
+        self._input_frames = 0
+        self._output_frames = 0
+
+    def process(self, audio_array: numpy.ndarray = None) -> numpy.ndarray:
+        """Decimate a block, or flush the remaining output.
+
+        :param numpy.ndarray audio_array: shape (channels, frames), None to flush.
+        :return numpy.ndarray: shape (channels, output frames).
+        """
+        taps = len(self.filter)
+        if audio_array is None:
+            output_frames = -(-self._input_frames // self.factor) - self._output_frames
+            padding = max((output_frames - 1) * self.factor + taps - self._buffer.shape[1], 0)
+            buffer = numpy.concatenate(
+                [self._buffer, numpy.zeros((self.num_channels, padding), dtype=numpy.float32)], axis=1
+            )
+        else:
+            self._input_frames += audio_array.shape[1]
+            buffer = numpy.concatenate([self._buffer, audio_array], axis=1)
+            output_frames = 0
+            if buffer.shape[1] >= taps:
+                output_frames = (buffer.shape[1] - taps) // self.factor + 1
+
+        output_array = numpy.zeros((self.num_channels, output_frames), dtype=numpy.float32)
+        if output_frames:
+            for channel in range(self.num_channels):
+                for phase, phase_filter in enumerate(self._phases):
+                    # Output k takes input frames (k + j) * factor + phase of this phase
+                    phase_input = buffer[channel, phase::self.factor][:output_frames + len(phase_filter) - 1]
+                    output_array[channel] += numpy.correlate(phase_input, phase_filter, 'valid')
+
+        self._output_frames += output_frames
+        self._buffer = buffer[:, output_frames * self.factor:]
+        return output_array
+
+
+def resampler(
+        source_sample_rate: float,
+        target_sample_rate: float,
+        num_channels: int,
+        quality: str = DEFAULT_QUALITY):
+    """Get a streaming resampler between two sample rates.
+
+    :param float source_sample_rate:
+    :param float target_sample_rate:
+    :param int num_channels: number of channels.
+    :param str quality: 'fast', 'standard' or 'high'.
+    :return: Decimator for integer downsampling ratios, otherwise pedalboard.io.StreamResampler.
+    """
+    if quality not in QUALITIES:
+        raise ValueError(
+            "Unsupported resample quality {}, expected one of {}.".format(quality, sorted(QUALITIES))
+        )
+
+    pedalboard_quality, taps_per_phase, beta, _ = QUALITIES[quality]
+    factor = decimation_factor(source_sample_rate, target_sample_rate, quality)
+    if factor is not None:
+        logger.debug("Decimating by {} at {} quality.".format(factor, quality))
+        return Decimator(factor, num_channels, taps_per_phase, beta)
+
+    return pedalboard.io.StreamResampler(
+        source_sample_rate, target_sample_rate, num_channels, pedalboard_quality
+    )
+
+
+def resample_audio(
+        audio_array: numpy.ndarray,
+        source_sample_rate: float,
+        target_sample_rate: float,
+        quality: str = DEFAULT_QUALITY) -> numpy.ndarray:
+    """Resample a whole audio array.
+
+    :param numpy.ndarray audio_array: shape (channels, frames).
+    :param float source_sample_rate:
+    :param float target_sample_rate:
+    :param str quality: 'fast', 'standard' or 'high'.
+    :return numpy.ndarray:
+    """
+    stream = resampler(source_sample_rate, target_sample_rate, audio_array.shape[0], quality)
+    resampled_array = stream.process(audio_array)
+    remaining_array = stream.process()
+    if remaining_array.shape[1]:
+        resampled_array = numpy.concatenate([resampled_array, remaining_array], axis=1)
+    return resampled_array
+
@@ -0,0 +1,203 @@
+"""Signal statistics of audio in a single pass.
+
+The absolute peak, RMS level, DC offset and number of clipped samples are
+worked out together from the minimum, maximum, sum and sum of squares of
+the samples. These reduce without temporary arrays and combine over blocks,
+so whole arrays, streamed blocks and ragged batches are measured the same
+way. Normalization takes its gain from them rather than scanning the audio
+again.
+
+    audio_stats = stats.measure(audio_array)
+    audio_array *= stats.normalize_factor(audio_stats)
+    logger.info(stats.describe(audio_stats))
+"""
+
+import json
+import math
+import numpy
+import os
+from nanoloop_mobile_sample_tools import defaults
+from nanoloop_mobile_sample_tools import wavio
+
+
+# Samples beyond full scale are clipped when saved as integers
+CLIP_LEVEL = 1.0
+
+
+class Meter:
+    """Measure the statistics of audio a block at a time, see measure.
+
+        meter = stats.Meter()
+        for block in audio_blocks:
+            meter.add(block)
+        audio_stats = meter.stats()
+    """
+
+    def __init__(self):
+        self.minimum = 0.0
+        self.maximum = 0.0
+        self.total = 0.0
+        self.squares = 0.0
+        self.clips = 0
+        self.samples = 0
+
+    def add(self, block: numpy.ndarray):
+        """Add the samples of a block.
+
+        :param numpy.ndarray block: shape (channels, frames), or a 1d buffer of samples.
+        """
+        if not block.size:
+            return
+        if block.ndim != 2:
+            block = block.reshape(1, -1)
+
+        minimum = float(numpy.min(block))
+        maximum = float(numpy.max(block))
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+        self.total += float(numpy.sum(block, dtype=numpy.float64))
+        self.squares += float(numpy.einsum('cf,cf->', block, block, dtype=numpy.float64))
+        # Only counted when there is something to count
+        if minimum < -CLIP_LEVEL or maximum > CLIP_LEVEL:
+            self.clips += int(numpy.count_nonzero(numpy.abs(block) > CLIP_LEVEL))
+        self.samples += block.size
+
+    def stats(self) -> dict:
+        """Get the statistics of every sample added.
+
+        :return dict: see summarize.
+        """
+        return summarize(self.minimum, self.maximum, self.total, self.squares, self.clips, self.samples)
+
+
+def summarize(minimum: float, maximum: float, total: float, squares: float, clips: int, samples: int) -> dict:
+    """Get the statistics of audio from its reductions.
+
+    :param float minimum: lowest sample, or 0.0.
+    :param float maximum: highest sample, or 0.0.
+    :param float total: sum of the samples.
+    :param float squares: sum of the squared samples.
+    :param int clips: samples beyond full scale.
+    :param int samples: number of samples over every channel.
+    :return dict: linear peak, rms and dc_offset, clips and samples, all zero when there are none.
+    """
+    return dict(
+        peak=max(-minimum, maximum),
+        rms=math.sqrt(squares / samples) if samples else 0.0,
+        dc_offset=total / samples if samples else 0.0,
+        clips=clips,
+        samples=samples,
+    )
+
+
+def measure(audio_array: numpy.ndarray) -> dict:
+    """Measure the statistics of an audio array.
+
+    :param numpy.ndarray audio_array: shape (channels, frames).
+    :return dict: see summarize.
+    """
+    meter = Meter()
+    meter.add(audio_array)
+    return meter.stats()
+
+
+def measure_wav(audio_input, block_size: int = defaults.DEFAULT_BLOCK_SIZE) -> dict:
+    """Measure the statistics of a WAV file a block at a time, without decoding it whole.
+
+    :param audio_input: audio file path or bytes.
+    :param int block_size: frames measured at a time.
+    :return dict: see summarize, or None if the input cannot be mapped, see wavio.WavReader.open.
+    """
+    reader = wavio.WavReader.open(audio_input)
+    if reader is None:
+        return None
+
+    meter = Meter()
+    for start in range(0, reader.frames, block_size):
+        meter.add(reader.read(start, block_size))
+    return meter.stats()
+
+
+def normalize_factor(audio_stats: dict, target_rms_db: float = None) -> float:
+    """Get the gain which brings the absolute peak up to full scale, or the RMS level up to a target.
+
+    Gain to an RMS level is capped so the peak never goes past full scale,
+    and silence is left alone.
+
+    :param dict audio_stats: see summarize.
+    :param float target_rms_db: RMS level in dBFS, None to normalize the peak.
+    :return float:
+    """
+    if not audio_stats["peak"]:
+        return 1.0
+    factor = 1.0 / audio_stats["peak"]
+    if target_rms_db is not None and audio_stats["rms"]:
+        factor = min(factor, 10 ** (target_rms_db / 20) / audio_stats["rms"])
+    return factor
+
+
+def to_db(value: float) -> float:
+    """Get a linear level in dBFS.
+
+    :param float value:
+    :return float: None for silence.
+    """
+    if not value:
+        return None
+    return 20 * math.log10(abs(value))
+
+
+def describe(audio_stats: dict) -> str:
+    """Describe statistics in a line e.g. for logs.
+
+    :param dict audio_stats: see summarize.
+    :return str:
+    """
+    return "peak {}, RMS {}, DC offset {:.6f}, {} clipped samples".format(
+        _format_db(audio_stats["peak"]),
+        _format_db(audio_stats["rms"]),
+        audio_stats["dc_offset"],
+        audio_stats["clips"]
+    )
+
+
+def _format_db(value: float) -> str:
+    db = to_db(value)
+    return "-inf dBFS" if db is None else "{:.1f} dBFS".format(db)
+
+
+def report(audio_stats: dict) -> dict:
+    """Get statistics with their levels in dBFS, as written to sidecars.
+
+    :param dict audio_stats: see summarize.
+    :return dict: with peak_db and rms_db, None for silence.
+    """
+    return dict(audio_stats, peak_db=to_db(audio_stats["peak"]), rms_db=to_db(audio_stats["rms"]))
+
+
+def sidecar_path(audio_output: str) -> str:
+    """Get the JSON sidecar path of an audio output, e.g. kick.json for kick.wav.
+
+    :param str audio_output:
+    :return str:
+    """
+    return os.path.splitext(audio_output)[0] + ".json"
+
+
+def write(audio_stats, stats_output):
+    """Write statistics to a JSON sidecar.
+
+    :param audio_stats: dict of statistics, or a list of them e.g. for slices.
+    :param stats_output: path or writable binary file-like object.
+    """
+    if isinstance(audio_stats, dict):
+        data = report(audio_stats)
+    else:
+        data = [report(slice_stats) for slice_stats in audio_stats]
+    encoded = json.dumps(data, indent=2).encode()
+
+    if isinstance(stats_output, str):
+        with open(stats_output, "wb") as f:
+            f.write(encoded)
+    else:
+        stats_output.write(encoded)
@@ -0,0 +1,227 @@
+"""Watch a folder and process audio files as they land.
+
+The directory is polled and files which are new or changed, and have
+stopped growing, are processed by a bounded pool of worker processes. A
+manifest of each input's hash, size, mtime and the settings used is kept
+next to the outputs, so unchanged files are skipped across restarts.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import time
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools.pipeline import Pipeline
+
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".wav", ".aif", ".aiff", ".flac", ".mp3", ".ogg")
+MANIFEST_FILENAME = ".nmst_manifest.json"
+
+
+class Watcher:
+    """Process new and changed audio files in a directory.
+
+    :param str directory: directory to watch.
+    :param str output_dir: directory to write outputs to, default the watched directory.
+    :param str audio_output: output filename, inputs are saved as '{prefix}_{suffix}.wav'.
+    :param int bit_rate: bit rate of output files.
+    :param int workers: number of worker processes.
+    :param float interval: seconds between polls.
+    :param str manifest_path: manifest file, default in the output directory.
+    :param kwargs: process options passed to Pipeline.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            output_dir: str = None,
+            audio_output: str = "output.wav",
+            bit_rate: int = 16,
+            workers: int = 1,
+            interval: float = 1.0,
+            manifest_path: str = None,
+            **kwargs):
+        self.directory = os.path.abspath(directory)
+        self.output_dir = os.path.abspath(output_dir or directory)
+        self.audio_output = audio_output
+        self.bit_rate = bit_rate
+        self.workers = workers or os.cpu_count() or 1
+        self.interval = interval
+        self.manifest_path = manifest_path or os.path.join(self.output_dir, MANIFEST_FILENAME)
+        self.pipeline = Pipeline(**kwargs)
+        self.settings_key = hashlib.sha256(
+            json.dumps(dict(self.pipeline.settings(), bit_rate=bit_rate), sort_keys=True).encode()
+        ).hexdigest()
+        self.manifest = self._load_manifest()
+        # Size and mtime of changed files seen on the last poll
+        self._unsettled = {}
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _load_manifest(self) -> dict:
+        """Load the manifest of processed files.
+
+        :return dict:
+        """
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self):
+        """Write the manifest, replacing the old one in one step."""
+        temp_path = "{}.tmp".format(self.manifest_path)
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def output_path(self, audio_input: str) -> str:
+        """Get the output path for an audio input.
+
+        :param str audio_input:
+        :return str:
+        """
+        audio_output, = commands.get_audio_outputs([audio_input], self.audio_output)
+        return os.path.join(self.output_dir, audio_output)
+
+    def scan(self, settle: bool = True) -> list:
+        """Find audio files which need processing.
+
+        :param bool settle: only return changed files whose size and mtime
+            have not changed since the last scan i.e. have finished being written.
+        :return list: of (path, size, mtime) tuples.
+        """
+        outputs = {entry["output"] for entry in self.manifest.values()}
+        ready = []
+        with os.scandir(self.directory) as it:
+            for entry in sorted(it, key=lambda entry: entry.name):
+                if not entry.is_file() or not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                if entry.name.startswith(".") or entry.path in outputs:
+                    continue
+
+                stat = entry.stat()
+                if not self._changed(entry.path, stat.st_size, stat.st_mtime):
+                    self._unsettled.pop(entry.path, None)
+                    continue
+
+                signature = (stat.st_size, stat.st_mtime)
+                if settle and self._unsettled.get(entry.path) != signature:
+                    self._unsettled[entry.path] = signature
+                    continue
+
+                self._unsettled.pop(entry.path, None)
+                ready.append((entry.path, stat.st_size, stat.st_mtime))
+        return ready
+
+    def _changed(self, path: str, size: int, mtime: float) -> bool:
+        """Check a file against the manifest, hashing only when the mtime moved.
+
+        :return bool:
+        """
+        entry = self.manifest.get(path)
+        if entry is None or entry["settings"] != self.settings_key:
+            return True
+        if entry["size"] == size and entry["mtime"] == mtime:
+            return False
+
+        digest = cache.hash_audio_input(path)
+        if digest != entry["sha256"]:
+            return True
+
+        # Touched but not changed
+        entry["size"] = size
+        entry["mtime"] = mtime
+        self._save_manifest()
+        return False
+
+    def process(self, ready: list, executor: concurrent.futures.Executor) -> list:
+        """Process files with a bounded number in flight.
+
+        :param list ready: of (path, size, mtime) tuples from scan.
+        :param concurrent.futures.Executor executor:
+        :return list: output paths written.
+        """
+        outputs = []
+        in_flight = {}
+        for path, size, mtime in ready:
+            # Backpressure, at most two files per worker are queued
+            while len(in_flight) >= self.workers * 2:
+                outputs.extend(self._collect(in_flight, concurrent.futures.FIRST_COMPLETED))
+
+            audio_output = self.output_path(path)
+            # Hashed before processing, so a file rewritten meanwhile no longer matches and runs again
+            digest = cache.hash_audio_input(path)
+            logger.info("Processing {} to {}.".format(path, audio_output))
+            future = executor.submit(
+                _process_file, path, audio_output, self.pipeline, self.bit_rate
+            )
+            in_flight[future] = (path, digest, size, mtime, audio_output)
+
+        while in_flight:
+            outputs.extend(self._collect(in_flight, concurrent.futures.ALL_COMPLETED))
+        return outputs
+
+    def _collect(self, in_flight: dict, return_when: str) -> list:
+        """Wait for files to finish and record them in the manifest.
+
+        :return list: output paths written.
+        """
+        done, _ = concurrent.futures.wait(in_flight, return_when=return_when)
+        outputs = []
+        for future in done:
+            path, digest, size, mtime, audio_output = in_flight.pop(future)
+            try:
+                future.result()
+            except Exception:
+                logger.exception("Failed to process {}.".format(path))
+                continue
+
+            self.manifest[path] = dict(
+                sha256=digest,
+                size=size,
+                mtime=mtime,
+                settings=self.settings_key,
+                output=audio_output,
+            )
+            outputs.append(audio_output)
+        self._save_manifest()
+        return outputs
+
+    def run_once(self) -> list:
+        """Process every new or changed file without waiting for them to settle.
+
+        :return list: output paths written.
+        """
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return self.process(self.scan(settle=False), executor)
+
+    def run(self, polls: int = None):
+        """Poll the directory and process files until interrupted.
+
+        :param int polls: stop after this many polls, None to run forever.
+        """
+        logger.info("Watching {} every {}s.".format(self.directory, self.interval))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            poll = 0
+            while polls is None or poll < polls:
+                ready = self.scan()
+                if ready:
+                    self.process(ready, executor)
+                poll += 1
+                if polls is None or poll < polls:
+                    time.sleep(self.interval)
+
+
+def _process_file(audio_input: str, audio_output: str, pipeline: Pipeline, bit_rate: int) -> str:
+    """Process and save a single file in a worker process.
+
+    :return str: audio output file path
+    """
+    audio_array, = pipeline([audio_input])
+    return commands.save(audio_array, pipeline.sample_rate, bit_rate, audio_output)
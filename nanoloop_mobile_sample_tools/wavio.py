@@ -0,0 +1,432 @@
+"""Low-allocation WAV file reading and writing.
+
+Float audio is quantized a fixed number of frames at a time into
+preallocated buffers, so the extra memory used while saving is bounded by
+the chunk size rather than the length of the audio.
+
+PCM and float WAV inputs can be read without a decoder, the samples are
+memory-mapped in place and only converted to float as they are read.
+"""
+
+import io
+import logging
+import numpy
+import os
+import struct
+
+
+logger = logging.getLogger(__name__)
+
+# Frames converted at a time
+DEFAULT_CHUNK_SIZE = 16384
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# bit rate: (format tag, bytes per sample, multiplier, offset, minimum, maximum, buffer dtype)
+FORMATS = {
+    8: (WAVE_FORMAT_PCM, 1, 127, 127, 0, 255, numpy.dtype('u1')),
+    16: (WAVE_FORMAT_PCM, 2, 32767, 0, -32768, 32767, numpy.dtype('<i2')),
+    24: (WAVE_FORMAT_PCM, 3, 8388607, 0, -8388608, 8388607, numpy.dtype('<i4')),
+    32: (WAVE_FORMAT_IEEE_FLOAT, 4, None, None, None, None, numpy.dtype('<f4')),
+}
+
+# bit rate: (format tag, sample dtype, offset, scale) matching pedalboard's decoder
+READ_FORMATS = {
+    8: (WAVE_FORMAT_PCM, numpy.dtype('u1'), -128, numpy.float32(1 / 127)),
+    16: (WAVE_FORMAT_PCM, numpy.dtype('<i2'), 0, numpy.float32(1 / 32767)),
+    24: (WAVE_FORMAT_PCM, numpy.dtype('u1'), 0, numpy.float32(1 / 8388607)),
+    32: (WAVE_FORMAT_IEEE_FLOAT, numpy.dtype('<f4'), 0, None),
+}
+
+
+class WavWriter:
+    """Write float audio blocks to a WAV file.
+
+    8, 16 and 24 bit audio is written as clipped integer PCM, 32 bit as IEEE float.
+    Frames are interleaved as they are converted.
+
+    :param audio_output: filename or writable file-like object.
+    :param int nchannels: number of channels.
+    :param float sample_rate: sample rate of the audio.
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :param int nframes: number of frames if known, lets unseekable outputs be written.
+    :param int chunk_size: frames converted at a time.
+    """
+
+    def __init__(
+            self,
+            audio_output,
+            nchannels: int,
+            sample_rate: float,
+            bit_rate: int = 16,
+            nframes: int = 0,
+            chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if bit_rate not in FORMATS:
+            raise ValueError(
+                "Unsupported bit rate {}, expected one of {}.".format(bit_rate, sorted(FORMATS))
+            )
+
+        (
+            self.format_tag, self.sampwidth, self._multiplier, self._offset,
+            self._minimum, self._maximum, buffer_dtype
+        ) = FORMATS[bit_rate]
+        self.nchannels = nchannels
+        self.sample_rate = int(round(sample_rate))
+        self.bit_rate = bit_rate
+        self.chunk_size = chunk_size
+        self.nframes_written = 0
+        self._nframes = nframes
+
+        # Reused for every chunk
+        self._buffer = numpy.empty((chunk_size, nchannels), dtype=buffer_dtype)
+        self._scratch = None
+        self._packed = None
+        if self.format_tag == WAVE_FORMAT_PCM:
+            # 24 bit needs more precision than float32 has
+            scratch_dtype = numpy.float64 if bit_rate == 24 else numpy.float32
+            self._scratch = numpy.empty((chunk_size, nchannels), dtype=scratch_dtype)
+        if self.sampwidth == 3:
+            self._packed = numpy.empty((chunk_size * nchannels, 3), dtype=numpy.uint8)
+
+        self._owns_file = isinstance(audio_output, str)
+        self._file = open(audio_output, 'wb') if self._owns_file else audio_output
+        try:
+            self._start = self._file.tell()
+        except (AttributeError, OSError):
+            self._start = None
+        self._file.write(self._header(nframes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, audio_array: numpy.ndarray):
+        """Convert and write a channel-major float audio array.
+
+        :param numpy.ndarray audio_array: shape (channels, frames).
+        """
+        if audio_array.shape[0] != self.nchannels:
+            raise ValueError(
+                "Expected {} channels, got {}.".format(self.nchannels, audio_array.shape[0])
+            )
+
+        frames = audio_array.shape[1]
+        for start in range(0, frames, self.chunk_size):
+            chunk = audio_array[:, start:start + self.chunk_size]
+            self._file.write(self._convert(chunk))
+        self.nframes_written += frames
+
+    def close(self):
+        """Pad the data chunk and fix the header sizes if needed."""
+        if self._file is None:
+            return
+
+        data_length = self.nframes_written * self.nchannels * self.sampwidth
+        if data_length & 1:
+            self._file.write(b'\0')
+
+        if self.nframes_written != self._nframes:
+            if self._start is None:
+                raise ValueError(
+                    "Wrote {} frames but declared {} to an unseekable output.".format(
+                        self.nframes_written, self._nframes
+                    )
+                )
+            end = self._file.tell()
+            self._file.seek(self._start)
+            self._file.write(self._header(self.nframes_written))
+            self._file.seek(end)
+
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+    def _convert(self, chunk: numpy.ndarray) -> memoryview:
+        """Quantize and interleave a chunk into the reused buffers.
+
+        :param numpy.ndarray chunk: shape (channels, frames) with at most chunk_size frames.
+        :return memoryview: bytes to write.
+        """
+        frames = chunk.shape[1]
+        buffer = self._buffer[:frames]
+        if self._scratch is None:
+            # Float, written as is
+            numpy.copyto(buffer, chunk.T, casting='same_kind')
+            return memoryview(buffer).cast('B')
+
+        # Writing through the transposed view interleaves the frames
+        scratch = self._scratch[:frames]
+        numpy.multiply(chunk.T, self._multiplier, out=scratch, casting='same_kind')
+        if self._offset:
+            numpy.add(scratch, self._offset, out=scratch)
+        numpy.clip(scratch, self._minimum, self._maximum, out=scratch)
+        # Truncates towards zero like astype
+        numpy.copyto(buffer, scratch, casting='unsafe')
+
+        if self._packed is None:
+            return memoryview(buffer).cast('B')
+
+        # Keep the low three bytes of each little endian int32
+        packed = self._packed[:frames * self.nchannels]
+        packed[:] = buffer.view(numpy.uint8).reshape(-1, 4)[:, :3]
+        return memoryview(packed).cast('B')
+
+    def _header(self, nframes: int) -> bytes:
+        """Build the RIFF header for a number of frames.
+
+        :param int nframes:
+        :return bytes:
+        """
+        return header(self.nchannels, self.sample_rate, self.bit_rate, nframes)
+
+
+def header(nchannels: int, sample_rate: float, bit_rate: int, nframes: int) -> bytes:
+    """Build the RIFF header of a WAV file.
+
+    :param int nchannels: number of channels.
+    :param float sample_rate: sample rate of the audio.
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :param int nframes: number of frames.
+    :return bytes:
+    """
+    format_tag, sampwidth = FORMATS[bit_rate][:2]
+    sample_rate = int(round(sample_rate))
+    block_align = nchannels * sampwidth
+    data_length = nframes * block_align
+    fmt = struct.pack(
+        '<HHIIHH',
+        format_tag,
+        nchannels,
+        sample_rate,
+        sample_rate * block_align,
+        block_align,
+        sampwidth * 8
+    )
+    fact = b''
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        # Non-PCM formats carry an extension size and a fact chunk
+        fmt += struct.pack('<H', 0)
+        fact = b'fact' + struct.pack('<II', 4, nframes)
+
+    riff_length = 4 + (8 + len(fmt)) + len(fact) + 8 + data_length + (data_length & 1)
+    return (
+        b'RIFF' + struct.pack('<I', riff_length) + b'WAVE'
+        + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        + fact
+        + b'data' + struct.pack('<I', data_length)
+    )
+
+
+def file_size(nchannels: int, bit_rate: int, nframes: int) -> int:
+    """Get the size of a WAV file as written by WavWriter, without writing it.
+
+    :param int nchannels: number of channels.
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :param int nframes: number of frames.
+    :return int: bytes.
+    """
+    data_length = nframes * nchannels * FORMATS[bit_rate][1]
+    # The sample rate only changes header values, not its length
+    return len(header(nchannels, 44100.0, bit_rate, 0)) + data_length + (data_length & 1)
+
+
+def quantize(samples: numpy.ndarray, bit_rate: int) -> numpy.ndarray:
+    """Convert interleaved float samples to WAV sample bytes in one pass.
+
+    Gives the same bytes as WavWriter, for audio already in memory.
+
+    :param numpy.ndarray samples: 1d float32 samples, interleaved.
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :return numpy.ndarray: uint8 sample bytes.
+    """
+    format_tag, sampwidth, multiplier, offset, minimum, maximum, buffer_dtype = FORMATS[bit_rate]
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return samples.astype(buffer_dtype).view(numpy.uint8)
+
+    # Same conversion as WavWriter._convert
+    scratch = numpy.empty(samples.shape, dtype=numpy.float64 if bit_rate == 24 else numpy.float32)
+    numpy.multiply(samples, multiplier, out=scratch, casting='same_kind')
+    if offset:
+        numpy.add(scratch, offset, out=scratch)
+    numpy.clip(scratch, minimum, maximum, out=scratch)
+    # Truncates towards zero like astype
+    converted = scratch.astype(buffer_dtype).view(numpy.uint8)
+    if sampwidth == 3:
+        # Keep the low three bytes of each little endian int32
+        return converted.reshape(-1, 4)[:, :3].reshape(-1)
+    return converted
+
+
+class WavReader:
+    """Memory-mapped samples of a PCM or float WAV file.
+
+    Nothing is decoded up front, read converts just the frames and channels
+    asked for to float.
+
+        reader = WavReader.open("kick.wav")
+        if reader is not None:
+            left = reader.read(channel=0)
+
+    :param numpy.ndarray samples: shape (frames, channels), or (frames, channels, 3) bytes for 24 bit.
+    :param float sample_rate: sample rate of the audio.
+    :param int bit_rate: 8, 16, 24 or 32 bit.
+    :param int chunk_size: frames converted at a time.
+    """
+
+    def __init__(
+            self,
+            samples: numpy.ndarray,
+            sample_rate: float,
+            bit_rate: int,
+            chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.samples = samples
+        self.samplerate = sample_rate
+        self.bit_rate = bit_rate
+        self.chunk_size = chunk_size
+        _, _, self._offset, self._scale = READ_FORMATS[bit_rate]
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def num_channels(self) -> int:
+        return self.samples.shape[1]
+
+    @classmethod
+    def open(cls, audio_input, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Map the samples of a WAV file or bytes.
+
+        :param audio_input: audio file path or bytes.
+        :param int chunk_size: frames converted at a time.
+        :return WavReader: or None if the input is not a WAV file which can be mapped,
+            e.g. compressed, file-like or empty.
+        """
+        if isinstance(audio_input, (str, os.PathLike)):
+            with open(audio_input, 'rb') as f:
+                header = _read_header(f)
+        elif isinstance(audio_input, (bytes, bytearray, memoryview)):
+            header = _read_header(io.BytesIO(audio_input))
+        else:
+            return None
+
+        if header is None:
+            return None
+        format_tag, nchannels, sample_rate, bit_rate, data_offset, data_length = header
+        if bit_rate not in READ_FORMATS or READ_FORMATS[bit_rate][0] != format_tag or not nchannels:
+            return None
+
+        dtype = READ_FORMATS[bit_rate][1]
+        sampwidth = bit_rate // 8
+        # Truncated files are read up to their last whole frame
+        if isinstance(audio_input, (str, os.PathLike)):
+            available = os.path.getsize(audio_input) - data_offset
+        else:
+            available = memoryview(audio_input).nbytes - data_offset
+        nframes = min(data_length, available) // (nchannels * sampwidth)
+        if nframes <= 0:
+            return None
+
+        shape = (nframes, nchannels, 3) if bit_rate == 24 else (nframes, nchannels)
+        if isinstance(audio_input, (str, os.PathLike)):
+            samples = numpy.memmap(audio_input, dtype=dtype, mode='r', offset=data_offset, shape=shape)
+        else:
+            samples = numpy.frombuffer(
+                audio_input, dtype=dtype, count=int(numpy.prod(shape)), offset=data_offset
+            ).reshape(shape)
+        logger.debug("Mapped {} frames of {} bit WAV.".format(nframes, bit_rate))
+        return cls(samples, sample_rate, bit_rate, chunk_size)
+
+    def read(self, start: int = 0, frames: int = None, channel: int = None) -> numpy.ndarray:
+        """Convert frames to a channel-major float32 audio array.
+
+        :param int start: first frame.
+        :param int frames: number of frames, None for the rest of the file.
+        :param int channel: convert only this channel, None for every channel.
+        :return numpy.ndarray: shape (channels, frames).
+        """
+        end = self.frames if frames is None else min(start + frames, self.frames)
+        samples = self.samples[start:end]
+        if channel is not None:
+            samples = samples[:, channel:channel + 1]
+
+        audio_array = numpy.empty((samples.shape[1], samples.shape[0]), dtype=numpy.float32)
+        for chunk_start in range(0, samples.shape[0], self.chunk_size):
+            chunk = samples[chunk_start:chunk_start + self.chunk_size]
+            out = audio_array[:, chunk_start:chunk_start + chunk.shape[0]]
+            if self.bit_rate == 24:
+                # Sign extend the three little endian bytes of each sample
+                chunk = chunk.astype(numpy.int32)
+                chunk = (chunk[..., 0] | (chunk[..., 1] << 8) | (chunk[..., 2] << 16)) << 8 >> 8
+            # Writing through the transposed view de-interleaves the frames
+            if self._scale is None:
+                numpy.copyto(out, chunk.T, casting='unsafe')
+            elif self._offset:
+                numpy.copyto(out, chunk.T, casting='unsafe')
+                numpy.add(out, self._offset, out=out)
+                numpy.multiply(out, self._scale, out=out)
+            else:
+                numpy.multiply(chunk.T, self._scale, out=out, casting='unsafe')
+        return audio_array
+
+
+def read_info(audio_input: str) -> tuple:
+    """Read the format of a WAV file from its header alone.
+
+    :param str audio_input: audio file path.
+    :return tuple: channels, sample rate, bit rate and frames, or None if it is not
+        a WAV file which can be mapped, see WavReader.open.
+    """
+    with open(audio_input, 'rb') as f:
+        header = _read_header(f)
+    if header is None:
+        return None
+    format_tag, nchannels, sample_rate, bit_rate, data_offset, data_length = header
+    if bit_rate not in READ_FORMATS or READ_FORMATS[bit_rate][0] != format_tag or not nchannels:
+        return None
+
+    available = os.path.getsize(audio_input) - data_offset
+    return nchannels, float(sample_rate), bit_rate, min(data_length, available) // (nchannels * bit_rate // 8)
+
+
+def _read_header(f) -> tuple:
+    """Find the format and data chunks of a RIFF WAVE file.
+
+    :param f: binary file object at the start of the file.
+    :return tuple: format tag, channels, sample rate, bit rate, data offset and
+        data length, or None if it is not a WAV file.
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            return None
+        chunk_id, chunk_length = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+
+        if chunk_id == b'fmt ':
+            fmt = f.read(chunk_length)
+            if len(fmt) < 16:
+                return None
+            format_tag, nchannels, sample_rate, _, _, bit_rate = struct.unpack('<HHIIHH', fmt[:16])
+            if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                if len(fmt) < 26:
+                    return None
+                # The sub format GUID starts with the format tag
+                format_tag, = struct.unpack('<H', fmt[24:26])
+            fmt = (format_tag, nchannels, sample_rate, bit_rate)
+            f.seek(chunk_length & 1, io.SEEK_CUR)
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            return fmt + (f.tell(), chunk_length)
+        else:
+            # Chunks are padded to an even length
+            f.seek(chunk_length + (chunk_length & 1), io.SEEK_CUR)
@@ -2,11 +2,23 @@ import pytest
 import os
 import numpy
 import pedalboard
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import index
 
 
 ABSPATH = os.path.realpath("./tests/audio_files")
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Fixture keeping the default result cache and index of each test in its temporary directory.
+
+    :return None:
+    """
+    monkeypatch.setattr(cache, "DEFAULT_CACHE_DIR", str(tmp_path / "default_cache"))
+    monkeypatch.setattr(index, "DEFAULT_INDEX_PATH", str(tmp_path / "default_index.sqlite"))
+
+
 @pytest.fixture(scope="session")
 def mock_audio_input_files():
     """Fixture for audio input files.
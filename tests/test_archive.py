@@ -0,0 +1,155 @@
+import io
+import os
+import pytest
+import zipfile
+from nanoloop_mobile_sample_tools import archive
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+def get_uploads(mock_audio_input_files) -> list:
+    """Get the audio input files as in-memory uploads.
+
+    :return list:
+    """
+    uploads = []
+    for path in mock_audio_input_files:
+        with open(path, "rb") as f:
+            uploads.append(io.BytesIO(f.read()))
+    return uploads
+
+
+def test_process_to_archive(mock_audio_input_files):
+    """Test processing uploads into an in-memory zip archive.
+
+    :return None:
+    :raises AssertionError:
+    """
+    file_names = ["a.wav", "b.wav", "c.wav"]
+    archive_bytes = archive.process_to_archive(get_uploads(mock_audio_input_files), file_names)
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as zf:
+        assert zf.namelist() == ["processed_a.wav", "processed_b.wav", "processed_c.wav"]
+
+
+def test_process_to_archive_cache(tmp_path, mock_audio_input_files):
+    """Test in-memory uploads are served from the cache on a rerun.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path))
+    file_names = ["a.wav", "b.wav", "c.wav"]
+    first = archive.process_to_archive(
+        get_uploads(mock_audio_input_files), file_names, result_cache=result_cache, concatenate=True
+    )
+    second = archive.process_to_archive(
+        get_uploads(mock_audio_input_files), file_names, result_cache=result_cache, concatenate=True
+    )
+    assert result_cache.hits == 1
+    with zipfile.ZipFile(io.BytesIO(first)) as a, zipfile.ZipFile(io.BytesIO(second)) as b:
+        assert a.namelist() == b.namelist() == ["processed.wav"]
+        assert a.read("processed.wav") == b.read("processed.wav")
+
+
+def get_sample_pack(mock_audio_input_files) -> io.BytesIO:
+    """Get the audio input files in a zip archive of directories, with files which are not audio.
+
+    :return io.BytesIO:
+    """
+    archive_buffer = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for directory, path in zip(["kicks", "kicks", "snares"], mock_audio_input_files):
+            zf.write(path, "pack/{}/{}".format(directory, os.path.basename(path)))
+        zf.writestr("pack/readme.txt", "not audio")
+        zf.writestr("__MACOSX/pack/._think.wav", "resource fork")
+    archive_buffer.seek(0)
+    return archive_buffer
+
+
+def test_process_archive(mock_audio_input_files):
+    """Test processing the audio files of an uploaded zip archive, each output kept in its directory.
+
+    :return None:
+    :raises AssertionError:
+    """
+    sample_pack = get_sample_pack(mock_audio_input_files)
+    file_names = archive.audio_members(sample_pack)
+    assert file_names == [
+        "pack/kicks/audio_input_1.wav", "pack/kicks/audio_input_2.wav", "pack/snares/think.wav"
+    ]
+
+    pipeline = Pipeline(sample_rate=22050.0, normalize=True, pipelined=True)
+    archive_bytes = archive.process_archive(sample_pack, pipeline=pipeline, bit_rate=8)
+    expected_bytes = archive.process_to_archive(
+        get_uploads(mock_audio_input_files), file_names, pipeline=pipeline, bit_rate=8
+    )
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as a, zipfile.ZipFile(io.BytesIO(expected_bytes)) as b:
+        assert a.namelist() == b.namelist() == [
+            "pack/kicks/processed_audio_input_1.wav",
+            "pack/kicks/processed_audio_input_2.wav",
+            "pack/snares/processed_think.wav",
+        ]
+        for name in a.namelist():
+            assert a.read(name) == b.read(name)
+
+
+def test_process_archive_members(tmp_path, monkeypatch, mock_audio_input_files):
+    """Test archive members are opened one at a time by the decode stage, and never to hash them.
+
+    :return None:
+    :raises AssertionError:
+    """
+    sample_pack = io.BytesIO()
+    with zipfile.ZipFile(sample_pack, "w", zipfile.ZIP_DEFLATED) as zf:
+        for index in range(4):
+            for path in mock_audio_input_files:
+                zf.write(path, "pack/{}/{}".format(index, os.path.basename(path)))
+
+    opened = []
+    open_members = []
+    zipfile_open = zipfile.ZipFile.open
+
+    def tracked_open(upload, name, mode="r", *args, **kwargs):
+        member = zipfile_open(upload, name, mode, *args, **kwargs)
+        if mode != "r":
+            # Outputs being added to the processed archive
+            return member
+        member_close = member.close
+        open_members.append(member)
+        opened.append(len(open_members))
+
+        def tracked_close():
+            if member in open_members:
+                open_members.remove(member)
+            member_close()
+
+        member.close = tracked_close
+        return member
+
+    monkeypatch.setattr(zipfile.ZipFile, "open", tracked_open)
+    result_cache = cache.ResultCache(str(tmp_path))
+    pipeline = Pipeline(sample_rate=22050.0, pipelined=True)
+    archive.process_archive(sample_pack, result_cache, pipeline, bit_rate=8)
+    # Only the decode thread opens members, well under the two files queued between stages
+    assert len(opened) == 12 and max(opened) <= 2
+    assert not open_members
+
+    opened.clear()
+    archive.process_archive(sample_pack, result_cache, pipeline, bit_rate=8)
+    assert result_cache.hits == 12 and not opened
+
+
+def test_process_archive_invalid(mock_audio_input_files):
+    """Test archives without audio files, or decompressing past the limit, are refused.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with pytest.raises(ValueError):
+        archive.process_archive(get_sample_pack(mock_audio_input_files), max_bytes=1024)
+
+    empty = io.BytesIO()
+    with zipfile.ZipFile(empty, "w") as zf:
+        zf.writestr("readme.txt", "not audio")
+    with pytest.raises(ValueError):
+        archive.process_archive(empty)
@@ -0,0 +1,94 @@
+import io
+import numpy
+import pytest
+from nanoloop_mobile_sample_tools import batch
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import stats
+
+
+@pytest.fixture
+def ragged_arrays():
+    """Fixture for short mono and stereo samples of different lengths, one empty.
+
+    :return list:
+    """
+    rng = numpy.random.default_rng(0)
+    return [
+        rng.uniform(-0.5, 0.5, (channels, frames)).astype(numpy.float32)
+        for channels, frames in [(2, 100), (1, 37), (2, 0), (1, 1), (2, 513)]
+    ]
+
+
+def test_round_trip(ragged_arrays):
+    """Test packing then unpacking gives the same arrays.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_batch = batch.AudioBatch.from_arrays(ragged_arrays)
+    assert len(audio_batch) == len(ragged_arrays)
+    assert audio_batch.buffer.size == sum(audio_array.size for audio_array in ragged_arrays)
+    for audio_array, unpacked in zip(ragged_arrays, audio_batch.to_arrays()):
+        assert numpy.array_equal(audio_array, unpacked)
+
+
+def test_stages_match_commands(ragged_arrays):
+    """Test the batch stages give the same audio as the per-array commands.
+
+    :return None:
+    :raises AssertionError:
+    """
+    filled = [audio_array for audio_array in ragged_arrays if audio_array.size]
+
+    audio_batch = batch.AudioBatch.from_arrays(filled)
+    assert numpy.array_equal(audio_batch.peaks(), [numpy.max(numpy.abs(audio_array)) for audio_array in filled])
+    for audio_stats, audio_array in zip(audio_batch.stats(), filled):
+        expected_stats = stats.measure(audio_array)
+        for name in ("peak", "rms", "dc_offset"):
+            assert audio_stats[name] == pytest.approx(expected_stats[name])
+        assert audio_stats["clips"] == expected_stats["clips"]
+        assert audio_stats["samples"] == expected_stats["samples"]
+    audio_batch.normalize()
+    audio_batch.reverse()
+    for audio_array, processed in zip(filled, audio_batch.to_arrays()):
+        expected = commands.reverse_audio(commands.peak_normalize_audio(audio_array))
+        assert numpy.array_equal(processed, expected)
+
+    audio_batch = batch.AudioBatch.from_arrays(ragged_arrays)
+    audio_batch.mono('right')
+    for audio_array, processed in zip(ragged_arrays, audio_batch.to_arrays()):
+        expected = audio_array[1:] if audio_array.shape[0] > 1 else audio_array
+        assert numpy.array_equal(processed, expected)
+
+
+@pytest.mark.parametrize("bit_rate", [8, 16, 24, 32])
+def test_save_matches_commands(ragged_arrays, bit_rate):
+    """Test saving a batch writes the same bytes as saving each array.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_outputs = [io.BytesIO() for _ in ragged_arrays]
+    batch.AudioBatch.from_arrays(ragged_arrays).save(audio_outputs, 22050.0, bit_rate)
+    for audio_array, audio_output in zip(ragged_arrays, audio_outputs):
+        expected = commands.save(audio_array, 22050.0, bit_rate, io.BytesIO())
+        assert audio_output.getvalue() == expected.getvalue()
+
+
+def test_save_chunks(ragged_arrays):
+    """Test saving a batch in runs under a byte budget writes the same bytes as saving it at once.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_batch = batch.AudioBatch.from_arrays(ragged_arrays)
+    assert audio_batch.chunks(1) == [(index, index + 1) for index in range(len(ragged_arrays))]
+    assert audio_batch.chunks() == [(0, len(ragged_arrays))]
+    assert batch.fits(ragged_arrays) and not batch.fits(ragged_arrays, 1024)
+
+    whole_outputs = [io.BytesIO() for _ in ragged_arrays]
+    chunked_outputs = [io.BytesIO() for _ in ragged_arrays]
+    audio_batch.save(whole_outputs, 22050.0, 24)
+    audio_batch.save(chunked_outputs, 22050.0, 24, max_bytes=1024)
+    for whole_output, chunked_output in zip(whole_outputs, chunked_outputs):
+        assert whole_output.getvalue() == chunked_output.getvalue()
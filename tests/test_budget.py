@@ -0,0 +1,62 @@
+from nanoloop_mobile_sample_tools import budget
+from nanoloop_mobile_sample_tools import commands
+import io
+import pytest
+
+
+def test_candidates():
+    """Test candidates are capped by the settings asked for and ordered best first.
+
+    :return None:
+    :raises AssertionError:
+    """
+    candidates = budget.candidates(22050.0, 16)
+    assert candidates[:3] == [(22050.0, 16, False), (22050.0, 16, True), (11025.0, 16, False)]
+    assert all(sample_rate <= 22050.0 and bit_rate <= 16 for sample_rate, bit_rate, _ in candidates)
+    assert all(trim for _, _, trim in budget.candidates(44100.0, 16, trim=True))
+    assert candidates[-1] == (8000.0, 8, True)
+
+
+def test_export(mock_audio_input_files):
+    """Test export picks the best settings which fit and matches process at them.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_outputs = [io.BytesIO() for _ in mock_audio_input_files]
+    result = budget.export(
+        mock_audio_input_files, audio_outputs, max_bytes=100000, sample_rate=44100.0, bit_rate=16, normalize=True
+    )
+    saved_bytes = sum(len(audio_output.getvalue()) for audio_output in audio_outputs)
+    assert result["bytes"] == saved_bytes <= 100000
+    assert (result["sample_rate"], result["bit_rate"]) == (11025.0, 16)
+
+    for audio_output, expected in zip(
+            audio_outputs, commands.process(mock_audio_input_files, sample_rate=11025.0, normalize=True)):
+        expected_output = commands.save(expected, 11025.0, 16, io.BytesIO())
+        assert audio_output.getvalue() == expected_output.getvalue()
+
+
+def test_export_sizes(mock_audio_input_files):
+    """Test sizes are never under the saved size, resampling by an uneven ratio.
+
+    :return None:
+    :raises AssertionError:
+    """
+    sources = [commands.decode_audio(audio_input) + ((0, 0),) for audio_input in mock_audio_input_files]
+    for sample_rate in [44100.0, 8000.0]:
+        for audio_input, size in zip(
+                mock_audio_input_files, budget.output_sizes(sources, (sample_rate, 24, False), 1.5)):
+            audio_array, = commands.process([audio_input], sample_rate=sample_rate, speed_multiplier=1.5)
+            saved = len(commands.save(audio_array, sample_rate, 24, io.BytesIO()).getvalue())
+            assert saved <= size <= saved + 2 * 3
+
+
+def test_export_too_small(mock_audio_input_files):
+    """Test a budget nothing fits raises.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with pytest.raises(ValueError):
+        budget.export(mock_audio_input_files, [io.BytesIO() for _ in mock_audio_input_files], max_file_bytes=100)
@@ -0,0 +1,266 @@
+import concurrent.futures
+import io
+import json
+import numpy
+import os
+import pytest
+from nanoloop_mobile_sample_tools import batch
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import stats
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+def test_key_settings(tmp_path, mock_audio_input_files):
+    """Test cache keys change with the settings and inputs.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path))
+    key = result_cache.key(mock_audio_input_files[:1], sample_rate=44100.0)
+    assert key == result_cache.key(mock_audio_input_files[:1], sample_rate=44100.0)
+    assert key != result_cache.key(mock_audio_input_files[:1], sample_rate=22050.0)
+    assert key != result_cache.key(mock_audio_input_files[1:2], sample_rate=44100.0)
+
+
+def test_get_put(tmp_path, mock_audio_input_files):
+    """Test a put file is returned by get and counted as a hit.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path))
+    assert result_cache.get("key") is None
+    result_cache.put("key", mock_audio_input_files[0])
+    assert os.path.isfile(result_cache.get("key"))
+    assert result_cache.hits == 1 and result_cache.misses == 1
+
+
+def test_evict(tmp_path, mock_audio_input_files):
+    """Test the least recently used files are evicted past the size cap.
+
+    :return None:
+    :raises AssertionError:
+    """
+    size = os.path.getsize(mock_audio_input_files[0])
+    result_cache = cache.ResultCache(str(tmp_path), max_bytes=size * 2)
+    for key in ["a", "b"]:
+        result_cache.put(key, mock_audio_input_files[0])
+    os.utime(result_cache.path("a"), (0, 0))
+    os.utime(result_cache.path("b"), (1, 1))
+    result_cache.get("a")
+    result_cache.put("c", mock_audio_input_files[0])
+    assert result_cache.get("b") is None
+    assert result_cache.get("a") and result_cache.get("c")
+
+
+def test_process_and_save_hit(tmp_path, monkeypatch, mock_audio_input_files):
+    """Test a second run is served from the cache without processing.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path / "cache"))
+    audio_outputs = [str(tmp_path / "first.wav")]
+    cache.process_and_save(mock_audio_input_files[:1], audio_outputs, cache=result_cache, compress='soft')
+
+    def fail(*args, **kwargs):
+        pytest.fail("process called on a cache hit")
+
+    monkeypatch.setattr(Pipeline, "__call__", fail)
+    cached_outputs = [str(tmp_path / "second.wav")]
+    cache.process_and_save(mock_audio_input_files[:1], cached_outputs, cache=result_cache, compress='soft')
+    assert result_cache.hits == 1 and result_cache.misses == 1
+    with open(audio_outputs[0], "rb") as first, open(cached_outputs[0], "rb") as second:
+        assert first.read() == second.read()
+
+
+def test_stage_cache_evict():
+    """Test stage outputs are shared read-only and the least recently used are evicted past the cap.
+
+    :return None:
+    :raises AssertionError:
+    """
+    stage_cache = cache.StageCache(max_bytes=8000)
+    audio_array = stage_cache.put(("a",), numpy.zeros((1, 1000), dtype=numpy.float32))
+    assert not audio_array.flags.writeable
+    stage_cache.put(("b",), (numpy.zeros((1, 1000), dtype=numpy.float32), 44100.0))
+    assert stage_cache.get(("a",)) is audio_array
+    stage_cache.put(("c",), numpy.zeros((1, 1000), dtype=numpy.float32))
+    assert stage_cache.get(("b",)) is None
+    assert stage_cache.get(("a",)) is not None and len(stage_cache) == 2
+    assert stage_cache.nbytes == 8000
+
+
+def test_stage_cache_digest_threads(mock_audio_input_files):
+    """Test inputs hash the same while other threads hash and clear the stage cache.
+
+    :return None:
+    :raises AssertionError:
+    """
+    stage_cache = cache.StageCache()
+    audio_inputs = list(mock_audio_input_files)
+    audio_inputs += [open(path, "rb").read() for path in mock_audio_input_files]
+    expected = [cache.hash_audio_input(audio_input) for audio_input in audio_inputs]
+
+    def digests(_):
+        stage_cache.clear()
+        return [stage_cache.digest(audio_input) for audio_input in audio_inputs]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(result == expected for result in executor.map(digests, range(32)))
+
+
+def test_stage_cache_pipeline(mock_audio_input_files):
+    """Test changing one option only reruns the stages after it, with the same output.
+
+    :return None:
+    :raises AssertionError:
+    """
+    stage_cache = cache.StageCache()
+    Pipeline(sample_rate=22050.0, compress='soft')(mock_audio_input_files, stage_cache=stage_cache)
+
+    pipeline = Pipeline(sample_rate=22050.0, compress='soft', normalize=True)
+    profiler = profiling.Profiler(trace_memory=False)
+    audio_arrays = pipeline(mock_audio_input_files, profiler, stage_cache)
+    stages = {record["stage"] for record in profiler.records}
+    assert "reuse" in stages and not stages & {"decode", "resample", "compress"}
+    for audio_array, expected in zip(audio_arrays, pipeline(mock_audio_input_files)):
+        assert numpy.array_equal(audio_array, expected)
+
+    profiler = profiling.Profiler(trace_memory=False)
+    Pipeline(sample_rate=11025.0, compress='soft')(mock_audio_input_files, profiler, stage_cache)
+    stages = {record["stage"] for record in profiler.records}
+    assert "decode" not in stages and {"resample", "compress"} <= stages
+
+
+def test_process_and_save_pipelined(tmp_path, mock_audio_input_files):
+    """Test pipelined process and save writes the same files, and saves each one.
+
+    :return None:
+    :raises AssertionError:
+    """
+    options = dict(sample_rate=22050.0, compress='soft', normalize=True, bit_rate=8)
+    serial_outputs = [str(tmp_path / "serial_{}.wav".format(index)) for index in range(3)]
+    pipelined_outputs = [str(tmp_path / "pipelined_{}.wav".format(index)) for index in range(3)]
+    cache.process_and_save(mock_audio_input_files, serial_outputs, **options)
+
+    profiler = profiling.Profiler(trace_memory=False)
+    saved = cache.process_and_save(
+        mock_audio_input_files, pipelined_outputs, profiler=profiler, pipelined=True, **options
+    )
+    assert saved == pipelined_outputs
+    for serial_output, pipelined_output in zip(serial_outputs, pipelined_outputs):
+        with open(serial_output, "rb") as serial_file, open(pipelined_output, "rb") as pipelined_file:
+            assert serial_file.read() == pipelined_file.read()
+    assert [record["file"] for record in profiler.records if record["stage"] == "save"] == pipelined_outputs
+
+    with pytest.raises(ValueError):
+        Pipeline(workers=2, pipelined=True)
+
+
+def test_process_and_save_over_budget(tmp_path, monkeypatch, mock_audio_input_files):
+    """Test outputs over the batch byte budget are saved one at a time, with the same bytes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    options = dict(sample_rate=22050.0, normalize=True, bit_rate=16)
+    batched_outputs = [str(tmp_path / "batched_{}.wav".format(index)) for index in range(3)]
+    single_outputs = [str(tmp_path / "single_{}.wav".format(index)) for index in range(3)]
+    profiler = profiling.Profiler(trace_memory=False)
+    cache.process_and_save(mock_audio_input_files, batched_outputs, profiler=profiler, **options)
+    assert [record["stage"] for record in profiler.records].count("quantize") == 1
+
+    monkeypatch.setattr(batch, "DEFAULT_MAX_BYTES", 1024)
+    profiler = profiling.Profiler(trace_memory=False)
+    cache.process_and_save(mock_audio_input_files, single_outputs, profiler=profiler, **options)
+    assert "quantize" not in [record["stage"] for record in profiler.records]
+    for batched_output, single_output in zip(batched_outputs, single_outputs):
+        with open(batched_output, "rb") as batched_file, open(single_output, "rb") as single_file:
+            assert batched_file.read() == single_file.read()
+
+
+def test_process_and_save_stats(tmp_path, mock_audio_input_files):
+    """Test sidecars are written for processed and cached outputs alike.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path / "cache"))
+    for run in ("miss", "hit"):
+        audio_outputs = [str(tmp_path / "{}_{}.wav".format(run, index)) for index in range(3)]
+        stats_outputs = [stats.sidecar_path(audio_output) for audio_output in audio_outputs]
+        profiler = profiling.Profiler(trace_memory=False)
+        cache.process_and_save(
+            mock_audio_input_files,
+            audio_outputs,
+            cache=result_cache,
+            bit_rate=32,
+            normalize=True,
+            target_rms_db=-30.0,
+            profiler=profiler,
+            stats_outputs=stats_outputs
+        )
+        for stats_output in stats_outputs:
+            with open(stats_output) as f:
+                report = json.load(f)
+            assert report["peak"] <= 1.0 and report["clips"] == 0
+            assert report["rms_db"] == pytest.approx(-30.0, abs=0.01) or report["peak"] == pytest.approx(1.0)
+        stages = {record["stage"] for record in profiler.records if "stats" in record}
+        assert stages == ({"save"} if run == "miss" else {"cache"})
+    assert result_cache.hits == 3
+
+
+def test_process_and_save_stats_empty(tmp_path):
+    """Test a cached output trimmed to nothing reports the same statistics as when it was processed.
+
+    :return None:
+    :raises AssertionError:
+    """
+    silent_input = str(tmp_path / "silent.wav")
+    commands.save(numpy.zeros((1, 4410), dtype=numpy.float32), 44100.0, 16, silent_input)
+    result_cache = cache.ResultCache(str(tmp_path / "cache"))
+    reports = []
+    for run in ("miss", "hit"):
+        stats_output = str(tmp_path / "{}.json".format(run))
+        cache.process_and_save(
+            [silent_input],
+            [str(tmp_path / "{}.wav".format(run))],
+            cache=result_cache,
+            trim=True,
+            stats_outputs=[stats_output]
+        )
+        with open(stats_output) as f:
+            reports.append(json.load(f))
+    assert result_cache.hits == 1
+    assert reports[0] == reports[1]
+    assert reports[1]["samples"] == 0 and reports[1]["peak_db"] is None
+
+
+def test_process_and_save_evicted(tmp_path, mock_audio_input_files):
+    """Test a cached file evicted between its hit and the copy is processed as a miss.
+
+    :return None:
+    :raises AssertionError:
+    """
+    result_cache = cache.ResultCache(str(tmp_path / "cache"))
+    audio_outputs = [str(tmp_path / "{}.wav".format(index)) for index in range(3)]
+    cache.process_and_save(mock_audio_input_files, audio_outputs, cache=result_cache)
+    with open(audio_outputs[0], "rb") as f:
+        expected_bytes = f.read()
+
+    class EvictingCache(cache.ResultCache):
+        def get(self, key):
+            path = super().get(key)
+            # Another session evicts it straight after
+            os.remove(path)
+            return path
+
+    evicting_cache = EvictingCache(result_cache.cache_dir)
+    audio_output = io.BytesIO()
+    cache.process_and_save(mock_audio_input_files[:1], [audio_output], cache=evicting_cache)
+    assert audio_output.getvalue() == expected_bytes
+    assert (evicting_cache.hits, evicting_cache.misses) == (0, 1)
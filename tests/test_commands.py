@@ -1,7 +1,9 @@
 from nanoloop_mobile_sample_tools import commands
+import io
 import os
 import numpy
 import math
+import pedalboard
 
 
 def test_process(mock_audio_input_files):
@@ -24,6 +26,18 @@ def test_process_concatenate(mock_audio_input_files):
     assert len(processed_audio) == 1 and len(mock_audio_input_files) > 1
 
 
+def test_process_pipelined(mock_audio_input_files):
+    """Test calling process with decoding on its own thread gives the same audio
+
+    :return None:
+    :raises AssertionError:
+    """
+    options = dict(sample_rate=22050.0, compress='hard', trim=True, reverse=True)
+    processed_audio = commands.process(mock_audio_input_files, pipelined=True, **options)
+    for audio_array, expected_array in zip(processed_audio, commands.process(mock_audio_input_files, **options)):
+        assert numpy.array_equal(audio_array, expected_array)
+
+
 def test_save_file(mock_audio_array):
     """Test calling wave with an audio array.
 
@@ -108,4 +122,240 @@ def test_compress_audio(mock_audio_array):
     :return None:
     :raises AssertionError:
     """
-    assert commands.compress_audio(mock_audio_array, 'soft', 44100.0).any()
\ No newline at end of file
+    assert commands.compress_audio(mock_audio_array, 'soft', 44100.0).any()
+
+
+def test_process_workers(mock_audio_input_files):
+    """Test processing with a process pool matches serial processing.
+
+    :return None:
+    :raises AssertionError:
+    """
+    kwargs = dict(mono='left', compress='soft', normalize=True, reverse=True)
+    serial_audio = commands.process(mock_audio_input_files, **kwargs)
+    parallel_audio = commands.process(mock_audio_input_files, workers=2, **kwargs)
+    assert len(serial_audio) == len(parallel_audio) == len(mock_audio_input_files)
+    for serial_array, parallel_array in zip(serial_audio, parallel_audio):
+        assert numpy.array_equal(serial_array, parallel_array)
+
+
+def test_process_workers_concatenate(mock_audio_input_files):
+    """Test concatenating falls back to serial processing with workers.
+
+    :return None:
+    :raises AssertionError:
+    """
+    serial_audio = commands.process(mock_audio_input_files, concatenate=True)
+    parallel_audio = commands.process(mock_audio_input_files, concatenate=True, workers=2)
+    assert len(parallel_audio) == 1
+    assert numpy.array_equal(serial_audio[0], parallel_audio[0])
+
+
+def test_process_block_size(mock_audio_input_files):
+    """Test streaming blocks gives the same audio as processing whole files.
+
+    :return None:
+    :raises AssertionError:
+    """
+    kwargs = dict(mono=None, compress='hard', normalize=True, reverse=True)
+    audio_arrays = commands.process(mock_audio_input_files, **kwargs)
+    audio_blocks = commands.process(mock_audio_input_files, block_size=1000, **kwargs)
+    assert len(audio_arrays) == len(audio_blocks)
+    for audio_array, blocks in zip(audio_arrays, audio_blocks):
+        assert numpy.allclose(audio_array, numpy.concatenate(list(blocks), axis=1))
+
+
+def test_process_block_size_concatenate(mock_audio_input_files):
+    """Test streaming blocks when concatenating.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_arrays = commands.process(mock_audio_input_files, mono=None, concatenate=True)
+    audio_blocks = commands.process(mock_audio_input_files, mono=None, concatenate=True, block_size=1000)
+    assert len(audio_blocks) == 1
+    assert numpy.array_equal(audio_arrays[0], numpy.concatenate(list(audio_blocks[0]), axis=1))
+
+
+def test_save_file_blocks(mock_audio_input_files):
+    """Test saving streamed blocks writes the same file as saving an array.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = commands.process(mock_audio_input_files[:1], mono=None)[0]
+    audio_blocks = commands.process(mock_audio_input_files[:1], mono=None, block_size=1000)[0]
+    commands.save(audio_array, audio_output="mock_array.wav")
+    commands.save(audio_blocks, audio_output="mock_blocks.wav")
+    with open("mock_array.wav", "rb") as array_file, open("mock_blocks.wav", "rb") as blocks_file:
+        assert array_file.read() == blocks_file.read()
+    os.remove("mock_array.wav")
+    os.remove("mock_blocks.wav")
+
+
+def test_save_file_stereo(mock_audio_array):
+    """Test stereo audio is saved interleaved.
+
+    :return None:
+    :raises AssertionError:
+    """
+    filename = "mock_stereo.wav"
+    commands.save(mock_audio_array, audio_output=filename)
+    with pedalboard.io.AudioFile(filename, 'r') as f:
+        saved_audio_array = f.read(f.frames)
+    assert numpy.allclose(saved_audio_array, mock_audio_array, atol=0.0001)
+    os.remove(filename)
+
+
+def test_process_bytes(mock_audio_input_files):
+    """Test processing audio from bytes and file-like objects.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with open(mock_audio_input_files[0], "rb") as f:
+        audio_bytes = f.read()
+    audio_arrays = commands.process([mock_audio_input_files[0], audio_bytes, io.BytesIO(audio_bytes)])
+    assert numpy.array_equal(audio_arrays[0], audio_arrays[1])
+    assert numpy.array_equal(audio_arrays[0], audio_arrays[2])
+
+
+def test_save_buffer(mock_audio_array):
+    """Test saving audio into a file-like object.
+
+    :return None:
+    :raises AssertionError:
+    """
+    buffer = io.BytesIO()
+    assert commands.save(mock_audio_array, audio_output=buffer) is buffer
+    commands.save(mock_audio_array, audio_output="mock.wav")
+    with open("mock.wav", "rb") as f:
+        assert f.read() == buffer.getvalue()
+    os.remove("mock.wav")
+
+
+def test_save_file_24_bit(mock_audio_array):
+    """Test calling wave with an audio array to 24 bit
+
+    :return None:
+    :raises AssertionError:
+    """
+    filename = "mock24.wav"
+    abspath = commands.save(mock_audio_array, audio_output = filename, bit_rate=24)
+    with pedalboard.io.AudioFile(filename, 'r') as f:
+        assert f.file_dtype == 'int24'
+    os.remove(abspath)
+
+
+def test_save_file_32_bit(mock_audio_array):
+    """Test calling wave with an audio array to 32 bit float
+
+    :return None:
+    :raises AssertionError:
+    """
+    filename = "mock32.wav"
+    abspath = commands.save(mock_audio_array, audio_output = filename, bit_rate=32)
+    with pedalboard.io.AudioFile(filename, 'r') as f:
+        assert f.file_dtype == 'float32'
+        assert numpy.array_equal(f.read(f.frames), mock_audio_array)
+    os.remove(abspath)
+
+
+def test_concatenate_audio(mock_audio_arrays):
+    """Test concatenating mono and stereo audio without changing the inputs.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_arrays = list(mock_audio_arrays)
+    shapes = [audio_array.shape for audio_array in audio_arrays]
+    concatenated = commands.concatenate_audio(audio_arrays)
+    assert [audio_array.shape for audio_array in audio_arrays] == shapes
+    expected = numpy.concatenate(
+        [
+            audio_array if audio_array.shape[0] == 2 else numpy.concatenate([audio_array, audio_array])
+            for audio_array in mock_audio_arrays
+        ],
+        axis=1
+    )
+    assert numpy.array_equal(concatenated, expected)
+
+
+def test_concatenate_audio_files(mock_audio_input_files):
+    """Test decoding into one array matches concatenating decoded arrays.
+
+    :return None:
+    :raises AssertionError:
+    """
+    for mono in ['left', None]:
+        audio_arrays = [
+            commands.read_audio(audio_input, 11025.0, 2.0, mono) for audio_input in mock_audio_input_files
+        ]
+        concatenated = commands.concatenate_audio_files(mock_audio_input_files, 11025.0, 2.0, mono)
+        assert numpy.array_equal(concatenated, commands.concatenate_audio(audio_arrays))
+
+
+def test_read_audio_mapped(mock_audio_input_files):
+    """Test mapped WAV files read the same as decoded file objects.
+
+    :return None:
+    :raises AssertionError:
+    """
+    for audio_input in mock_audio_input_files:
+        with pedalboard.io.AudioFile(audio_input) as f:
+            sample_rate = f.samplerate
+        for mono in [None, 'left', 'right']:
+            with open(audio_input, 'rb') as f:
+                expected = commands.read_audio(f, sample_rate, mono=mono)
+            assert numpy.array_equal(commands.read_audio(audio_input, sample_rate, mono=mono), expected)
+
+            blocks = list(commands.read_audio_blocks(audio_input, sample_rate, mono=mono, block_size=4096))
+            assert numpy.array_equal(numpy.concatenate(blocks, axis=1), expected)
+
+
+def test_trim_audio(mock_audio_array):
+    """Test trimming silence padded around audio, whole and streamed.
+
+    :return None:
+    :raises AssertionError:
+    """
+    silence = numpy.zeros((mock_audio_array.shape[0], 10000), dtype=numpy.float32)
+    padded_array = numpy.concatenate([silence, mock_audio_array, silence], axis=1)
+    trimmed_array = commands.trim_audio(padded_array)
+    assert trimmed_array.shape[1] < padded_array.shape[1] - 18000
+    assert numpy.abs(trimmed_array[:, :512]).max() > 0
+
+    audio_blocks = [padded_array[:, start:start + 3000] for start in range(0, padded_array.shape[1], 3000)]
+    trimmed_blocks = list(commands.trim_audio_blocks(audio_blocks))
+    assert numpy.array_equal(numpy.concatenate(trimmed_blocks, axis=1), trimmed_array)
+
+
+def test_slice_audio(mock_audio_array):
+    """Test slicing audio into equal slices.
+
+    :return None:
+    :raises AssertionError:
+    """
+    slices = commands.slice_audio(mock_audio_array, 4)
+    assert len(slices) == 4
+    assert sum(audio_slice.shape[1] for audio_slice in slices) == mock_audio_array.shape[1]
+    assert max(s.shape[1] for s in slices) - min(s.shape[1] for s in slices) <= 1
+    assert commands.slice_points(mock_audio_array, 'onsets')[0] == 0
+
+
+def test_save_slices(tmp_path, mock_audio_array):
+    """Test saving slices of an array and of streamed blocks gives the same files.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_output = str(tmp_path / "loop.wav")
+    saved = commands.save_slices(mock_audio_array, 3, audio_output=audio_output)
+    assert [os.path.basename(path) for path in saved] == ["loop_1.wav", "loop_2.wav", "loop_3.wav"]
+    with open(saved[1], "rb") as f:
+        array_bytes = f.read()
+
+    audio_blocks = iter([mock_audio_array[:, :5000], mock_audio_array[:, 5000:]])
+    saved = commands.save_slices(audio_blocks, 3, audio_output=str(tmp_path / "stream.wav"))
+    with open(saved[1], "rb") as f:
+        assert f.read() == array_bytes
@@ -0,0 +1,36 @@
+from nanoloop_mobile_sample_tools import energy
+import numpy
+
+
+def test_frame_energy_blocks(mock_audio_array):
+    """Test energies of blocks cut on window boundaries match the whole array.
+
+    :return None:
+    :raises AssertionError:
+    """
+    frame_size = 256
+    energies = energy.frame_energy(mock_audio_array, frame_size)
+    assert len(energies) == -(-mock_audio_array.shape[1] // frame_size)
+    assert numpy.allclose(energies[0], numpy.mean(numpy.square(mock_audio_array[:, :frame_size])))
+
+    audio_blocks = [mock_audio_array[:, start:start + 1000] for start in range(0, mock_audio_array.shape[1], 1000)]
+    window_blocks = list(energy.window_blocks(audio_blocks, frame_size))
+    assert all(block.shape[1] % frame_size == 0 for block in window_blocks[:-1])
+    block_energies = numpy.concatenate([energy.frame_energy(block, frame_size) for block in window_blocks])
+    assert numpy.array_equal(block_energies, energies)
+
+
+def test_onset_frames():
+    """Test onsets are found at the start of each hit and close hits are merged.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.zeros((1, 44100), dtype=numpy.float32)
+    for start in [5120, 20480, 20992, 30720]:
+        audio_array[:, start:start + 256] = 0.5
+
+    onsets = energy.onset_frames(energy.frame_energy(audio_array), 44100.0)
+    assert onsets == [5120, 20480, 30720]
+    assert energy.trim_bounds(energy.frame_energy(audio_array), 44100) == (5120, 31232)
+    assert energy.trim_bounds(energy.frame_energy(audio_array * 0), 44100) == (0, 0)
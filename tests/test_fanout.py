@@ -0,0 +1,83 @@
+import numpy
+import os
+import pytest
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import fanout
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import Pipeline
+
+PRESETS = [
+    dict(sample_rate=44100.0, bit_rate=16),
+    dict(sample_rate=22050.0, bit_rate=8),
+    dict(sample_rate=11025.0, bit_rate=8),
+    dict(sample_rate=22050.0, bit_rate=8, compress='hard'),
+    dict(name="11025Hz_8bit_hard_normalized", sample_rate=11025.0, bit_rate=8, compress='hard', normalize=True),
+]
+
+
+def test_render(mock_audio_input_files):
+    """Test each preset matches its own pipeline while every input is decoded once.
+
+    :return None:
+    :raises AssertionError:
+    """
+    profiler = profiling.Profiler(trace_memory=False)
+    rendered = fanout.render(mock_audio_input_files, PRESETS, profiler=profiler, mono=None)
+    assert sorted(rendered) == sorted(fanout.preset_name(preset) for preset in PRESETS)
+    stages = [record["stage"] for record in profiler.records]
+    assert stages.count("decode") == len(mock_audio_input_files)
+    assert stages.count("compress") == 2 * len(mock_audio_input_files)
+
+    for preset in PRESETS:
+        options = {key: value for key, value in preset.items() if key not in ("name", "bit_rate")}
+        expected = Pipeline(mono=None, **options)(mock_audio_input_files)
+        for audio_array, expected_array in zip(rendered[fanout.preset_name(preset)], expected):
+            assert numpy.array_equal(audio_array, expected_array)
+
+    assert sorted(commands.process(mock_audio_input_files, presets=PRESETS[:2])) == ["22050Hz_8bit", "44100Hz_16bit"]
+
+
+def test_export(tmp_path, mock_audio_input_files):
+    """Test each preset is saved to its own directory at its bit rate.
+
+    :return None:
+    :raises AssertionError:
+    """
+    saved = fanout.export(
+        mock_audio_input_files, ["mock.wav"], PRESETS[1:4], output_dir=str(tmp_path), concatenate=True
+    )
+    assert sorted(saved) == ["11025Hz_8bit", "22050Hz_8bit", "22050Hz_8bit_hard"]
+    for name, paths in saved.items():
+        assert paths == [os.path.join(str(tmp_path), name, "mock.wav")]
+        assert os.path.getsize(paths[0]) < os.path.getsize(mock_audio_input_files[2])
+    assert fanout.explain(PRESETS).count("decode") == 1
+
+    # Each input is run through every preset before the next, decoded once
+    profiler = profiling.Profiler(trace_memory=False)
+    audio_outputs = [os.path.basename(audio_input) for audio_input in mock_audio_input_files]
+    saved = fanout.export(
+        mock_audio_input_files, audio_outputs, PRESETS, output_dir=str(tmp_path / "each"), profiler=profiler
+    )
+    assert all(len(paths) == len(mock_audio_input_files) for paths in saved.values())
+    decoded = [record["file"] for record in profiler.records if record["stage"] == "decode"]
+    assert decoded == mock_audio_input_files
+    second_decode = [record["stage"] for record in profiler.records].index("decode", 1)
+    assert [record["stage"] for record in profiler.records[:second_decode]].count("save") == len(PRESETS)
+
+
+def test_invalid_presets():
+    """Test presets with clashing names, unknown options, concatenate, block size or workers are refused.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with pytest.raises(ValueError):
+        fanout.pipelines([dict(sample_rate=22050.0), dict(sample_rate=22050.0, normalize=True)])
+    with pytest.raises(ValueError):
+        fanout.pipelines([dict(loudness=-14)])
+    with pytest.raises(ValueError):
+        fanout.pipelines([dict(concatenate=True)])
+    with pytest.raises(ValueError):
+        fanout.pipelines([dict(sample_rate=22050.0)], block_size=4096)
+    with pytest.raises(ValueError):
+        fanout.pipelines([dict(sample_rate=22050.0)], workers=2)
@@ -0,0 +1,60 @@
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import index
+from nanoloop_mobile_sample_tools import wavio
+import os
+import pytest
+import shutil
+
+
+def test_index_update(tmp_path, mock_audio_input_files):
+    """Test indexing a tree, then refreshing it after changes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    library = tmp_path / "library"
+    (library / "drums").mkdir(parents=True)
+    for audio_input in mock_audio_input_files[:2]:
+        shutil.copy(audio_input, str(library / "drums"))
+    shutil.copy(mock_audio_input_files[2], str(library))
+    (library / "notes.txt").write_text("not audio")
+
+    with index.Index(str(tmp_path / "index.sqlite")) as catalog:
+        assert catalog.update(str(library)) == dict(added=3, updated=0, removed=0, unchanged=0)
+        assert catalog.update(str(library)) == dict(added=0, updated=0, removed=0, unchanged=3)
+
+        os.remove(str(library / "drums" / "audio_input_1.wav"))
+        counts = catalog.update(str(library), levels=True)
+        assert counts == dict(added=0, updated=2, removed=1, unchanged=0)
+        assert len(catalog) == 2
+
+        # A header of zero sample rate is skipped like any other unreadable file
+        (library / "broken.wav").write_bytes(wavio.header(1, 0.0, 16, 4) + bytes(8))
+        assert catalog.update(str(library)) == dict(added=0, updated=0, removed=0, unchanged=2)
+        assert len(catalog) == 2
+
+
+def test_index_query(tmp_path, mock_audio_input_files):
+    """Test querying the index matches the files' headers.
+
+    :return None:
+    :raises AssertionError:
+    """
+    index_path = str(tmp_path / "index.sqlite")
+    with index.Index(index_path) as catalog:
+        catalog.update(os.path.dirname(mock_audio_input_files[0]), workers=2, levels=True)
+
+    assert index.select(index_path=index_path) == sorted(mock_audio_input_files)
+    assert index.select("channels=1", index_path=index_path) == [mock_audio_input_files[1]]
+    assert index.select("sample_rate>=44100", "path~*think*", index_path=index_path) == [mock_audio_input_files[2]]
+    assert index.select("peak>0", order_by="duration", limit=1, index_path=index_path)
+
+    with index.Index(index_path) as catalog:
+        duration, = catalog.connection.execute(
+            "SELECT duration FROM samples WHERE path = ?", (mock_audio_input_files[2],)
+        ).fetchone()
+    channels, frames = commands.audio_info(mock_audio_input_files[2])
+    assert duration == frames / 44100.0
+
+    with pytest.raises(ValueError):
+        index.select("loudness>1", index_path=index_path)
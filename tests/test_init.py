@@ -1,8 +1,26 @@
+import nanoloop_mobile_sample_tools
+import pkgutil
+import pytest
+import subprocess
+import sys
+
+
 def test_version():
     """Test that the standard __version__ dunder is available.
 
     :return None:
     :raises AssertionError:
     """
-    import nanoloop_mobile_sample_tools
-    assert nanoloop_mobile_sample_tools.__version__
\ No newline at end of file
+    assert nanoloop_mobile_sample_tools.__version__
+
+
+@pytest.mark.parametrize(
+    "module", sorted(module.name for module in pkgutil.iter_modules(nanoloop_mobile_sample_tools.__path__))
+)
+def test_import_first(module):
+    """Test every module imports on its own, as the package no longer imports commands up front.
+
+    :return None:
+    :raises AssertionError:
+    """
+    subprocess.run([sys.executable, "-c", "import nanoloop_mobile_sample_tools.{}".format(module)], check=True)
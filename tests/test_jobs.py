@@ -0,0 +1,91 @@
+import io
+import threading
+import zipfile
+from nanoloop_mobile_sample_tools import archive
+from nanoloop_mobile_sample_tools import jobs
+from nanoloop_mobile_sample_tools import profiling
+
+
+def test_job_progress(mock_audio_input_files):
+    """Test a job runs in the background and counts the files it finishes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    job_queue = jobs.JobQueue(max_jobs=1)
+    file_names = ["{}.wav".format(i) for i in range(len(mock_audio_input_files))]
+    job = job_queue.submit(archive.process_to_archive, len(file_names), mock_audio_input_files, file_names)
+    job._future.result()
+    job_queue.shutdown()
+
+    assert job_queue.get(job.id) is job
+    assert job.status == "done"
+    assert job.progress()["files_done"] == len(file_names)
+    assert job.progress()["fraction"] == 1.0
+    assert len(zipfile.ZipFile(io.BytesIO(job.result)).namelist()) == len(file_names)
+    assert [total["stage"] for total in job.profiler.summary()][-1] == "save"
+
+
+def test_job_cancel():
+    """Test a cancelled job stops at its next stage and queued jobs never run.
+
+    :return None:
+    :raises AssertionError:
+    """
+    started = threading.Event()
+    release = threading.Event()
+
+    def target(profiler=None):
+        with profiling.stage(profiler, "decode", "kick.wav"):
+            started.set()
+            release.wait()
+        with profiling.stage(profiler, "save", "kick.wav"):
+            pass
+        return b"done"
+
+    job_queue = jobs.JobQueue(max_jobs=1)
+    running = job_queue.submit(target, 1)
+    queued = job_queue.submit(target, 1)
+    started.wait()
+    assert running.progress()["stage"] == "decode kick.wav"
+    assert queued.status == "queued"
+
+    queued.cancel()
+    running.cancel()
+    release.set()
+    job_queue.shutdown()
+
+    assert running.status == "cancelled"
+    assert running.result is None
+    assert queued.status == "cancelled"
+
+
+def test_job_queue_full():
+    """Test jobs are refused when too many are waiting, and failures are kept.
+
+    :return None:
+    :raises AssertionError:
+    """
+    started = threading.Event()
+    release = threading.Event()
+
+    def target(profiler=None):
+        started.set()
+        release.wait()
+        raise ValueError("bad input")
+
+    job_queue = jobs.JobQueue(max_jobs=1, max_queued=1)
+    running = job_queue.submit(target, 1)
+    started.wait()
+    job_queue.submit(target, 1)
+    try:
+        job_queue.submit(target, 1)
+    except jobs.JobQueueFull:
+        pass
+    else:
+        raise AssertionError("Expected JobQueueFull")
+
+    release.set()
+    job_queue.shutdown()
+    assert running.status == "failed"
+    assert isinstance(running.error, ValueError)
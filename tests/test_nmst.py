@@ -1,5 +1,9 @@
 import sys
+import json
 import os
+import pytest
+import subprocess
+from nanoloop_mobile_sample_tools import commands
 from nanoloop_mobile_sample_tools import nmst
 
 
@@ -25,6 +29,8 @@ def test_main(mock_audio_input_files):
         "--normalize",
         "--speed-multiplier",
         "2.0",
+        "--resample-quality",
+        "high",
         "--audio-output",
         mock_output_filename
     ]
@@ -32,3 +38,225 @@ def test_main(mock_audio_input_files):
     nmst.main()
     assert os.path.isfile(mock_output_filename)
     os.remove(mock_output_filename)
+
+
+def test_main_cache(tmp_path, mock_audio_input_files):
+    """Test calling main twice with a cache directory.
+
+    :return None:
+    """
+    cache_dir = str(tmp_path / "cache")
+    audio_output = str(tmp_path / "mock.wav")
+    sys.argv = ["", mock_audio_input_files[0], "--cache-dir", cache_dir, "--audio-output", audio_output]
+    nmst.main()
+    nmst.main()
+    assert os.path.isfile("mock_audio_input_1.wav")
+    assert len(os.listdir(cache_dir)) == 1
+    os.remove("mock_audio_input_1.wav")
+
+
+def test_main_no_cache(tmp_path, mock_audio_input_files):
+    """Test calling main without the cache.
+
+    :return None:
+    """
+    sys.argv = ["", mock_audio_input_files[0], "--no-cache", "--audio-output", "mock.wav"]
+    nmst.main()
+    assert os.path.isfile("mock_audio_input_1.wav")
+    os.remove("mock_audio_input_1.wav")
+
+
+def test_main_profile(tmp_path, mock_audio_input_files):
+    """Test calling main with a profile report.
+
+    :return None:
+    """
+    profile = str(tmp_path / "profile.json")
+    audio_output = str(tmp_path / "mock.wav")
+    sys.argv = [
+        "",
+        *mock_audio_input_files,
+        "--concatenate",
+        "--no-cache",
+        "--audio-output",
+        audio_output,
+        "--profile",
+        profile
+    ]
+    nmst.main()
+    with open(profile) as f:
+        stages = [total["stage"] for total in json.load(f)["summary"]]
+    assert "decode" in stages and "save" in stages
+
+
+def test_main_pipelined(tmp_path, monkeypatch, mock_audio_input_files):
+    """Test calling main with pipelined stages, which cannot be used with workers.
+
+    :return None:
+    """
+    monkeypatch.chdir(tmp_path)
+    sys.argv = ["", *mock_audio_input_files, "--no-cache", "--pipelined", "--audio-output", "mock.wav"]
+    nmst.main()
+    assert os.path.isfile(str(tmp_path / "mock_think.wav"))
+
+    sys.argv = ["", *mock_audio_input_files, "--pipelined", "--workers", "2"]
+    with pytest.raises(SystemExit):
+        nmst.main()
+
+
+def test_main_watch_once(tmp_path, mock_audio_input_files):
+    """Test calling main to process a watched directory once.
+
+    :return None:
+    """
+    output_dir = str(tmp_path / "out")
+    directory = os.path.dirname(mock_audio_input_files[0])
+    sys.argv = ["", "watch", directory, "--once", "--output-dir", output_dir, "--audio-output", "mock.wav"]
+    nmst.main()
+    assert os.path.isfile(os.path.join(output_dir, "mock_think.wav"))
+
+
+def test_main_slices(tmp_path, mock_audio_input_files):
+    """Test calling main trimming and slicing each output.
+
+    :return None:
+    """
+    audio_output = str(tmp_path / "mock.wav")
+    sys.argv = ["", mock_audio_input_files[2], "--trim", "--slices", "4", "--audio-output", audio_output]
+    nmst.main()
+    for number in range(1, 5):
+        assert os.path.isfile("mock_think_{}.wav".format(number))
+        os.remove("mock_think_{}.wav".format(number))
+
+
+def test_main_max_bytes(mock_audio_input_files):
+    """Test calling main with a byte budget.
+
+    :return None:
+    """
+    sys.argv = ["", *mock_audio_input_files, "--max-bytes", "64K", "--trim", "--audio-output", "mock.wav"]
+    nmst.main()
+    audio_outputs = commands.get_audio_outputs(mock_audio_input_files, "mock.wav")
+    assert sum(os.path.getsize(audio_output) for audio_output in audio_outputs) <= 64 * 1024
+    for audio_output in audio_outputs:
+        os.remove(audio_output)
+
+
+def test_main_index_query(tmp_path, mock_audio_input_files):
+    """Test indexing a directory then processing a query of it.
+
+    :return None:
+    """
+    index_path = str(tmp_path / "index.sqlite")
+    sys.argv = ["", "index", os.path.dirname(mock_audio_input_files[0]), "--index", index_path]
+    nmst.main()
+    sys.argv = ["", "--query", "channels=1", "--index", index_path, "--no-cache", "--audio-output", "mock.wav"]
+    nmst.main()
+    assert os.path.isfile("mock_audio_input_2.wav")
+    os.remove("mock_audio_input_2.wav")
+
+
+def test_startup_imports():
+    """Test parsing arguments does not import numpy or pedalboard.
+
+    :return None:
+    :raises AssertionError:
+    """
+    code = (
+        "import sys\n"
+        "from nanoloop_mobile_sample_tools import nmst\n"
+        "nmst.get_parser().parse_args(['kick.wav'])\n"
+        "print(sorted({name.split('.')[0] for name in sys.modules} & {'numpy', 'pedalboard', 'wave'}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_batch_main(tmp_path, mock_audio_input_files):
+    """Test running a manifest of jobs with their own inputs and options.
+
+    :return None:
+    :raises AssertionError:
+    """
+    manifest = dict(
+        defaults=dict(no_cache=True, sample_rate=22050.0),
+        jobs=[
+            dict(audio_inputs=mock_audio_input_files[2:], audio_output=str(tmp_path / "a.wav"), normalize=True),
+            dict(
+                audio_inputs=mock_audio_input_files,
+                audio_output=str(tmp_path / "b.wav"),
+                concatenate=True,
+                bit_rate=8,
+                mono="right",
+            ),
+        ]
+    )
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest))
+    sys.argv = ["", "batch", str(manifest_path)]
+    nmst.main()
+    assert os.path.isfile("a_think.wav")
+    os.remove("a_think.wav")
+    assert os.path.isfile(str(tmp_path / "b.wav"))
+
+    manifest["jobs"].append(dict(audio_inputs=["c.wav"], bit_rate=12))
+    manifest_path.write_text(json.dumps(manifest))
+    os.remove(str(tmp_path / "b.wav"))
+    with pytest.raises(SystemExit):
+        nmst.main()
+    assert not os.path.exists(str(tmp_path / "b.wav"))
+
+
+def test_main_presets(tmp_path, mock_audio_input_files):
+    """Test rendering presets into a directory each.
+
+    :return None:
+    :raises AssertionError:
+    """
+    sys.argv = [
+        "",
+        *mock_audio_input_files[1:],
+        "--no-cache",
+        "--audio-output",
+        str(tmp_path / "kit.wav"),
+        "--preset",
+        "name=lofi,sample_rate=11025,bit_rate=8,compress=hard",
+        "--preset",
+        "sample_rate=22050,normalize=true",
+    ]
+    nmst.main()
+    assert os.path.isfile(str(tmp_path / "lofi" / "kit_think.wav"))
+    assert os.path.isfile(str(tmp_path / "22050Hz_16bit" / "kit_audio_input_2.wav"))
+
+    sys.argv = ["", mock_audio_input_files[0], "--preset", "bit_rate=12"]
+    with pytest.raises(SystemExit):
+        nmst.main()
+
+    sys.argv = ["", mock_audio_input_files[0], "--preset", "bit_rate=8", "--block-size", "4096"]
+    with pytest.raises(SystemExit):
+        nmst.main()
+
+
+def test_main_stats(tmp_path, monkeypatch, mock_audio_input_files):
+    """Test calling main normalizing to an RMS level and writing statistics sidecars.
+
+    :return None:
+    :raises AssertionError:
+    """
+    monkeypatch.chdir(tmp_path)
+    sys.argv = [
+        "",
+        *mock_audio_input_files,
+        "--no-cache",
+        "--normalize",
+        "--target-rms-db",
+        "-20",
+        "--stats",
+        "--audio-output",
+        "mock.wav",
+    ]
+    nmst.main()
+    with open(str(tmp_path / "mock_think.json")) as f:
+        report = json.load(f)
+    assert report["peak"] <= 1.0
+    assert report["rms_db"] <= -20.0 + 0.01
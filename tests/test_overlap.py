@@ -0,0 +1,71 @@
+import pytest
+import threading
+import time
+from nanoloop_mobile_sample_tools import overlap
+
+
+def test_run():
+    """Test items pass through every stage in order, with stages overlapping.
+
+    :return None:
+    :raises AssertionError:
+    """
+    threads = set()
+
+    def first(item):
+        threads.add(threading.current_thread().name)
+        return item * 2
+
+    def second(item):
+        threads.add(threading.current_thread().name)
+        return item + 1
+
+    assert overlap.run(range(20), [first, second]) == [item * 2 + 1 for item in range(20)]
+    assert len(threads) == 2
+    assert overlap.run([], [first, second]) == []
+
+
+def test_run_backpressure():
+    """Test a slow stage holds the stage before it to the queue size.
+
+    :return None:
+    :raises AssertionError:
+    """
+    started = []
+    finished = []
+    ahead = []
+
+    def decode(item):
+        started.append(item)
+        return item
+
+    def process(item):
+        time.sleep(0.01)
+        finished.append(item)
+        ahead.append(len(started) - len(finished))
+        return item
+
+    overlap.run(range(10), [decode, process], queue_size=2)
+    # The queue, the item being processed and the item decode is blocked on
+    assert max(ahead) <= 3
+
+
+def test_run_error():
+    """Test a failing stage stops the others and its error is raised.
+
+    :return None:
+    :raises AssertionError:
+    """
+    processed = []
+
+    def fail(item):
+        if item == 3:
+            raise ValueError("mock failure")
+        return item
+
+    with pytest.raises(ValueError, match="mock failure"):
+        overlap.run(range(1000), [lambda item: item, fail, processed.append])
+    assert len(processed) < 1000
+
+    with pytest.raises(ValueError):
+        overlap.run(range(3), [lambda item: item], queue_size=0)
@@ -0,0 +1,77 @@
+import numpy
+import pickle
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+def test_pipeline_matches_process(mock_audio_input_files):
+    """Test a pipeline gives the same audio as process.
+
+    :return None:
+    :raises AssertionError:
+    """
+    kwargs = dict(sample_rate=22050.0, compress='hard', normalize=True)
+    audio_arrays = Pipeline(**kwargs)(mock_audio_input_files)
+    for audio_array, expected in zip(audio_arrays, commands.process(mock_audio_input_files, **kwargs)):
+        assert numpy.array_equal(audio_array, expected)
+
+
+def test_pipeline_reuses_board(mock_audio_input_files):
+    """Test the compressor board is built once and reset between files and calls.
+
+    :return None:
+    :raises AssertionError:
+    """
+    pipeline = Pipeline(compress='soft')
+    first = pipeline(mock_audio_input_files)
+    board = pipeline.board
+    second = pipeline(mock_audio_input_files[::-1])[::-1]
+    assert pipeline.board is board
+    for first_array, second_array in zip(first, second):
+        assert numpy.array_equal(first_array, second_array)
+
+
+def test_pipeline_compressor_settings(mock_audio_input_files):
+    """Test custom compressor settings override the compression type.
+
+    :return None:
+    :raises AssertionError:
+    """
+    soft = Pipeline(compress='soft')(mock_audio_input_files[:1])[0]
+    custom = Pipeline(compress='soft', compressor=dict(ratio=2, gain_db=0))(mock_audio_input_files[:1])[0]
+    assert not numpy.array_equal(soft, custom)
+    assert "ratio" in Pipeline(compress='soft', compressor=dict(ratio=2)).explain()
+
+
+def test_pipeline_pickle():
+    """Test a used pipeline can be pickled for worker processes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    pipeline = Pipeline(compress='hard')
+    assert pipeline.board is not None
+    unpickled = pickle.loads(pickle.dumps(pipeline))
+    assert unpickled.settings() == pipeline.settings()
+    assert unpickled.board is not None
+
+
+def test_pipeline_trim_streaming(mock_audio_input_files):
+    """Test trimming streamed blocks gives the same audio as whole files.
+
+    :return None:
+    :raises AssertionError:
+    """
+    kwargs = dict(sample_rate=22050.0, trim=True, threshold_db=-20.0, normalize=True)
+    audio_arrays = Pipeline(**kwargs)(mock_audio_input_files)
+    streamed_blocks = Pipeline(block_size=4096, **kwargs)(mock_audio_input_files)
+    untrimmed_arrays = Pipeline(sample_rate=22050.0)(mock_audio_input_files)
+    for audio_array, blocks, untrimmed_array in zip(audio_arrays, streamed_blocks, untrimmed_arrays):
+        blocks = list(blocks)
+        if not blocks:
+            # All quieter than the threshold
+            assert audio_array.size == 0
+            continue
+        assert 0 < audio_array.shape[1] < untrimmed_array.shape[1]
+        assert numpy.allclose(numpy.concatenate(blocks, axis=1), audio_array)
+    assert "trim" in Pipeline(trim=True, slices='onsets').explain()
@@ -0,0 +1,69 @@
+import numpy
+import pedalboard
+import pytest
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import plan
+from nanoloop_mobile_sample_tools import resample
+
+
+def reference_process(audio_input, sample_rate, speed_multiplier, mono, compress, normalize, reverse):
+    """Process an audio file one stage at a time, resampling every channel.
+
+    :return numpy.ndarray:
+    """
+    with pedalboard.io.AudioFile(audio_input, 'r') as f:
+        audio_array = f.read(f.frames)
+        source_sample_rate = f.samplerate
+    if source_sample_rate != sample_rate/speed_multiplier:
+        audio_array = resample.resample_audio(audio_array, source_sample_rate, sample_rate/speed_multiplier)
+    if mono is not None:
+        audio_array = commands.mono_audio(audio_array, mono)
+    if compress is not None:
+        audio_array = commands.compress_audio(audio_array, compress, sample_rate)
+    if normalize:
+        audio_array = commands.peak_normalize_audio(audio_array)
+    if reverse:
+        audio_array = commands.reverse_audio(audio_array)
+    return audio_array
+
+
+@pytest.mark.parametrize("sample_rate,speed_multiplier,mono,compress,normalize,reverse", [
+    (44100.0, 1.0, 'left', None, False, False),
+    (22050.0, 1.0, 'right', 'soft', True, False),
+    (11025.0, 2.0, None, 'hard', True, True),
+    (8000.0, 3.0, 'left', None, False, True),
+])
+def test_plan_matches_stages(
+        mock_audio_input_files, sample_rate, speed_multiplier, mono, compress, normalize, reverse):
+    """Test the fused plan gives the same audio as running each stage.
+
+    :return None:
+    :raises AssertionError:
+    """
+    processing_plan = plan.Plan(
+        sample_rate=sample_rate,
+        speed_multiplier=speed_multiplier,
+        mono=mono,
+        compress=compress,
+        normalize=normalize,
+        reverse=reverse
+    )
+    # audio_input_2 is mono so 'right' would fail without the plan
+    audio_inputs = [mock_audio_input_files[0], mock_audio_input_files[2]]
+    for audio_input, audio_array in zip(audio_inputs, processing_plan.run(audio_inputs)):
+        expected = reference_process(
+            audio_input, sample_rate, speed_multiplier, mono, compress, normalize, reverse
+        )
+        assert numpy.array_equal(audio_array, expected)
+
+
+def test_explain():
+    """Test explain lists only the stages which run.
+
+    :return None:
+    :raises AssertionError:
+    """
+    explanation = plan.Plan(mono=None, normalize=True, reverse=True).explain()
+    assert "normalize+reverse" in explanation
+    assert "compress" not in explanation and "mono" not in explanation
+    assert "concatenate" in plan.Plan(concatenate=True).explain()
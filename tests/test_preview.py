@@ -0,0 +1,41 @@
+import numpy
+from nanoloop_mobile_sample_tools import cache
+from nanoloop_mobile_sample_tools import preview
+from nanoloop_mobile_sample_tools import profiling
+from nanoloop_mobile_sample_tools import Pipeline
+
+
+def test_envelope():
+    """Test the envelope is the min and max of each block over every channel.
+
+    :return None:
+    :raises AssertionError:
+    """
+    rng = numpy.random.default_rng(0)
+    audio_array = rng.uniform(-1.0, 1.0, (2, 1003)).astype(numpy.float32)
+    audio_envelope = preview.envelope(audio_array, 10)
+    assert audio_envelope.shape == (2, 10)
+    blocks = numpy.array_split(numpy.arange(1003), 10)
+    assert numpy.array_equal(audio_envelope[0], [audio_array[:, block].min() for block in blocks])
+    assert numpy.array_equal(audio_envelope[1], [audio_array[:, block].max() for block in blocks])
+    assert preview.envelope(audio_array[:, :3], 10).shape == (2, 3)
+    assert preview.envelope(audio_array[:, :0], 10).shape == (2, 0)
+
+
+def test_render(mock_audio_input_files):
+    """Test the preview is the start of the full render, and shares one decode with the waveform.
+
+    :return None:
+    :raises AssertionError:
+    """
+    pipeline = Pipeline(compress='hard', mono=None)
+    expected = pipeline(mock_audio_input_files[2:])[0]
+
+    stage_cache = cache.StageCache()
+    profiler = profiling.Profiler(trace_memory=False)
+    audio_array = preview.render(mock_audio_input_files[2], pipeline, 0.5, stage_cache, profiler)
+    audio_envelope = preview.waveform(mock_audio_input_files[2], pipeline, 100, stage_cache, profiler)
+    assert audio_array.shape == (2, 22050)
+    assert numpy.array_equal(audio_array, expected[:, :22050])
+    assert audio_envelope.shape == (2, 100)
+    assert [record["stage"] for record in profiler.records].count("decode") == 1
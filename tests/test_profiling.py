@@ -0,0 +1,50 @@
+import json
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import profiling
+
+
+def test_profile_process(mock_audio_input_files):
+    """Test every stage which runs is recorded for every file.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with profiling.Profiler() as profiler:
+        commands.process(
+            mock_audio_input_files, sample_rate=22050.0, compress='soft', normalize=True, profiler=profiler
+        )
+    stages = [total["stage"] for total in profiler.summary()]
+    # Many inputs are normalized as one batch
+    assert stages == ["decode", "mono", "resample", "compress", "pack", "stats", "normalize"]
+    decodes = [record for record in profiler.records if record["stage"] == "decode"]
+    assert len(decodes) == len(mock_audio_input_files)
+    assert all(record["bytes"] and record["allocated_bytes"] is not None for record in decodes)
+
+
+def test_profile_workers(mock_audio_input_files):
+    """Test records made in worker processes are collected.
+
+    :return None:
+    :raises AssertionError:
+    """
+    records = []
+    profiler = profiling.Profiler(callback=records.append)
+    commands.process(mock_audio_input_files, workers=2, profiler=profiler)
+    assert len([record for record in records if record["stage"] == "decode"]) == len(mock_audio_input_files)
+    assert records == profiler.records
+
+
+def test_profile_save_dump(tmp_path, mock_audio_array):
+    """Test save is recorded and the report dumps to JSON.
+
+    :return None:
+    :raises AssertionError:
+    """
+    profiler = profiling.Profiler()
+    commands.save(mock_audio_array, audio_output=str(tmp_path / "mock.wav"), profiler=profiler)
+    path = str(tmp_path / "profile.json")
+    profiler.dump(path)
+    with open(path) as f:
+        report = json.load(f)
+    assert report["summary"][0]["stage"] == "save"
+    assert report["records"][0]["bytes"] == mock_audio_array.size * 2
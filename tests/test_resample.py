@@ -0,0 +1,106 @@
+import numpy
+import pedalboard
+import pytest
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import resample
+
+
+def tone_level(audio_array: numpy.ndarray, frequency: float, sample_rate: float) -> float:
+    """Measure the level of a tone in the first channel, in dB.
+
+    The audio should hold a whole number of cycles of the tone.
+
+    :return float:
+    """
+    spectrum = numpy.abs(numpy.fft.rfft(audio_array[0].astype(numpy.float64))) / (audio_array.shape[1] / 2)
+    frequencies = numpy.fft.rfftfreq(audio_array.shape[1], 1 / sample_rate)
+    return 20 * numpy.log10(spectrum[numpy.argmin(numpy.abs(frequencies - frequency))] + 1e-12)
+
+
+def test_decimation_factor():
+    """Test only integer downsampling ratios are decimated, and by standard only where it is faster.
+
+    :return None:
+    :raises AssertionError:
+    """
+    assert resample.decimation_factor(44100, 22050.0) == 2
+    assert resample.decimation_factor(44100, 11025.0) == 4
+    assert resample.decimation_factor(44100, 11025.0 / 2.0) is None
+    assert resample.decimation_factor(44100, 11025.0 / 2.0, 'high') == 8
+    assert resample.resampled_frames(10001, 44100, 11025.0 / 2.0) == 1251
+    assert resample.decimation_factor(44100, 8000.0) is None
+    assert resample.decimation_factor(22050, 44100.0) is None
+    assert resample.decimation_factor(44100, 22050.0, 'fast') is None
+    assert isinstance(resample.resampler(48000, 16000.0, 2), resample.Decimator)
+    assert isinstance(resample.resampler(44100, 8000.0, 2), pedalboard.io.StreamResampler)
+    with pytest.raises(ValueError):
+        resample.resampler(44100, 22050.0, 2, 'best')
+
+
+@pytest.mark.parametrize("quality", ['standard', 'high'])
+def test_decimator_streams(quality):
+    """Test decimating blocks gives the same audio and length as a whole array.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.random.default_rng(0).uniform(-1.0, 1.0, (2, 10001)).astype(numpy.float32)
+    expected = resample.resample_audio(audio_array, 44100, 11025.0, quality)
+    assert expected.shape == (2, 2501)
+
+    decimator = resample.resampler(44100, 11025.0, 2, quality)
+    blocks = [decimator.process(audio_array[:, start:start + 777]) for start in range(0, 10001, 777)]
+    blocks.append(decimator.process())
+    assert numpy.allclose(numpy.concatenate(blocks, axis=1), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("factor", [2, 4])
+def test_decimation_aliasing(factor):
+    """Test the standard decimator aliases no more than pedalboard's resampler and keeps the passband.
+
+    :return None:
+    :raises AssertionError:
+    """
+    sample_rate = 44100
+    target_sample_rate = sample_rate / factor
+    nyquist = target_sample_rate / 2
+    time_axis = numpy.arange(sample_rate * 2) / sample_rate
+
+    def both(frequency):
+        audio_array = numpy.sin(2 * numpy.pi * frequency * time_axis)[None].astype(numpy.float32)
+        stream = pedalboard.io.StreamResampler(
+            sample_rate, target_sample_rate, 1, pedalboard.Resample.Quality.WindowedSinc32
+        )
+        current = numpy.concatenate([stream.process(audio_array), stream.process()], axis=1)
+        decimated = resample.resample_audio(audio_array, sample_rate, target_sample_rate)
+        # A whole second away from the edges
+        window = slice(int(target_sample_rate) // 2, int(target_sample_rate) // 2 + int(target_sample_rate))
+        return current[:, window], decimated[:, window]
+
+    for frequency in [0.1 * nyquist, 0.5 * nyquist, 0.9 * nyquist]:
+        current, decimated = both(round(frequency))
+        assert abs(tone_level(decimated, round(frequency), target_sample_rate)) < 0.05
+
+    for frequency in [1.1 * nyquist, 1.5 * nyquist, 1.9 * nyquist]:
+        alias = target_sample_rate - round(frequency)
+        current, decimated = both(round(frequency))
+        assert tone_level(decimated, alias, target_sample_rate) < -90
+        assert tone_level(decimated, alias, target_sample_rate) <= tone_level(current, alias, target_sample_rate)
+
+
+def test_read_audio_quality(mock_audio_input_files):
+    """Test the quality tiers change integer ratio output and the length matches the header.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_input = mock_audio_input_files[0]
+    arrays = {
+        quality: commands.read_audio(audio_input, 22050.0, resample_quality=quality)
+        for quality in resample.QUALITIES
+    }
+    for quality, audio_array in arrays.items():
+        _, frames = commands.audio_info(audio_input, 22050.0, resample_quality=quality)
+        assert audio_array.shape == (1, frames)
+    assert not numpy.array_equal(arrays['fast'], arrays['standard'])
+    assert not numpy.array_equal(arrays['standard'], arrays['high'])
@@ -0,0 +1,72 @@
+import io
+import json
+import math
+import numpy
+import pytest
+from nanoloop_mobile_sample_tools import commands
+from nanoloop_mobile_sample_tools import stats
+
+
+def test_measure():
+    """Test the peak, RMS, DC offset and clips of a known signal, whole and in blocks.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.array([[0.5, -1.5, 0.25, 1.0], [0.0, 0.5, -0.25, 2.0]], dtype=numpy.float32)
+    audio_stats = stats.measure(audio_array)
+    assert audio_stats["peak"] == 2.0
+    assert audio_stats["rms"] == pytest.approx(math.sqrt(numpy.mean(audio_array.astype(numpy.float64) ** 2)))
+    assert audio_stats["dc_offset"] == pytest.approx(0.3125)
+    assert audio_stats["clips"] == 2
+    assert audio_stats["samples"] == 8
+
+    meter = stats.Meter()
+    for start in range(0, 4, 3):
+        meter.add(audio_array[:, start:start + 3])
+    assert meter.stats() == pytest.approx(audio_stats)
+
+    assert stats.measure(numpy.zeros((2, 0), dtype=numpy.float32)) == dict(
+        peak=0.0, rms=0.0, dc_offset=0.0, clips=0, samples=0
+    )
+
+
+def test_normalize_factor(mock_audio_array):
+    """Test normalizing the absolute peak, or the RMS level without passing full scale.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.array([[0.1, -0.5, 0.25]], dtype=numpy.float32)
+    audio_stats = stats.measure(audio_array)
+    assert stats.normalize_factor(audio_stats) == pytest.approx(2.0)
+    assert numpy.max(numpy.abs(commands.peak_normalize_audio(audio_array))) == pytest.approx(1.0)
+
+    quiet_stats = stats.measure(mock_audio_array)
+    factor = stats.normalize_factor(quiet_stats, target_rms_db=-20.0)
+    assert stats.to_db(quiet_stats["rms"] * factor) == pytest.approx(-20.0)
+    # Loud targets are capped at the peak
+    assert stats.normalize_factor(quiet_stats, target_rms_db=0.0) == stats.normalize_factor(quiet_stats)
+    assert stats.normalize_factor(stats.measure(numpy.zeros((1, 8), dtype=numpy.float32))) == 1.0
+
+
+def test_save_stats(tmp_path, mock_audio_array):
+    """Test saving measures the audio as it is written, whole or streamed, into a sidecar.
+
+    :return None:
+    :raises AssertionError:
+    """
+    stats_output = io.BytesIO()
+    audio_output = str(tmp_path / "mock.wav")
+    commands.save(mock_audio_array, 44100.0, 32, audio_output, stats_output=stats_output)
+    report = json.loads(stats_output.getvalue())
+    expected = stats.measure(mock_audio_array)
+    assert report["peak"] == pytest.approx(expected["peak"])
+    assert report["rms_db"] == pytest.approx(stats.to_db(expected["rms"]))
+    assert stats.measure_wav(audio_output) == pytest.approx(expected)
+
+    blocks = [mock_audio_array[:, start:start + 1000] for start in range(0, mock_audio_array.shape[1], 1000)]
+    sidecar = str(tmp_path / "mock.json")
+    commands.save(iter(blocks), 44100.0, 16, io.BytesIO(), stats_output=sidecar)
+    with open(sidecar) as f:
+        assert json.load(f)["samples"] == mock_audio_array.size
@@ -0,0 +1,105 @@
+import concurrent.futures
+import os
+import shutil
+from nanoloop_mobile_sample_tools import watch
+
+
+def make_watched_dir(tmp_path, mock_audio_input_files) -> str:
+    """Copy the audio input files into a directory to watch.
+
+    :return str:
+    """
+    directory = tmp_path / "watched"
+    directory.mkdir()
+    for path in mock_audio_input_files:
+        shutil.copy(path, str(directory))
+    return str(directory)
+
+
+def test_run_once(tmp_path, mock_audio_input_files):
+    """Test files are processed once and skipped across restarts.
+
+    :return None:
+    :raises AssertionError:
+    """
+    directory = make_watched_dir(tmp_path, mock_audio_input_files)
+    output_dir = str(tmp_path / "out")
+    outputs = watch.Watcher(directory, output_dir, audio_output="kit.wav").run_once()
+    assert sorted(os.path.basename(output) for output in outputs) == [
+        "kit_audio_input_1.wav", "kit_audio_input_2.wav", "kit_think.wav"
+    ]
+    assert all(os.path.isfile(output) for output in outputs)
+
+    watcher = watch.Watcher(directory, output_dir, audio_output="kit.wav")
+    assert watcher.run_once() == []
+
+    # Touched but unchanged files are not processed again
+    os.utime(os.path.join(directory, "think.wav"), (1, 1))
+    assert watcher.run_once() == []
+
+    with open(os.path.join(directory, "think.wav"), "ab") as f:
+        f.write(b"\0\0\0\0")
+    assert [os.path.basename(output) for output in watcher.run_once()] == ["kit_think.wav"]
+
+
+def test_settings_change(tmp_path, mock_audio_input_files):
+    """Test changing the settings reprocesses every file.
+
+    :return None:
+    :raises AssertionError:
+    """
+    directory = make_watched_dir(tmp_path, mock_audio_input_files)
+    assert len(watch.Watcher(directory).run_once()) == 3
+    assert len(watch.Watcher(directory).run_once()) == 0
+    assert len(watch.Watcher(directory, normalize=True).run_once()) == 3
+
+
+def test_rewritten_while_processing(tmp_path, mock_audio_input_files):
+    """Test a file rewritten while it is processed is processed again.
+
+    :return None:
+    :raises AssertionError:
+    """
+    directory = make_watched_dir(tmp_path, mock_audio_input_files)
+    path = os.path.join(directory, "think.wav")
+    watcher = watch.Watcher(directory)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor_submit = executor.submit
+
+        def submit(function, audio_input, *args):
+            # Rewrite the file as the worker starts on it
+            future = executor_submit(function, audio_input, *args)
+            if audio_input == path:
+                with open(path, "ab") as f:
+                    f.write(b"\0\0\0\0")
+            return future
+
+        executor.submit = submit
+        assert len(watcher.process(watcher.scan(settle=False), executor)) == 3
+
+    assert [os.path.basename(output) for output in watcher.run_once()] == ["output_think.wav"]
+
+
+def test_scan_settle(tmp_path, mock_audio_input_files):
+    """Test files are only ready once they stop changing between scans.
+
+    :return None:
+    :raises AssertionError:
+    """
+    directory = make_watched_dir(tmp_path, mock_audio_input_files[:1])
+    watcher = watch.Watcher(directory, str(tmp_path / "out"))
+    assert watcher.scan() == []
+    assert len(watcher.scan()) == 1
+
+
+def test_run(tmp_path, mock_audio_input_files):
+    """Test polling processes files once they settle.
+
+    :return None:
+    :raises AssertionError:
+    """
+    directory = make_watched_dir(tmp_path, mock_audio_input_files)
+    output_dir = str(tmp_path / "out")
+    watch.Watcher(directory, output_dir, interval=0, workers=2).run(polls=2)
+    assert len([name for name in os.listdir(output_dir) if name.endswith(".wav")]) == 3
@@ -0,0 +1,145 @@
+import io
+import numpy
+import pedalboard
+import pytest
+import wave
+from nanoloop_mobile_sample_tools import wavio
+
+
+def read_frames(buffer: io.BytesIO) -> tuple:
+    """Read the parameters and raw frames of a PCM WAV buffer.
+
+    :return tuple:
+    """
+    buffer.seek(0)
+    with wave.open(buffer, 'r') as f:
+        return f.getparams(), f.readframes(f.getnframes())
+
+
+def test_interleave():
+    """Test channels are interleaved across chunks.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.array([[0.0, 0.5, -0.5], [1.0, -1.0, 0.25]], dtype=numpy.float32)
+    buffer = io.BytesIO()
+    with wavio.WavWriter(buffer, 2, 8000, 16, chunk_size=2) as writer:
+        writer.write(audio_array)
+    params, frames = read_frames(buffer)
+    assert params.nchannels == 2 and params.nframes == 3
+    expected = (audio_array.T * 32767).astype('<i2')
+    assert numpy.array_equal(numpy.frombuffer(frames, dtype='<i2').reshape(3, 2), expected)
+
+
+def test_clip():
+    """Test out of range samples are clipped.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.array([[2.0, -2.0]], dtype=numpy.float32)
+    for bit_rate, dtype, expected in [(8, 'u1', [255, 0]), (16, '<i2', [32767, -32768])]:
+        buffer = io.BytesIO()
+        with wavio.WavWriter(buffer, 1, 8000, bit_rate) as writer:
+            writer.write(audio_array)
+        _, frames = read_frames(buffer)
+        assert numpy.frombuffer(frames, dtype=dtype).tolist() == expected
+
+
+def test_24_bit():
+    """Test 24 bit samples are packed into three bytes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    audio_array = numpy.array([[1.0, -1.0, 0.0]])
+    buffer = io.BytesIO()
+    with wavio.WavWriter(buffer, 1, 8000, 24) as writer:
+        writer.write(audio_array)
+    params, frames = read_frames(buffer)
+    assert params.sampwidth == 3
+    assert frames == b'\xff\xff\x7f' + b'\x01\x00\x80' + b'\x00\x00\x00'
+
+
+def test_unseekable_output():
+    """Test a known number of frames can be written without seeking.
+
+    :return None:
+    :raises AssertionError:
+    """
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self.data = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            self.data += bytes(b)
+            return len(b)
+
+    audio_array = numpy.zeros((2, 10), dtype=numpy.float32)
+    output = Unseekable()
+    with wavio.WavWriter(output, 2, 8000, 16, nframes=10) as writer:
+        writer.write(audio_array)
+    params, _ = read_frames(io.BytesIO(bytes(output.data)))
+    assert params.nframes == 10
+
+
+def test_invalid_bit_rate():
+    """Test an unsupported bit rate fails.
+
+    :return None:
+    :raises AssertionError:
+    """
+    with pytest.raises(ValueError):
+        wavio.WavWriter(io.BytesIO(), 1, 8000, 12)
+
+
+@pytest.mark.parametrize("bit_rate", sorted(wavio.FORMATS))
+def test_reader_matches_decoder(bit_rate):
+    """Test mapped samples convert to the same floats pedalboard decodes.
+
+    :return None:
+    :raises AssertionError:
+    """
+    rng = numpy.random.default_rng(0)
+    audio_array = rng.uniform(-1.0, 1.0, (2, 1000)).astype(numpy.float32)
+    buffer = io.BytesIO()
+    with wavio.WavWriter(buffer, 2, 22050, bit_rate) as writer:
+        writer.write(audio_array)
+
+    with pedalboard.io.AudioFile(io.BytesIO(buffer.getvalue())) as f:
+        expected = f.read(f.frames)
+    reader = wavio.WavReader.open(buffer.getvalue(), chunk_size=300)
+    assert reader.samplerate == 22050 and reader.num_channels == 2 and reader.frames == 1000
+    assert numpy.array_equal(reader.read(), expected)
+    assert numpy.array_equal(reader.read(100, 500, channel=1), expected[1:, 100:600])
+
+
+def test_reader_unsupported(tmp_path, mock_audio_array):
+    """Test inputs which cannot be mapped are left to the decoder.
+
+    :return None:
+    :raises AssertionError:
+    """
+    path = str(tmp_path / "output.flac")
+    with pedalboard.io.AudioFile(path, 'w', 44100, mock_audio_array.shape[0]) as f:
+        f.write(mock_audio_array)
+    assert wavio.WavReader.open(path) is None
+    assert wavio.WavReader.open(io.BytesIO()) is None
+    assert wavio.WavReader.open(b"RIFF") is None
+    assert wavio.read_info(path) is None
+
+
+def test_read_info(tmp_path):
+    """Test the header alone gives the format and length of a WAV file.
+
+    :return None:
+    :raises AssertionError:
+    """
+    path = str(tmp_path / "output.wav")
+    with wavio.WavWriter(path, 2, 11025, 24) as writer:
+        writer.write(numpy.zeros((2, 777), dtype=numpy.float32))
+    assert wavio.read_info(path) == (2, 11025.0, 24, 777)